@@ -1,6 +1,8 @@
 import streamlit as st
 import views
 import os
+from glow import WARMUP_ENABLED, start_warmup  # Chemin vers le module génératif ajouté par views
+from stage_metrics import start_metrics_server
 
 # Configuration de la page
 st.set_page_config(
@@ -21,6 +23,14 @@ def load_css(file_name):
 
 load_css("assets/styles.css")
 
+# Préchauffage du moteur IA (index, modèle d'embedding, client Mistral) dès le démarrage
+# du processus, en arrière-plan (GLOW_WARMUP=1) ; sans effet s'il est déjà lancé
+if WARMUP_ENABLED:
+    start_warmup()
+
+# Durées par étape du pipeline (GLOW_METRICS=1), exposées sur GLOW_METRICS_PORT (/metrics, /metrics.json)
+start_metrics_server()
+
 # Gestion de l'état de session (Session State)
 if 'page' not in st.session_state:
     st.session_state.page = 'home'
@@ -8,7 +8,7 @@ import os
 
 # Ajout du chemin vers le module génératif
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'générative')))
-from glow import get_glow_ai
+from glow import get_glow_ai, wait_for_warmup, warmup_status
 
 # Base de données Produits Simulée (Catalogue GLOW)
 MOCK_PRODUCTS = {
@@ -92,6 +92,18 @@ def get_product_selection(skin_type, concern):
         MOCK_PRODUCTS["creme"].get(cre_type, MOCK_PRODUCTS["creme"]["active"])
     ]
 
+def show_engine_status():
+    """Indique si le moteur IA préchauffé en arrière-plan est prêt"""
+    status = warmup_status()
+    if status["state"] == "running":
+        st.caption(f"⏳ Préparation de l'IA en cours ({status['elapsed_s']:.0f} s)... "
+                   "Vous pouvez déjà remplir votre diagnostic.")
+    elif status["state"] == "ready":
+        st.caption("✨ IA prête" + ("" if status["rag"] else " (sans recherche dans le catalogue)"))
+    elif status["state"] == "failed":
+        st.caption("L'IA sera préparée lors de votre demande.")
+
+
 def show_diagnosis(navigate_callback):
     st.markdown("<h2 style='text-align: center; margin-bottom: 30px;'>Diagnostiquez votre Peau</h2>", unsafe_allow_html=True)
     st.markdown("---")
@@ -102,6 +114,7 @@ def show_diagnosis(navigate_callback):
     </div>
     """)
     st.markdown(diagnosis_html.strip(), unsafe_allow_html=True)
+    show_engine_status()
     
     with st.form("diagnosis_form"):
         c1, c2 = st.columns(2)
@@ -183,6 +196,11 @@ def show_diagnosis(navigate_callback):
                     'allergies': allergies
                 }
                 
+                if warmup_status()["state"] == "running":
+                    # Le moteur est en cours de construction : on attend la fin plutôt que d'en lancer un second
+                    with st.spinner("Préparation de l'IA générative (premier démarrage)..."):
+                        wait_for_warmup()
+
                 with st.spinner('L\'IA générative analyse votre profil et cherche les meilleurs produits...'):
                     # Mapping direct pour l'IA
                     # Traduction Français -> Anglais pour le backend
@@ -225,8 +243,12 @@ def show_diagnosis(navigate_callback):
                     }
                     
                     try:
+                        # Instance partagée entre toutes les sessions (construite une seule fois)
                         advisor = get_glow_ai()
-                        routines = advisor.generate_full_routine(profil_ai)
+                        # Les trois routines sont générées en parallèle (3 appels Mistral simultanés)
+                        routines = advisor.generate_full_routine_parallel(profil_ai, timeout=90)
+                        if all(r is None for r in routines.values()):
+                            raise RuntimeError(next(iter(routines.errors.values())))
                         st.session_state.user_data['routines'] = routines
                         navigate_callback('magazine')
                     except Exception as e:
@@ -0,0 +1,211 @@
+"""
+Fabrique d'index FAISS : recherche exacte ou approchée selon le déploiement.
+
+- "flat"     : recherche exacte (défaut), idéale pour le catalogue actuel (~1k produits)
+- "ivf_flat" : partitionnement en `nlist` listes, `nprobe` listes visitées par requête
+- "hnsw"     : graphe HNSW (`M` voisins par nœud, `ef_search` candidats explorés)
+- "ivf_pq"   : IVF + compression Product Quantization (`pq_m` sous-vecteurs de `pq_bits` bits)
+
+Les vecteurs des backends flat, ivf_flat et hnsw peuvent être stockés en précision
+réduite (`quantization` : "fp16" = 2x moins de mémoire, "int8" = 4x, avec une
+échelle par dimension apprise sur le catalogue). Les `rerank_factor * k` meilleurs
+candidats sont alors reclassés avec les vecteurs float32, lus depuis un fichier
+projeté en mémoire (seules les pages des candidats sont chargées).
+
+Les paramètres de construction (nlist, M, pq_m...) font partie de l'empreinte du
+cache d'index ; les paramètres de recherche (nprobe, ef_search) s'appliquent au
+chargement et peuvent changer sans reconstruction.
+
+Configuration par variables d'environnement :
+    GLOW_INDEX_BACKEND=hnsw GLOW_HNSW_M=32 GLOW_HNSW_EF_SEARCH=64 streamlit run app.py
+"""
+import math
+import os
+
+import faiss
+import numpy as np
+
+INDEX_BACKENDS = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+QUANTIZATIONS = ("none", "fp16", "int8")
+
+# FAISS recommande au moins ~39 vecteurs d'entraînement par centroïde
+MIN_POINTS_PER_CENTROID = 39
+
+
+class IndexConfig:
+    """Type d'index FAISS et ses paramètres de construction et de recherche"""
+
+    def __init__(self, backend="flat", nlist=1024, nprobe=16, m=32, ef_construction=200, ef_search=64,
+                 pq_m=48, pq_bits=8, quantization="none", rerank_factor=4):
+        if backend not in INDEX_BACKENDS:
+            raise ValueError(f"Backend d'index inconnu : {backend!r} (attendu : {', '.join(INDEX_BACKENDS)})")
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Quantification inconnue : {quantization!r} (attendu : {', '.join(QUANTIZATIONS)})")
+        self.backend = backend
+        # IVF-PQ est déjà compressé : la quantification scalaire ne s'y applique pas
+        self.quantization = "none" if backend == "ivf_pq" else quantization
+        self.rerank_factor = max(1, int(rerank_factor))
+        self.nlist = int(nlist)
+        self.nprobe = int(nprobe)
+        self.m = int(m)
+        self.ef_construction = int(ef_construction)
+        self.ef_search = int(ef_search)
+        self.pq_m = int(pq_m)
+        self.pq_bits = int(pq_bits)
+
+    @classmethod
+    def from_env(cls):
+        """Configuration lue dans les variables d'environnement GLOW_INDEX_* / GLOW_IVF_* / GLOW_HNSW_* / GLOW_PQ_*"""
+        return cls(
+            backend=os.getenv("GLOW_INDEX_BACKEND", "flat"),
+            nlist=os.getenv("GLOW_IVF_NLIST", "1024"),
+            nprobe=os.getenv("GLOW_IVF_NPROBE", "16"),
+            m=os.getenv("GLOW_HNSW_M", "32"),
+            ef_construction=os.getenv("GLOW_HNSW_EF_CONSTRUCTION", "200"),
+            ef_search=os.getenv("GLOW_HNSW_EF_SEARCH", "64"),
+            pq_m=os.getenv("GLOW_PQ_M", "48"),
+            pq_bits=os.getenv("GLOW_PQ_BITS", "8"),
+            quantization=os.getenv("GLOW_INDEX_QUANTIZATION", "none"),
+            rerank_factor=os.getenv("GLOW_RERANK_FACTOR", "4"),
+        )
+
+    @property
+    def compressed(self):
+        """True si l'index ne stocke pas les vecteurs en float32 (résultats à reclasser)"""
+        return self.quantization != "none" or self.backend == "ivf_pq"
+
+    def build_key(self):
+        """Identifiant des paramètres de construction (entre dans l'empreinte du cache)"""
+        suffix = "" if self.quantization == "none" else f"-{self.quantization}"
+        if self.backend == "ivf_flat":
+            return f"ivf_flat-nlist{self.nlist}{suffix}"
+        if self.backend == "hnsw":
+            return f"hnsw-M{self.m}-efc{self.ef_construction}{suffix}"
+        if self.backend == "ivf_pq":
+            return f"ivf_pq-nlist{self.nlist}-m{self.pq_m}x{self.pq_bits}"
+        return f"flat{suffix}"
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    def __repr__(self):
+        return (f"IndexConfig({self.build_key()}, nprobe={self.nprobe}, ef_search={self.ef_search}, "
+                f"rerank_factor={self.rerank_factor})")
+
+
+def _scalar_quantizer_type(config):
+    """Type de quantification scalaire FAISS (None = vecteurs float32)"""
+    if config.quantization == "fp16":
+        return faiss.ScalarQuantizer.QT_fp16
+    if config.quantization == "int8":
+        # 8 bits par dimension, échelle (min, max) propre à chaque dimension
+        return faiss.ScalarQuantizer.QT_8bit
+    return None
+
+
+def _effective_nlist(config, n_vectors):
+    """nlist réduit si le catalogue est trop petit pour entraîner autant de centroïdes"""
+    return max(1, min(config.nlist, n_vectors // MIN_POINTS_PER_CENTROID))
+
+
+def _effective_pq(config, dimension, n_vectors):
+    """(pq_m, pq_bits) valides : pq_m divise la dimension, 2**pq_bits centroïdes entraînables"""
+    pq_m = max(m for m in range(1, min(config.pq_m, dimension) + 1) if dimension % m == 0)
+    max_bits = int(math.log2(max(2, n_vectors // MIN_POINTS_PER_CENTROID)))
+    return pq_m, max(1, min(config.pq_bits, max_bits))
+
+
+def needs_training(config):
+    """True si l'index doit être entraîné sur des vecteurs avant le premier ajout"""
+    return config.backend in ("ivf_flat", "ivf_pq") or config.quantization != "none"
+
+
+def new_index(dimension, n_vectors, config=None):
+    """Index FAISS `config` vide ; `n_vectors` (vecteurs d'entraînement) borne nlist et les codebooks PQ"""
+    config = config or IndexConfig()
+    qtype = _scalar_quantizer_type(config)
+
+    if config.backend == "flat":
+        index = faiss.IndexFlatL2(dimension) if qtype is None else \
+            faiss.IndexScalarQuantizer(dimension, qtype, faiss.METRIC_L2)
+    elif config.backend == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, config.m) if qtype is None else \
+            faiss.IndexHNSWSQ(dimension, qtype, config.m)
+        index.hnsw.efConstruction = config.ef_construction
+    else:
+        nlist = _effective_nlist(config, n_vectors)
+        quantizer = faiss.IndexFlatL2(dimension)
+        if config.backend == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist) if qtype is None else \
+                faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, qtype, faiss.METRIC_L2)
+        else:
+            pq_m, pq_bits = _effective_pq(config, dimension, n_vectors)
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, pq_bits)
+    return index
+
+
+def build_index(vectors, config=None):
+    """Construit (et entraîne si besoin) l'index FAISS `config` sur la matrice float32 `vectors`"""
+    config = config or IndexConfig()
+    n_vectors, dimension = vectors.shape
+    index = new_index(dimension, n_vectors, config)
+
+    # IVF (centroïdes), PQ et quantification scalaire (échelles) sont appris sur le catalogue
+    if not index.is_trained:
+        index.train(vectors)
+    if n_vectors:
+        index.add(vectors)
+    prepare_index(index, config)
+    return index
+
+
+def prepare_index(index, config=None):
+    """
+    Applique les paramètres de recherche (nprobe, ef_search) à un index construit ou
+    rechargé, et active la table position -> liste des index IVF (nécessaire pour
+    relire les vecteurs stockés).
+    """
+    config = config or IndexConfig()
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(config.nprobe, index.nlist)
+        if index.direct_map.type == faiss.DirectMap.NoMap:
+            index.make_direct_map()
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = config.ef_search
+    return index
+
+
+def search_parameters(index, selector=None):
+    """Paramètres de recherche du bon type pour cet index (FAISS refuse les autres), avec un filtre optionnel"""
+    # Passé au constructeur, le sélecteur reste référencé par les paramètres (pas libéré trop tôt)
+    options = {"sel": selector} if selector is not None else {}
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(nprobe=index.nprobe, **options)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=index.hnsw.efSearch, **options)
+    return faiss.SearchParameters(**options)
+
+
+def rerank_exact(full_vectors, queries, indices, k):
+    """
+    Reclasse les candidats `indices` (positions, -1 = vide) d'après les distances L2²
+    calculées avec les vecteurs pleine précision `full_vectors` (tableau ou memmap).
+    Renvoie les k meilleurs (distances, indices), au même format que FAISS.
+    """
+    n_queries = len(queries)
+    distances = np.zeros((n_queries, k), dtype="float32")
+    reranked = np.full((n_queries, k), -1, dtype=np.int64)
+    for row, (query, candidates) in enumerate(zip(queries, indices)):
+        candidates = candidates[candidates != -1]
+        if not len(candidates):
+            continue
+        exact = ((np.asarray(full_vectors[candidates], dtype="float32") - query) ** 2).sum(axis=1)
+        order = np.argsort(exact, kind="stable")[:k]
+        distances[row, :len(order)] = exact[order]
+        reranked[row, :len(order)] = candidates[order]
+    return distances, reranked
+
+
+def index_memory_bytes(index):
+    """Taille sérialisée de l'index (approximation de sa mémoire)"""
+    return int(faiss.serialize_index(index).nbytes)
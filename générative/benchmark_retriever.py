@@ -0,0 +1,221 @@
+"""
+Benchmark rappel / latence de la recherche de produits, par type d'index FAISS.
+
+Le catalogue est encodé une fois (cache d'index habituel), puis agrandi
+synthétiquement (copies bruitées des vecteurs) pour simuler des catalogues de
+plusieurs centaines de milliers de produits. Les requêtes sont celles du gabarit
+RAG (rag_queries), avec et sans ingrédients à éviter. Pour chaque taille de
+catalogue et chaque backend, on mesure :
+- la latence par requête (p50 / p95 / p99) et le débit en recherche groupée,
+- la mémoire de l'index et le temps de construction,
+- le rappel@k par rapport à la recherche exacte (index "flat"),
+- pour les vecteurs en précision réduite (fp16 / int8, reclassés en float32),
+  l'écart de mémoire et de rappel avec le même backend en float32.
+
+Usage :
+    python benchmark_retriever.py [--scales 1 10 100] [--backends flat ivf_flat hnsw ivf_pq]
+                                  [--quantizations none fp16 int8] [--k 5] [--models all-MiniLM-L6-v2]
+                                  [--output benchmark_results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from ann_backends import (INDEX_BACKENDS, QUANTIZATIONS, IndexConfig, build_index, index_memory_bytes,
+                          rerank_exact)
+from build_index import DEFAULT_CSV
+from partitioned_index import masked_search
+from product_retriever import EMBEDDING_MODEL_NAME, ProductRetriever
+from rag_queries import iter_template_queries
+
+# Listes d'ingrédients à éviter des requêtes filtrées (aucune = recherche sans filtre)
+AVOID_LISTS = {
+    "sans filtre": [],
+    "2 ingredients": ["paraben", "sulfate"],
+    "5 ingredients": ["parfum", "alcohol denat", "limonene", "linalool", "paraben"],
+}
+
+# Bruit ajouté aux copies synthétiques des vecteurs (les copies restent proches de l'original)
+SYNTHETIC_NOISE = 0.05
+
+
+def upscale(vectors, allowed_masks, scale, seed=0):
+    """
+    Catalogue synthétique `scale` fois plus grand : copies bruitées et renormalisées des
+    vecteurs ; chaque copie hérite des ingrédients (donc des masques) de son original.
+    """
+    if scale <= 1:
+        return vectors, allowed_masks
+    rng = np.random.default_rng(seed)
+    copies = np.tile(vectors, (scale, 1))
+    copies[len(vectors):] += rng.normal(0.0, SYNTHETIC_NOISE, copies[len(vectors):].shape).astype("float32")
+    copies /= np.linalg.norm(copies, axis=1, keepdims=True)
+    masks = {name: (None if mask is None else np.tile(mask, scale)) for name, mask in allowed_masks.items()}
+    return np.ascontiguousarray(copies, dtype="float32"), masks
+
+
+def backend_config(backend, quantization="none"):
+    """Paramètres des variables d'environnement (GLOW_IVF_NPROBE...), pour le backend demandé"""
+    return IndexConfig(**dict(IndexConfig.from_env().as_dict(), backend=backend, quantization=quantization))
+
+
+def make_search(index, config, full_vectors, k):
+    """Fonction de recherche (requêtes, masque) -> indices, avec reclassement si l'index est compressé"""
+    if not config.compressed:
+        return lambda queries, allowed: masked_search(index, queries, k, allowed)[1]
+
+    def search(queries, allowed):
+        _, candidates = masked_search(index, queries, k * config.rerank_factor, allowed)
+        return rerank_exact(full_vectors, queries, candidates, k)[1]
+    return search
+
+
+def percentiles_ms(latencies):
+    values = np.asarray(latencies) * 1000
+    return {f"p{p}": round(float(np.percentile(values, p)), 4) for p in (50, 95, 99)}
+
+
+def recall_at_k(found, exact):
+    """Part des k voisins exacts retrouvés (moyenne sur les requêtes, résultats vides ignorés)"""
+    recalls = []
+    for row, truth in zip(found, exact):
+        truth = set(truth[truth != -1].tolist())
+        if truth:
+            recalls.append(len(truth & set(row[row != -1].tolist())) / len(truth))
+    return round(float(np.mean(recalls)), 4) if recalls else None
+
+
+def benchmark_index(search, queries, allowed, exact=None):
+    """Latences requête par requête, débit en batch et (si `exact` est donné) rappel@k"""
+    latencies = []
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        search(queries[i:i + 1], allowed)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    indices = search(queries, allowed)
+    batch_time = time.perf_counter() - start
+
+    result = {
+        "latency_ms": percentiles_ms(latencies),
+        "throughput_qps": round(len(queries) / batch_time, 1) if batch_time else None,
+    }
+    if exact is not None:
+        result["recall_at_k"] = recall_at_k(indices, exact)
+    return result, indices
+
+
+def run(models, scales, backends, k, cache_dir=None, csv_path=DEFAULT_CSV, quantizations=("none",)):
+    queries_text = list(iter_template_queries())
+    report = {"k": k, "n_queries": len(queries_text), "csv": os.path.abspath(csv_path), "runs": []}
+
+    for model_name in models:
+        options = {"model_name": model_name, "index_config": IndexConfig("flat")}
+        if cache_dir:
+            options["cache_dir"] = cache_dir
+        retriever = ProductRetriever(csv_path, **options)
+        base_vectors = retriever.vector_store.index.reconstruct_n(0, retriever.vector_store.index.ntotal)
+        queries = retriever.embed_queries(queries_text)
+        base_masks = {name: retriever.allowed_mask(avoid) for name, avoid in AVOID_LISTS.items()}
+
+        for scale in scales:
+            vectors, masks = upscale(base_vectors, base_masks, scale)
+            # Vérité terrain : recherche exacte sur le même catalogue
+            exact_index = build_index(vectors, IndexConfig("flat"))
+            exact = {name: masked_search(exact_index, queries, k, mask)[1] for name, mask in masks.items()}
+
+            for backend, quantization in iter_configs(backends, quantizations):
+                start = time.perf_counter()
+                config = backend_config(backend, quantization)
+                index = exact_index if config.build_key() == "flat" else build_index(vectors, config)
+                build_time = time.perf_counter() - start
+                search = make_search(index, config, vectors, k)
+
+                run_report = {
+                    "model": model_name,
+                    "scale": scale,
+                    "n_products": int(len(vectors)),
+                    "backend": backend,
+                    "quantization": config.quantization,
+                    "index": config.as_dict(),
+                    "build_s": round(build_time, 3),
+                    "memory_bytes": index_memory_bytes(index),
+                    "queries": {},
+                }
+                for name, mask in masks.items():
+                    run_report["queries"][name], _ = benchmark_index(search, queries, mask, exact[name])
+                add_quantization_deltas(run_report, report["runs"])
+                report["runs"].append(run_report)
+                print_run(run_report)
+    return report
+
+
+def iter_configs(backends, quantizations):
+    """Couples (backend, quantification) à mesurer (IVF-PQ est déjà compressé : mesuré une fois)"""
+    for backend in backends:
+        for quantization in quantizations:
+            if backend == "ivf_pq" and quantization != "none":
+                continue
+            yield backend, quantization
+
+
+def add_quantization_deltas(run_report, previous_runs):
+    """Écart de mémoire (ratio) et de rappel avec le même backend en float32, s'il a été mesuré"""
+    if run_report["quantization"] == "none":
+        return
+    for reference in previous_runs:
+        if (reference["quantization"] == "none" and reference["backend"] == run_report["backend"]
+                and reference["scale"] == run_report["scale"] and reference["model"] == run_report["model"]):
+            run_report["vs_float32"] = {
+                "memory_ratio": round(reference["memory_bytes"] / max(1, run_report["memory_bytes"]), 2),
+                "recall_delta": {
+                    name: (None if result["recall_at_k"] is None or reference["queries"][name]["recall_at_k"] is None
+                           else round(result["recall_at_k"] - reference["queries"][name]["recall_at_k"], 4))
+                    for name, result in run_report["queries"].items()
+                },
+            }
+            return
+
+
+def print_run(run_report):
+    head = (f"{run_report['model']} x{run_report['scale']:<4} {run_report['n_products']:>8} produits "
+            f"{run_report['backend']:>8} {run_report['quantization']:>4} | build {run_report['build_s']:7.2f}s | "
+            f"{run_report['memory_bytes'] / 1e6:8.1f} Mo")
+    if "vs_float32" in run_report:
+        head += f" | mémoire /{run_report['vs_float32']['memory_ratio']} vs float32"
+    print(head)
+    for name, result in run_report["queries"].items():
+        latency = result["latency_ms"]
+        print(f"    {name:>14} : p50 {latency['p50']:7.3f} ms  p95 {latency['p95']:7.3f} ms  "
+              f"p99 {latency['p99']:7.3f} ms  | {result['throughput_qps']:>9} req/s  "
+              f"| rappel@k {result['recall_at_k']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark rappel / latence de la recherche de produits")
+    parser.add_argument("--csv", default=DEFAULT_CSV, help="Chemin du catalogue CSV")
+    parser.add_argument("--models", nargs="+", default=[EMBEDDING_MODEL_NAME], help="Modèles d'embedding")
+    parser.add_argument("--scales", nargs="+", type=int, default=[1, 10, 100],
+                        help="Facteurs d'agrandissement synthétique du catalogue")
+    parser.add_argument("--backends", nargs="+", choices=INDEX_BACKENDS, default=list(INDEX_BACKENDS))
+    parser.add_argument("--quantizations", nargs="+", choices=QUANTIZATIONS, default=["none"],
+                        help="Précisions de stockage des vecteurs (fp16 / int8 : reclassement en float32)")
+    parser.add_argument("--k", type=int, default=5, help="Nombre de produits par requête")
+    parser.add_argument("--cache-dir", default=None, help="Dossier du cache d'index")
+    parser.add_argument("--output", default="benchmark_results.json", help="Fichier JSON des résultats")
+    args = parser.parse_args(argv)
+
+    report = run(args.models, args.scales, args.backends, args.k, args.cache_dir, args.csv, args.quantizations)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Résultats écrits dans {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+"""
+Pré-construction du cache d'index produits (à lancer au déploiement ou sur une machine de build).
+
+Le CSV est lu par morceaux (--chunk-size lignes) et chaque morceau est encodé par
+lots (--batch-size) par un pool de --workers processus : les processus de service
+n'ont plus qu'à charger l'index écrit dans le cache. Les vecteurs d'un morceau sont
+ajoutés à l'index FAISS dès leur encodage (après l'entraînement des index IVF / PQ /
+quantifiés sur les premiers vecteurs) et écrits dans un fichier temporaire projeté
+en mémoire ; ses colonnes de texte sont ajoutées au docstore. Si une version
+précédente du catalogue est en cache, chaque morceau lui est apparié et seuls les
+produits ajoutés ou modifiés sont encodés.
+
+Usage :
+    python build_index.py [--csv skincare_products.csv] [--cache-dir .index_cache] [--force] [--prune]
+                          [--no-precompute-queries] [--chunk-size 10000] [--batch-size 64] [--workers 1]
+                          [--no-incremental]
+                          [--backend flat|ivf_flat|hnsw|ivf_pq] [--nlist 1024] [--nprobe 16]
+                          [--hnsw-m 32] [--ef-construction 200] [--ef-search 64] [--pq-m 48] [--pq-bits 8]
+                          [--quantization none|fp16|int8] [--rerank-factor 4]
+
+Sans option, le type d'index est lu dans les variables d'environnement (voir ann_backends.py).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from ann_backends import INDEX_BACKENDS, QUANTIZATIONS, IndexConfig, needs_training, new_index, prepare_index
+from catalog import Catalog
+from catalog_update import StreamingUpdate
+from index_cache import (DEFAULT_CACHE_DIR, cache_entry_path, cache_lock, catalog_fingerprint, clear_cache,
+                         read_manifest, remove_cache_entry, save_vector_store)
+from product_retriever import EMBEDDING_MODEL_NAME, LazyEmbeddings, ProductRetriever
+from shared_store import ColumnDocstore, PositionIds
+
+DEFAULT_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "skincare_products.csv")
+DEFAULT_CHUNK_SIZE = 10000
+DEFAULT_BATCH_SIZE = 64
+# Vecteurs gardés en mémoire pour entraîner un index IVF / PQ / quantifié avant le premier ajout
+TRAINING_SAMPLE = int(os.getenv("GLOW_BUILD_TRAINING_SAMPLE", "100000"))
+
+
+class ParallelEncoder:
+    """
+    Encodage des textes par lots, dans le processus courant ou dans un pool de
+    processus CPU (sentence-transformers). Mêmes vecteurs que HuggingFaceEmbeddings.
+    """
+
+    def __init__(self, model_name, batch_size=DEFAULT_BATCH_SIZE, workers=1):
+        from sentence_transformers import SentenceTransformer
+
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.pool = self.model.start_multi_process_pool(["cpu"] * workers) if workers > 1 else None
+        self.n_documents = 0
+        self.seconds = 0.0
+
+    def encode(self, texts):
+        start = time.perf_counter()
+        if self.pool is not None:
+            vectors = self.model.encode_multi_process(texts, self.pool, batch_size=self.batch_size)
+        else:
+            vectors = self.model.encode(texts, batch_size=self.batch_size, show_progress_bar=False)
+        self.seconds += time.perf_counter() - start
+        self.n_documents += len(texts)
+        return np.asarray(vectors, dtype="float32")
+
+    @property
+    def docs_per_second(self):
+        return self.n_documents / self.seconds if self.seconds else 0.0
+
+    def close(self):
+        if self.pool is not None:
+            self.model.stop_multi_process_pool(self.pool)
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StreamingIndex:
+    """
+    Index FAISS rempli morceau par morceau. Les vecteurs sont ajoutés dès qu'ils
+    arrivent ; un index qui doit être entraîné garde d'abord les `training_sample`
+    premiers vecteurs, s'entraîne dessus puis les ajoute. Tous les vecteurs sont
+    aussi écrits dans `spill_dir` et relus par projection mémoire (finish) : la
+    matrice complète n'est jamais assemblée en mémoire.
+    """
+
+    def __init__(self, index_config, spill_dir, index=None, training_sample=TRAINING_SAMPLE):
+        self.config = index_config
+        # Index vide déjà entraîné (mise à jour incrémentale) ou None
+        self.index = index
+        self.training_sample = training_sample
+        self.ntotal = 0
+        self.dimension = None
+        self._pending = []
+        self._n_pending = 0
+        self._spill_path = os.path.join(spill_dir, "vectors.f32")
+        self._spill = open(self._spill_path, "wb")
+
+    def add(self, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        self.dimension = vectors.shape[1]
+        self._spill.write(vectors.tobytes())
+        self.ntotal += len(vectors)
+        if self.index is not None:
+            self.index.add(vectors)
+            return
+        self._pending.append(vectors)
+        self._n_pending += len(vectors)
+        if not needs_training(self.config) or self._n_pending >= self.training_sample:
+            self._start()
+
+    def _start(self):
+        """Crée (et entraîne) l'index sur les vecteurs en attente, puis les y ajoute"""
+        sample = np.vstack(self._pending)
+        self._pending, self._n_pending = [], 0
+        self.index = new_index(self.dimension, len(sample), self.config)
+        if not self.index.is_trained:
+            self.index.train(sample)
+        self.index.add(sample)
+
+    def finish(self):
+        """(vecteurs float32 projetés en mémoire, index prêt pour la recherche)"""
+        self._spill.close()
+        if not self.ntotal:
+            raise ValueError("Catalogue vide : aucun vecteur à indexer")
+        if self.index is None:
+            self._start()
+        vectors = np.memmap(self._spill_path, dtype="float32", mode="r", shape=(self.ntotal, self.dimension))
+        return vectors, prepare_index(self.index, self.config)
+
+
+def build_offline(csv_path, model_name, cache_dir, index_config, fingerprint, chunk_size=DEFAULT_CHUNK_SIZE,
+                  batch_size=DEFAULT_BATCH_SIZE, workers=1, incremental=True):
+    """Encode le catalogue hors du service et écrit l'entrée de cache lue par ProductRetriever"""
+    # Une version précédente en cache : seul le delta de chaque morceau est encodé
+    update = StreamingUpdate.start(cache_dir, fingerprint, model_name, index_config) if incremental else None
+    os.makedirs(cache_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="glow-build-", dir=cache_dir) as spill_dir, \
+            ParallelEncoder(model_name, batch_size, workers) as encoder:
+        stream = StreamingIndex(index_config, spill_dir, update.empty_index(index_config) if update else None)
+        docstore = ColumnDocstore({}, 0)
+        for part in Catalog.iter_csv(csv_path, chunk_size):
+            if update is not None:
+                stream.add(update.vectors(part, encoder.encode))
+            else:
+                stream.add(encoder.encode(part.page_content.tolist()))
+            docstore.append(part.columns(), len(part))
+            print(f"  {stream.ntotal} produits indexés, {encoder.n_documents} encodés "
+                  f"({encoder.docs_per_second:.0f} docs/s)")
+        vectors, index = stream.finish()
+
+        stats = {"documents_encoded": encoder.n_documents, "docs_per_second": round(encoder.docs_per_second, 1),
+                 "batch_size": batch_size, "workers": workers}
+        print(f"Encodage : {stats['documents_encoded']} produits à {stats['docs_per_second']} docs/s "
+              f"({workers} processus, lots de {batch_size})")
+        extra_manifest = {"build": stats}
+        if update is not None:
+            extra_manifest["update"] = update_info = update.summary()
+            print(f"Mise à jour incrémentale depuis {update_info['parent'][:16]} : "
+                  f"{update_info['added']} ajouté(s), {update_info['changed']} modifié(s), "
+                  f"{update_info['removed']} retiré(s)")
+
+        vector_store = FAISS(embedding_function=LazyEmbeddings(model_name), index=index, docstore=docstore,
+                             index_to_docstore_id=PositionIds(docstore.size))
+        # Le fichier temporaire des vecteurs reste ouvert jusqu'à la fin de la sauvegarde
+        return save_vector_store(cache_dir, fingerprint, vector_store, csv_path, model_name, index_config,
+                                 full_vectors=vectors if index_config.compressed else None,
+                                 extra_manifest=extra_manifest)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Construit le cache d'index FAISS du catalogue produits")
+    parser.add_argument("--csv", default=DEFAULT_CSV, help="Chemin du catalogue CSV")
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME, help="Modèle d'embedding")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Dossier du cache d'index")
+    parser.add_argument("--force", action="store_true", help="Reconstruit même si l'entrée existe déjà")
+    parser.add_argument("--prune", action="store_true", help="Supprime les anciennes entrées du cache")
+    parser.add_argument("--no-precompute-queries", action="store_true",
+                        help="Ne pré-calcule pas les embeddings des requêtes du gabarit RAG")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Lignes du CSV lues à la fois")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Textes encodés par lot")
+    parser.add_argument("--workers", type=int, default=1, help="Processus d'encodage (CPU)")
+    parser.add_argument("--no-incremental", action="store_true",
+                        help="Ré-encode tout le catalogue même si une version précédente est en cache")
+    defaults = IndexConfig.from_env()
+    parser.add_argument("--backend", choices=INDEX_BACKENDS, default=defaults.backend, help="Type d'index FAISS")
+    parser.add_argument("--nlist", type=int, default=defaults.nlist, help="IVF : nombre de listes")
+    parser.add_argument("--nprobe", type=int, default=defaults.nprobe, help="IVF : listes visitées par requête")
+    parser.add_argument("--hnsw-m", type=int, default=defaults.m, help="HNSW : voisins par nœud")
+    parser.add_argument("--ef-construction", type=int, default=defaults.ef_construction,
+                        help="HNSW : candidats explorés à la construction")
+    parser.add_argument("--ef-search", type=int, default=defaults.ef_search,
+                        help="HNSW : candidats explorés par requête")
+    parser.add_argument("--pq-m", type=int, default=defaults.pq_m, help="IVF-PQ : nombre de sous-vecteurs")
+    parser.add_argument("--pq-bits", type=int, default=defaults.pq_bits, help="IVF-PQ : bits par sous-vecteur")
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, default=defaults.quantization,
+                        help="Précision de stockage des vecteurs (fp16 / int8 : reclassement en float32)")
+    parser.add_argument("--rerank-factor", type=int, default=defaults.rerank_factor,
+                        help="Candidats reclassés en pleine précision : rerank_factor * k")
+    args = parser.parse_args(argv)
+
+    index_config = IndexConfig(backend=args.backend, nlist=args.nlist, nprobe=args.nprobe, m=args.hnsw_m,
+                               ef_construction=args.ef_construction, ef_search=args.ef_search,
+                               pq_m=args.pq_m, pq_bits=args.pq_bits, quantization=args.quantization,
+                               rerank_factor=args.rerank_factor)
+    fingerprint = catalog_fingerprint(args.csv, args.model, index_config.build_key())
+
+    start = time.perf_counter()
+    # Même verrou que les processus de service : personne ne construit la même entrée en parallèle
+    with cache_lock(args.cache_dir, fingerprint):
+        if args.force:
+            remove_cache_entry(args.cache_dir, fingerprint)
+        manifest = read_manifest(cache_entry_path(args.cache_dir, fingerprint))
+        if manifest and manifest.get("fingerprint") == fingerprint:
+            print("Index déjà en cache pour ce catalogue")
+        else:
+            build_offline(args.csv, args.model, args.cache_dir, index_config, fingerprint, args.chunk_size,
+                          args.batch_size, args.workers, incremental=not args.no_incremental)
+
+    # Le moteur relit l'index écrit (sans rien encoder) pour pré-calculer les requêtes
+    retriever = ProductRetriever(args.csv, model_name=args.model, cache_dir=args.cache_dir,
+                                 index_config=index_config)
+    if not args.no_precompute_queries:
+        n_queries = retriever.precompute_query_embeddings()
+        print(f"{n_queries} requêtes RAG pré-calculées")
+    elapsed = time.perf_counter() - start
+
+    if args.prune:
+        removed = clear_cache(args.cache_dir, keep=fingerprint)
+        print(f"{removed} ancienne(s) entrée(s) supprimée(s)")
+
+    print(f"Cache prêt en {elapsed:.2f}s : {cache_entry_path(args.cache_dir, fingerprint)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Catalogue produits en colonnes, chargé sans boucle ligne à ligne.
+
+Le CSV est lu une fois par pandas et chaque champ devient un tableau : textes
+(catégories internées), prix en euros (float32) et texte à encoder. Les documents
+LangChain ne sont construits qu'à la demande, pour les produits renvoyés par une
+recherche (voir shared_store.ColumnDocstore).
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+from pricing import parse_prices
+from shared_store import ColumnDocstore
+
+
+def _as_text(series):
+    """Série de chaînes, valeurs manquantes -> "nan" comme str() (pandas >= 3 garde NaN avec astype(str))"""
+    return series.astype(str).fillna("nan")
+
+
+def _text_column(frame, name):
+    """Colonne du CSV en tableau de chaînes (valeurs manquantes -> "nan", comme str())"""
+    if name not in frame:
+        return np.full(len(frame), "", dtype=object)
+    return _as_text(frame[name]).to_numpy(dtype=object)
+
+
+def _interned(values):
+    """Tableau de chaînes où chaque valeur distincte n'existe qu'une fois en mémoire"""
+    codes, uniques = pd.factorize(values)
+    uniques = np.array([sys.intern(str(value)) for value in uniques], dtype=object)
+    return uniques[codes]
+
+
+class Catalog:
+    """Colonnes du catalogue (une position = un produit, alignée sur l'index FAISS)"""
+
+    def __init__(self, frame):
+        self.names = _text_column(frame, "product_name")
+        self.types = _interned(_text_column(frame, "product_type"))
+        self.prices = _interned(_text_column(frame, "price"))
+        self.urls = _text_column(frame, "product_url")
+        raw_ingredients = _as_text(frame["ingredients"])
+        # Stocké en minuscules pour le filtrage des ingrédients à éviter
+        self.ingredients = raw_ingredients.str.lower().to_numpy(dtype=object)
+        self.prices_eur = parse_prices(self.prices)
+
+        # Texte descriptif encodé par le modèle d'embedding : Type, Nom, Prix et Ingrédients
+        self.page_content = ("Type: " + pd.Series(self.types) + ". Nom: " + pd.Series(self.names)
+                             + ". Prix: " + pd.Series(self.prices) + ". Ingrédients: "
+                             + raw_ingredients.reset_index(drop=True) + ".").to_numpy(dtype=object)
+
+    @classmethod
+    def from_csv(cls, csv_path):
+        return cls(pd.read_csv(csv_path))
+
+    @classmethod
+    def iter_csv(cls, csv_path, chunk_size):
+        """Catalogue lu par morceaux de `chunk_size` lignes (un Catalog par morceau)"""
+        for frame in pd.read_csv(csv_path, chunksize=chunk_size):
+            yield cls(frame)
+
+    @classmethod
+    def concat(cls, parts):
+        """Catalogue formé des morceaux `parts`, dans l'ordre"""
+        parts = list(parts)
+        catalog = cls.__new__(cls)
+        for name in ("names", "urls", "ingredients", "page_content"):
+            setattr(catalog, name, np.concatenate([getattr(part, name) for part in parts]))
+        catalog.types = _interned(np.concatenate([part.types for part in parts]))
+        catalog.prices = _interned(np.concatenate([part.prices for part in parts]))
+        catalog.prices_eur = np.concatenate([part.prices_eur for part in parts])
+        return catalog
+
+    def __len__(self):
+        return len(self.names)
+
+    def columns(self):
+        """Colonnes au format du docstore en colonnes"""
+        return {
+            "page_content": self.page_content,
+            "name": self.names,
+            "type": self.types,
+            "price": self.prices,
+            "url": self.urls,
+            "ingredients": self.ingredients,
+        }
+
+    def docstore(self):
+        """Docstore qui construit les documents à la demande"""
+        return ColumnDocstore(self.columns(), len(self))
+
+    def document(self, position):
+        return self.docstore().search(position)
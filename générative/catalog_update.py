@@ -0,0 +1,198 @@
+"""
+Mise à jour incrémentale de l'index après une modification du catalogue CSV.
+
+Quand le CSV change, on repart de la dernière version en cache (même modèle
+d'embedding, même type d'index) au lieu de tout ré-encoder :
+- les produits sont appariés par clé stable (le nom du produit, unique dans le
+  catalogue ; l'URL ne l'est pas) ;
+- seuls les produits ajoutés ou dont le texte indexé a changé (type, nom, prix,
+  ingrédients) sont encodés, les autres reprennent leur vecteur ;
+- l'index approché réutilise l'entraînement de la version précédente (centroïdes
+  IVF, codebooks PQ, échelles de quantification) : une copie est vidée puis remplie.
+La nouvelle version est ensuite sauvegardée atomiquement comme nouvelle entrée du
+cache ; les processus de service la chargent et basculent dessus (voir
+glow.reload_catalog_if_changed).
+"""
+import os
+
+import faiss
+import numpy as np
+import pandas as pd
+
+from ann_backends import IndexConfig, build_index, needs_training, prepare_index
+from index_cache import load_shared_store, read_manifest
+
+# Clé stable d'un produit (colonne du catalogue)
+PRODUCT_KEY = "name"
+
+
+class PreviousKeys:
+    """Clés (sans doublon) et textes indexés d'une version précédente, préparés une fois"""
+
+    def __init__(self, old_keys, old_contents):
+        old_keys = pd.Index(np.asarray(list(old_keys), dtype=object))
+        # En cas de doublon de clé dans l'ancienne version, on garde la première occurrence
+        unique = ~old_keys.duplicated()
+        self.positions = np.flatnonzero(unique)
+        self.index = pd.Index(old_keys[unique])
+        self.contents = np.asarray(list(old_contents), dtype=object)
+
+
+class CatalogDiff:
+    """Appariement d'un nouveau catalogue (ou d'un morceau) avec la version précédente"""
+
+    def __init__(self, old_keys, old_contents, new_keys, new_contents):
+        self._match(PreviousKeys(old_keys, old_contents), new_keys, new_contents)
+
+    @classmethod
+    def against(cls, previous, new_keys, new_contents):
+        """Appariement avec une version précédente déjà préparée (PreviousKeys)"""
+        diff = cls.__new__(cls)
+        diff._match(previous, new_keys, new_contents)
+        return diff
+
+    def _match(self, previous, new_keys, new_contents):
+        matched = previous.index.get_indexer(np.asarray(new_keys, dtype=object))
+        self.previous = np.where(matched >= 0, previous.positions[np.maximum(matched, 0)], -1)
+        found = self.previous >= 0
+        same = np.zeros(len(self.previous), dtype=bool)
+        if found.any():
+            same[found] = previous.contents[self.previous[found]] == np.asarray(new_contents, dtype=object)[found]
+
+        # Position (ancienne version) du vecteur réutilisable, -1 si le produit doit être encodé
+        self.reuse = np.where(same, self.previous, -1)
+        self.added = int((~found).sum())
+        self.changed = int((found & ~same).sum())
+        self.unchanged = int(same.sum())
+        # Pour un morceau du catalogue, "removed" compte aussi les produits des autres morceaux
+        self.removed = int(len(previous.positions) - len(np.unique(self.previous[found])))
+
+    @property
+    def to_embed(self):
+        """Positions (nouveau catalogue) des produits à encoder"""
+        return np.flatnonzero(self.reuse < 0)
+
+    def summary(self):
+        return {"added": self.added, "changed": self.changed, "removed": self.removed, "unchanged": self.unchanged}
+
+
+def find_previous_entry(cache_dir, model_name, index_config, exclude=None):
+    """Empreinte de la version en cache la plus récente compatible (même modèle, même index), ou None"""
+    if not os.path.isdir(cache_dir):
+        return None
+    candidates = []
+    for name in os.listdir(cache_dir):
+        manifest = read_manifest(os.path.join(cache_dir, name))
+        if not manifest or manifest.get("fingerprint") in (None, exclude):
+            continue
+        if manifest.get("model_name") != model_name:
+            continue
+        try:
+            build_key = IndexConfig(**manifest.get("index", {})).build_key()
+        except (TypeError, ValueError):
+            continue
+        if build_key == index_config.build_key():
+            candidates.append((manifest.get("created_at", ""), manifest["fingerprint"]))
+    return max(candidates)[1] if candidates else None
+
+
+def empty_index_like(previous_index, index_config):
+    """
+    Copie vide de `previous_index`, entraînement conservé (centroïdes, codebooks,
+    échelles), à remplir avec les nouveaux vecteurs ; None s'il n'y a rien à
+    conserver (index plat), pour HNSW, dont le graphe dépend de tous les vecteurs,
+    ou si l'index ne peut pas être copié.
+    """
+    if index_config.backend == "hnsw" or not needs_training(index_config):
+        return None
+    try:
+        # Copie privée : l'index du stockage partagé est projeté en lecture seule (pas de reset possible)
+        index = faiss.deserialize_index(faiss.serialize_index(previous_index))
+        index.reset()
+        return index
+    except RuntimeError as e:
+        print(f"Index precedent non reutilisable ({e}), nouvel entrainement...")
+        return None
+
+
+def _refill_index(previous_index, vectors, index_config):
+    """Index de même type que `previous_index`, entraînement conservé, rempli avec `vectors`"""
+    index = empty_index_like(previous_index, index_config)
+    if index is None:
+        # Reconstruit sans ré-encodage
+        return build_index(vectors, index_config)
+    index.add(vectors)
+    return prepare_index(index, index_config)
+
+
+def reuse_vectors(store, diff, catalog, embed_documents):
+    """Vecteurs de `catalog` : repris de la version précédente `store`, ou encodés (delta seulement)"""
+    vectors = np.empty((len(catalog), store.vectors.shape[1]), dtype="float32")
+    reused = diff.reuse >= 0
+    vectors[reused] = store.vectors[diff.reuse[reused]]
+
+    to_embed = diff.to_embed
+    if len(to_embed):
+        vectors[to_embed] = np.asarray(embed_documents(catalog.page_content[to_embed].tolist()), dtype="float32")
+    return vectors
+
+
+def previous_store(cache_dir, fingerprint, model_name, index_config):
+    """(empreinte, stockage partagé) de la version précédente exploitable, ou (None, None)"""
+    previous = find_previous_entry(cache_dir, model_name, index_config, exclude=fingerprint)
+    store = load_shared_store(cache_dir, previous) if previous else None
+    return (previous, store) if store is not None else (None, None)
+
+
+def incremental_update(cache_dir, fingerprint, model_name, index_config, catalog, embed_documents):
+    """
+    Vecteurs et index du nouveau `catalog` construits à partir de la version précédente.
+    `embed_documents(textes)` n'est appelé que pour le delta. Renvoie
+    (vecteurs, index, informations sur la mise à jour) ou None si aucune version
+    précédente exploitable n'existe (il faut alors tout encoder).
+    """
+    previous, store = previous_store(cache_dir, fingerprint, model_name, index_config)
+    if store is None:
+        return None
+
+    diff = CatalogDiff(store.columns[PRODUCT_KEY], store.columns["page_content"],
+                       catalog.columns()[PRODUCT_KEY], catalog.page_content)
+    vectors = reuse_vectors(store, diff, catalog, embed_documents)
+    info = dict(diff.summary(), parent=previous)
+    return vectors, _refill_index(store.index, vectors, index_config), info
+
+
+class StreamingUpdate:
+    """
+    Mise à jour incrémentale appliquée au nouveau catalogue morceau par morceau
+    (build_index.py) : chaque morceau est apparié à la version précédente, les
+    comptes sont cumulés et un produit retiré est un produit jamais retrouvé.
+    """
+
+    def __init__(self, parent, store):
+        self.parent = parent
+        self.store = store
+        self.keys = PreviousKeys(store.columns[PRODUCT_KEY], store.columns["page_content"])
+        self._matched = np.zeros(store.size, dtype=bool)
+        self.counts = {"added": 0, "changed": 0, "unchanged": 0}
+
+    @classmethod
+    def start(cls, cache_dir, fingerprint, model_name, index_config):
+        """Mise à jour depuis la version précédente exploitable, ou None (il faut alors tout encoder)"""
+        parent, store = previous_store(cache_dir, fingerprint, model_name, index_config)
+        return cls(parent, store) if store is not None else None
+
+    def empty_index(self, index_config):
+        return empty_index_like(self.store.index, index_config)
+
+    def vectors(self, part, embed_documents):
+        """Vecteurs du morceau `part` (Catalog) ; `embed_documents` n'est appelé que pour son delta"""
+        diff = CatalogDiff.against(self.keys, part.columns()[PRODUCT_KEY], part.page_content)
+        for name in self.counts:
+            self.counts[name] += getattr(diff, name)
+        self._matched[diff.previous[diff.previous >= 0]] = True
+        return reuse_vectors(self.store, diff, part, embed_documents)
+
+    def summary(self):
+        removed = int(len(self.keys.positions) - self._matched.sum())
+        return dict(self.counts, removed=removed, parent=self.parent)
@@ -0,0 +1,69 @@
+"""Outils communs des tests : moteur de recherche de produits sans modèle d'embedding"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+import pytest
+from langchain_core.embeddings import Embeddings
+
+import product_retriever
+
+EMBEDDING_DIM = 32
+
+# Petit catalogue : toutes les catégories des étapes de routine, prix en livres
+SAMPLE_CATALOG = [
+    ("Glow Gentle Cleanser", "Cleanser", "aqua, glycerin", "£8.00"),
+    ("Glow Foam Cleanser", "Cleanser", "aqua, sodium laureth sulfate", "£4.00"),
+    ("Glow Vitamin C Serum", "Serum", "aqua, ascorbic acid", "£15.00"),
+    ("Glow Niacinamide Serum", "Serum", "aqua, niacinamide", "£6.00"),
+    ("Glow Daily Moisturiser", "Moisturiser", "aqua, glycerin, shea", "£10.00"),
+    ("Glow Day Cream SPF 30", "Moisturiser", "aqua, zinc oxide", "£12.00"),
+    ("Glow Cleansing Balm", "Balm", "shea butter, oil", "£9.00"),
+    ("Glow Rosehip Oil", "Oil", "rosehip oil", "£7.00"),
+    ("Glow Night Cream", "Moisturiser", "aqua, retinol", "£14.00"),
+    ("Glow AHA Exfoliator", "Exfoliator", "glycolic acid", "£11.00"),
+    ("Glow Clay Mask", "Mask", "kaolin, aqua", "£5.00"),
+]
+
+
+class HashEmbeddings(Embeddings):
+    """Sac de mots haché et normalisé : déterministe, instantané, sans sentence-transformers"""
+
+    def __init__(self, model_name=None):
+        self.model_name = model_name
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+    @staticmethod
+    def _embed(text):
+        vector = np.zeros(EMBEDDING_DIM, dtype="float32")
+        for word in str(text).lower().split():
+            vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % EMBEDDING_DIM] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+
+def write_catalog(path, rows):
+    """CSV au format du catalogue à partir de (nom, catégorie, ingrédients, prix)"""
+    pd.DataFrame([{"product_name": name, "product_url": f"https://example.com/{i}", "product_type": product_type,
+                   "ingredients": ingredients, "price": price}
+                  for i, (name, product_type, ingredients, price) in enumerate(rows)]).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture
+def make_retriever(tmp_path, monkeypatch):
+    """Fabrique de ProductRetriever sur un petit catalogue, avec cache d'index dans tmp_path"""
+    monkeypatch.setattr(product_retriever, "LazyEmbeddings", HashEmbeddings)
+
+    def make(rows=SAMPLE_CATALOG, **kwargs):
+        csv_path = write_catalog(tmp_path / "catalog.csv", rows)
+        kwargs.setdefault("cache_dir", str(tmp_path / "cache"))
+        return product_retriever.ProductRetriever(csv_path, **kwargs)
+    return make
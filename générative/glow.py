@@ -1,119 +1,404 @@
 """Module IA Générative - Glow avec LangChain, Mistral AI et RAG"""
 
 import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from dotenv import load_dotenv
-from typing import Dict, Any, List
-from langchain_mistralai import ChatMistralAI
-from langchain_core.prompts import ChatPromptTemplate
-from pydantic import BaseModel, Field
-from product_retriever import ProductRetriever  # Import du module RAG
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple
+from schemas import SkincareRoutine, FullSkincareRoutine  # Schémas de sortie
+from response_cache import ResponseCache  # Cache des réponses structurées
+from profile_buckets import PrecomputedRoutineStore, profile_bucket_key  # Routines pré-calculées
+from rag_queries import ROUTINE_RAG_TOPICS, build_rag_query  # Gabarit des requêtes RAG
+from stage_metrics import metrics, span, timed  # Durées par étape (GLOW_METRICS=1)
+from llm_usage import call_usage, ledger  # Tokens et tailles des appels LLM
+
+# LangChain, Mistral, FAISS et le modèle d'embedding (et pandas / NumPy) sont importés
+# à la première utilisation : importer ce module reste rapide, la page d'accueil de
+# l'application s'affiche sans attendre le moteur (voir test_import_time.py).
+if TYPE_CHECKING:
+    from routine_assembler import RoutineAssembler
 
 # Charger configuration
 load_dotenv()
-api_key = os.getenv('MISTRAL_API_KEY')
 
-if not api_key:
-    raise ValueError("MISTRAL_API_KEY non trouvée dans .env")
+# Les trois routines d'une génération complète (le thème de leur recherche RAG est dans rag_queries)
+ROUTINE_KEYS = ("morning", "evening", "weekly")
+ROUTINE_LABELS = {"morning": "matin", "evening": "soir", "weekly": "hebdomadaire"}
+
+# "separate" : un appel Mistral par routine (3 prompts) ; "single" : un seul appel
+# pour les trois routines, avec un seul bloc profil et un seul contexte RAG
+ROUTINE_MODES = ("separate", "single")
+DEFAULT_ROUTINE_MODE = os.getenv("GLOW_ROUTINE_MODE", "separate")
+
+# Si une routine échoue côté Mistral, on renvoie une routine assemblée localement
+# (désactivable avec GLOW_LOCAL_FALLBACK=0)
+LOCAL_FALLBACK_ENABLED = os.getenv("GLOW_LOCAL_FALLBACK", "1") != "0"
+
+# Cache des réponses (mémoire + SQLite), désactivable avec GLOW_RESPONSE_CACHE=0
+RESPONSE_CACHE_ENABLED = os.getenv("GLOW_RESPONSE_CACHE", "1") != "0"
+
+# Préchauffage du moteur en arrière-plan au démarrage de l'application (GLOW_WARMUP=1)
+WARMUP_ENABLED = os.getenv("GLOW_WARMUP", "0") == "1"
+
+
+class RoutineResults(dict):
+    """
+    Résultat d'une génération complète : {"morning", "evening", "weekly"} -> SkincareRoutine.
+    Une routine en échec vaut None et la cause est conservée dans `errors`.
+    """
 
-# --- DÉFINITION DES SCHÉMAS (LES MOULES) ---
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.errors: Dict[str, Exception] = {}
+        # Routines assemblées localement (sans LLM), en repli ou en chemin rapide
+        self.local_keys = set()
+        # Relevés (tokens, tailles) des appels LLM qui ont produit ces routines, par routine
+        # ("full" : appel unique du mode "single", commun aux trois routines)
+        self.usage: Dict[str, Dict[str, Any]] = {}
 
-class SkincareProduct(BaseModel):
-    """Représente un produit de soin recommandé."""
-    name: str = Field(description="Nom complet du produit")
-    brand: str = Field(description="Marque du produit")
-    description: str = Field(description="Courte explication de pourquoi ce produit est choisi (bénéfices)")
-    price_estimation: str = Field(description="Prix estimé (ex: '15€')")
+    def add_result(self, key: str, routine, usage: Optional[Dict[str, Any]] = None):
+        self[key] = routine
+        if usage is not None:
+            self.usage[key] = usage
 
-class RoutineStep(BaseModel):
-    """Une étape de la routine beauté."""
-    step_name: str = Field(description="Nom de l'étape (ex: 'Nettoyage', 'Sérum')")
-    products: List[SkincareProduct] = Field(description="Liste des produits recommandés pour cette étape")
-    usage_tips: str = Field(description="Conseils d'application spécifiques pour cette étape")
+    def add_error(self, key: str, error: Exception):
+        print(f"Erreur lors de la génération de la routine {ROUTINE_LABELS.get(key, key)} : {error}")
+        self[key] = None
+        self.errors[key] = error
+
+    def ordered(self) -> "RoutineResults":
+        """Remet les clés dans l'ordre matin / soir / hebdo (l'ordre d'arrivée peut varier)"""
+        ordered = RoutineResults((key, self.get(key)) for key in ROUTINE_KEYS)
+        ordered.errors = dict(self.errors)
+        ordered.local_keys = set(self.local_keys)
+        ordered.usage = dict(self.usage)
+        return ordered
+
+
+def _build_retriever():
+    """Crée le moteur de recherche de produits, ou None si le RAG est indisponible"""
+    try:
+        print("Initialisation du moteur de recherche de produits (RAG)...")
+        from product_retriever import ProductRetriever
+
+        # Chemin absolu vers le CSV (même dossier que ce script)
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        csv_path = os.path.join(current_dir, "skincare_products.csv")
+        
+        retriever = ProductRetriever(csv_path)
+        memory = retriever.memory_stats()
+        if memory.get("rss"):
+            print(f"RAG prêt ! (mémoire du processus : {memory['rss'] / 1e6:.0f} Mo, "
+                  f"dont {(memory.get('shared') or 0) / 1e6:.0f} Mo partagés)")
+        else:
+            print("RAG prêt !")
+        return retriever
+    except Exception as e:
+        print(f"Attention: Impossible d'initialiser le RAG ({e}). L'IA utilisera ses connaissances générales.")
+        return None
 
-class SkincareRoutine(BaseModel):
-    """La routine beauté complète générée."""
-    routine_type: str = Field(description="Type de routine (Matin, Soir, ou Hebdomadaire)")
-    target_skin_type: str = Field(description="Type de peau ciblé")
-    steps: List[RoutineStep] = Field(description="Liste ordonnée des étapes de la routine")
-    global_advice: str = Field(description="Conseil général pour cette routine")
-    total_estimated_budget: str = Field(description="Estimation du budget total pour la routine")
+
+# À passer comme `retriever` pour un moteur sans RAG (la construction de l'index a
+# échoué) : None demande au contraire de construire l'index
+NO_RETRIEVER = object()
 
 
 class GlowAI:
     """Génère des routines beauté personnalisées et STRUCTURÉES avec LangChain et Mistral"""
     
-    def __init__(self, model_name='mistral-large-latest'):
+    def __init__(self, model_name='mistral-large-latest', retriever=None, routine_mode=None, response_cache=None,
+                 precomputed_store=None):
         """Initialise le modèle Mistral via LangChain et le RAG"""
+        api_key = os.getenv('MISTRAL_API_KEY')
+        if not api_key:
+            raise ValueError("MISTRAL_API_KEY non trouvée dans .env")
+
+        from langchain_mistralai import ChatMistralAI
+
+        self.model_name = model_name
+        self.routine_mode = self._check_mode(routine_mode or DEFAULT_ROUTINE_MODE)
         self.llm = ChatMistralAI(
             model=model_name,
             mistral_api_key=api_key,
             temperature=0  # Température basse pour être rigoureux sur le format JSON
         )
         
-        # Initialisation du RAG (Recherche de produits)
-        try:
-            print("Initialisation du moteur de recherche de produits (RAG)...")
-            # Chemin absolu vers le CSV (même dossier que ce script)
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            csv_path = os.path.join(current_dir, "skincare_products.csv")
-            
-            self.retriever = ProductRetriever(csv_path)
-            print("RAG prêt !")
-        except Exception as e:
-            print(f"Attention: Impossible d'initialiser le RAG ({e}). L'IA utilisera ses connaissances générales.")
-            self.retriever = None
+        # Température 0 : un même prompt donne la même routine, on la garde en cache
+        if response_cache is None and RESPONSE_CACHE_ENABLED:
+            response_cache = ResponseCache()
+        self.response_cache = response_cache
+
+        # Routines pré-calculées pour les profils courants (voir warmup_routines.py)
+        if precomputed_store is None:
+            precomputed_store = PrecomputedRoutineStore(model_name=model_name)
+        self.precomputed_store = precomputed_store
+        self._precomputed_parsed: Dict[str, "RoutineResults"] = {}
+
+        # Initialisation du RAG (Recherche de produits), sauf si on nous en fournit un déjà prêt
+        # ou si on sait déjà qu'il est indisponible (NO_RETRIEVER)
+        if retriever is NO_RETRIEVER:
+            retriever = None
+        elif retriever is None:
+            retriever = _build_retriever()
+        self.retriever = retriever
 
         print(f"Glow AI initialisé avec {model_name} (LangChain + sorties structurées + RAG)")
+
+    def rebuild_retriever(self):
+        """
+        Reconstruit le moteur RAG de cette instance seulement. Pour les instances
+        partagées (get_glow_ai), utiliser glow.reload_catalog(), qui les met toutes à jour.
+        """
+        self.retriever = _build_retriever()
+        return self.retriever
     
-    def _get_rag_context(self, skin_profile: Dict[str, Any], routine_type: str) -> str:
-        """Cherche des produits pertinents dans le CSV pour enrichir le prompt"""
+    def _build_rag_query(self, skin_profile: Dict[str, Any], routine_type: str) -> str:
+        """Requête de recherche RAG construite à partir du profil"""
+        return build_rag_query(skin_profile, routine_type)
+
+    def _get_rag_products(self, skin_profile: Dict[str, Any], routine_type: str) -> list:
+        """Cherche des produits pertinents dans le CSV pour ce type de routine"""
+        return self._get_rag_products_batch(skin_profile, [routine_type])[routine_type]
+
+    def _get_rag_products_batch(self, skin_profile: Dict[str, Any], routine_types: List[str]) -> Dict[str, list]:
+        """
+        Recherche RAG pour plusieurs types de routine à la fois :
+        les requêtes sont encodées ensemble et cherchées en un seul appel FAISS.
+        """
         if not self.retriever:
-            return ""
-            
-        # On construit une requête de recherche basée sur le profil
-        query = f"produits {routine_type} pour peau {skin_profile.get('skin_type')} " \
-                f"hydratation {skin_profile.get('hydration_level')} " \
-                f"sensibilité {skin_profile.get('sensitivity')}"
-        
-        # Si budget faible, on ajoute "pas cher" à la recherche
-        if "faible" in str(skin_profile.get('budget', '')).lower():
-            query += " pas cher abordable"
-            
-        print(f"Recherche RAG ({routine_type}): '{query}'")
+            return {routine_type: [] for routine_type in routine_types}
+        with span("rag.search"):
+            return self._search_rag_products(skin_profile, routine_types)
+
+    def _search_rag_products(self, skin_profile: Dict[str, Any], routine_types: List[str]) -> Dict[str, list]:
+        """Requêtes du profil, filtres (ingrédients, budget) et recherche groupée dans le stock"""
+        queries = [self._build_rag_query(skin_profile, routine_type) for routine_type in routine_types]
+        for routine_type, query in zip(routine_types, queries):
+            print(f"Recherche RAG ({routine_type}): '{query}'")
         
         # Récupération des ingrédients à éviter
         avoid_list = skin_profile.get('avoid_ingredients', [])
         
-        results = self.retriever.get_relevant_products(query, k=5, avoid_ingredients=avoid_list)
-        
+        # Le budget est appliqué exactement, sur les prix numériques du catalogue, avec la
+        # même répartition par produit que l'assemblage local
+        from routine_assembler import product_price_range
+
+        min_price, max_price = product_price_range(skin_profile.get('budget'))
+        results = self.retriever.get_relevant_products_batch(queries, k=5, avoid_ingredients=avoid_list,
+                                                             min_price=min_price, max_price=max_price)
+
+        # Si aucun produit du stock ne rentre dans le budget, on propose quand même les plus proches
+        if (min_price is not None or max_price is not None) and not all(results):
+            relaxed = self.retriever.get_relevant_products_batch(queries, k=5, avoid_ingredients=avoid_list)
+            results = [found or fallback for found, fallback in zip(results, relaxed)]
+        return dict(zip(routine_types, results))
+
+    def _format_rag_context(self, products: list) -> str:
+        """Met en forme la liste de produits du stock pour le prompt"""
+        if not products:
+            return ""
+
         context_text = "\nVOICI DES PRODUITS DISPONIBLES DANS NOTRE STOCK (Utilise-les en priorité !) :\n"
-        for doc in results:
-            context_text += f"- {doc.metadata['name']} ({doc.metadata['type']}) - Prix: {doc.metadata['price']}\n"
+        for doc in products:
+            price = doc.metadata['price']
+            if doc.metadata.get('price_eur') is not None:
+                price += f" (~{doc.metadata['price_eur']:.2f}€)"
+            context_text += f"- {doc.metadata['name']} ({doc.metadata['type']}) - Prix: {price}\n"
             
         return context_text
 
-    def _generate_structured(self, prompt_text: str, schema) -> Any:
+    def _get_rag_context(self, skin_profile: Dict[str, Any], routine_type: str) -> str:
+        """Cherche des produits pertinents dans le CSV pour enrichir le prompt"""
+        if not self.retriever:
+            return ""
+        with span("rag.context"):
+            return self._format_rag_context(self._get_rag_products(skin_profile, routine_type))
+
+    def _get_combined_rag_context(self, skin_profile: Dict[str, Any]) -> str:
+        """Contexte RAG unique pour les trois routines : union des recherches, sans doublons"""
+        if not self.retriever:
+            return ""
+
+        with span("rag.context"):
+            topics = [ROUTINE_RAG_TOPICS[key] for key in ROUTINE_KEYS]
+            products, seen = [], set()
+            for topic_products in self._get_rag_products_batch(skin_profile, topics).values():
+                for doc in topic_products:
+                    if doc.metadata['name'] not in seen:
+                        seen.add(doc.metadata['name'])
+                        products.append(doc)
+            return self._format_rag_context(products)
+
+    @staticmethod
+    def _check_mode(mode: str) -> str:
+        if mode not in ROUTINE_MODES:
+            raise ValueError(f"Mode de génération inconnu : {mode} (attendu : {', '.join(ROUTINE_MODES)})")
+        return mode
+
+    def _structured_chain(self, schema):
+        """
+        Chaîne LangChain qui force un appel d'outil au format du schéma donné (comme
+        with_structured_output), sans le parsing : l'appel réseau et la validation
+        Pydantic sont ainsi chronométrés séparément (voir _structured_parser).
+        """
+        from langchain_core.prompts import ChatPromptTemplate
+
+        prompt = ChatPromptTemplate.from_template("{input}")
+        return prompt | self.llm.bind_tools([schema], tool_choice="any")
+
+    @staticmethod
+    def _structured_parser(schema):
+        """Message du modèle -> objet du schéma (None si le modèle n'a pas appelé l'outil)"""
+        from langchain_core.output_parsers.openai_tools import PydanticToolsParser
+
+        return PydanticToolsParser(tools=[schema], first_tool_only=True)
+
+    def _cache_lookup(self, prompt_text: str, schema, use_cache: bool):
+        """Cherche la réponse en cache. Renvoie (clé, objet ou None) ; clé None si le cache est ignoré."""
+        if not use_cache or self.response_cache is None:
+            return None, None
+        key = self.response_cache.make_key(self.model_name, schema, prompt_text)
+        try:
+            return key, self.response_cache.get(key, schema)
+        except Exception as e:
+            print(f"Cache de réponses indisponible ({e})")
+            return key, None
+
+    def _cache_store(self, key, schema, response_object):
+        if key is None:
+            return
+        try:
+            self.response_cache.set(key, schema, response_object)
+        except Exception as e:
+            print(f"Impossible d'écrire dans le cache de réponses ({e})")
+
+    def _invoke_structured(self, prompt_text: str, schema, use_cache: bool = True,
+                           usage_tags: Optional[Dict[str, Any]] = None) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Appelle l'API Mistral avec une sortie structurée. Les erreurs sont propagées.
+        Renvoie (objet du schéma, relevé de l'appel) ; `usage_tags` (voir _usage_tags)
+        étiquette le relevé. L'objet renvoyé n'est jamais modifié : il peut venir du cache.
+        """
+        started = time.perf_counter()
+        with span("llm.structured"):
+            with span("llm.cache_lookup"):
+                key, cached = self._cache_lookup(prompt_text, schema, use_cache)
+            if cached is not None:
+                return self._account(cached, prompt_text, schema, usage_tags, started, cached=True)
+
+            with span("llm.network"):
+                message = self._structured_chain(schema).invoke({"input": prompt_text})
+            response_object = self._parse_structured(message, prompt_text, schema, usage_tags, started)
+            self._cache_store(key, schema, response_object)
+            return self._account(response_object, prompt_text, schema, usage_tags, started, message=message)
+
+    async def _ainvoke_structured(self, prompt_text: str, schema, use_cache: bool = True,
+                                  usage_tags: Optional[Dict[str, Any]] = None) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Version asynchrone de _invoke_structured. Le cache de réponses (SQLite, synchrone)
+        est lu et écrit dans le pool de threads pour ne pas bloquer la boucle d'événements.
+        """
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        with span("llm.structured"):
+            with span("llm.cache_lookup"):
+                key, cached = await loop.run_in_executor(None, self._cache_lookup, prompt_text, schema, use_cache)
+            if cached is not None:
+                return self._account(cached, prompt_text, schema, usage_tags, started, cached=True)
+
+            with span("llm.network"):
+                message = await self._structured_chain(schema).ainvoke({"input": prompt_text})
+            response_object = self._parse_structured(message, prompt_text, schema, usage_tags, started)
+            if key is not None:
+                await loop.run_in_executor(None, self._cache_store, key, schema, response_object)
+            return self._account(response_object, prompt_text, schema, usage_tags, started, message=message)
+
+    def _parse_structured(self, message, prompt_text: str, schema, usage_tags, started) -> Any:
+        """Message du modèle -> objet du schéma ; un échec est compté dans les relevés puis propagé"""
+        try:
+            with span("llm.parse"):
+                response_object = self._structured_parser(schema).invoke(message)
+            if response_object is None:
+                raise ValueError("Réponse du modèle non conforme au schéma")
+        except Exception:
+            # Les tokens ont été consommés même si la réponse est inutilisable
+            ledger.record(call_usage(prompt_text, schema, usage_tags, message, failed=True,
+                                     latency_s=time.perf_counter() - started))
+            raise
+        return response_object
+
+    @staticmethod
+    def _account(response_object, prompt_text: str, schema, usage_tags, started, message=None, cached=False):
+        """Relevé de l'appel, ajouté aux agrégats. Renvoie (objet, relevé)."""
+        usage = call_usage(prompt_text, schema, usage_tags, message, output=response_object, cached=cached,
+                           latency_s=time.perf_counter() - started)
+        ledger.record(usage)
+        return response_object, usage
+
+    @staticmethod
+    def _usage_tags(skin_profile: Dict[str, Any], routine: str, rag_context: str = "") -> Dict[str, Any]:
+        """Étiquettes du relevé d'un appel : routine, bucket du profil, taille du contexte RAG"""
+        return {
+            "routine": routine,
+            "bucket": profile_bucket_key(skin_profile) or "atypical",
+            "rag_context_bytes": len(rag_context.encode("utf-8")),
+        }
+
+    def _precomputed_routines(self, skin_profile: Dict[str, Any]) -> Optional["RoutineResults"]:
+        """Routines pré-calculées du bucket de ce profil, ou None si le profil est atypique ou absent du stock"""
+        if self.precomputed_store is None:
+            return None
+        bucket_key = profile_bucket_key(skin_profile)
+        if bucket_key is None:
+            return None
+
+        parsed = self._precomputed_parsed.get(bucket_key)
+        if parsed is None:
+            routines = self.precomputed_store.get(bucket_key)
+            if routines is None:
+                return None
+            try:
+                parsed = RoutineResults((key, SkincareRoutine.model_validate(routines[key])) for key in ROUTINE_KEYS)
+            except Exception as e:
+                print(f"Routines pré-calculées invalides pour {bucket_key} ({e})")
+                return None
+            self._precomputed_parsed[bucket_key] = parsed
+
+        print(f"Routines pré-calculées servies (bucket {bucket_key})")
+        return parsed.ordered()
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Compteurs du cache de réponses (hits mémoire / disque, miss)"""
+        return self.response_cache.stats() if self.response_cache is not None else {}
+
+    @staticmethod
+    def usage_stats() -> Dict[str, Any]:
+        """Tokens et tailles des appels LLM de ce processus, par type de routine et par bucket de profil"""
+        return ledger.snapshot()
+
+    @staticmethod
+    def latency_stats() -> Dict[str, Any]:
+        """Durées par étape (p50 / p95 / p99...) mesurées dans ce processus (vide si GLOW_METRICS=0)"""
+        return metrics.snapshot()
+
+    def _generate_structured(self, prompt_text: str, schema, use_cache: bool = True,
+                             usage_tags: Optional[Dict[str, Any]] = None) -> Any:
         """Méthode interne pour appeler l'API Mistral avec une sortie structurée (JSON)"""
         try:
-            # On crée une chaîne qui force la sortie structurée selon le schéma donné
-            prompt = ChatPromptTemplate.from_template("{input}")
-            structured_llm = self.llm.with_structured_output(schema)
-            chain = prompt | structured_llm
-            
-            response_object = chain.invoke({"input": prompt_text})
-            return response_object
+            with span("llm.generate_structured"):
+                return self._invoke_structured(prompt_text, schema, use_cache, usage_tags)[0]
         except Exception as e:
             print(f"Erreur lors de la génération structurée : {str(e)}")
             return None
 
-    def generate_morning_routine(self, skin_profile: Dict[str, Any]) -> SkincareRoutine:
-        """Génère une routine du matin structurée"""
-        
-        # 1. Récupération du contexte RAG
-        rag_context = self._get_rag_context(skin_profile, "matin nettoyant crème solaire")
-        
-        # 2. Construction du prompt enrichi
-        prompt = f"""Tu es un expert en soins de la peau.
+    # --- CONSTRUCTION DES PROMPTS ---
+
+    def _build_morning_prompt(self, skin_profile: Dict[str, Any], rag_context: str) -> str:
+        """Prompt de la routine du matin"""
+        return f"""Tu es un expert en soins de la peau.
 Génère une routine du MATIN complète et structurée pour ce profil :
 - Type de peau: {skin_profile.get('skin_type', 'Normal')}
 - Hydratation: {skin_profile.get('hydration_level', 'Medium')}
@@ -129,15 +414,10 @@ INSTRUCTIONS :
 2. Respecte strictement le budget.
 3. Détaille chaque étape (Nettoyage, Sérum, Hydratation, SPF).
 """
-        return self._generate_structured(prompt, SkincareRoutine)
-    
-    def generate_evening_routine(self, skin_profile: Dict[str, Any]) -> SkincareRoutine:
-        """Génère une routine du soir structurée"""
-        
-        # 1. Récupération du contexte RAG
-        rag_context = self._get_rag_context(skin_profile, "soir démaquillant nettoyant crème nuit")
-        
-        prompt = f"""Tu es un expert en soins de la peau.
+
+    def _build_evening_prompt(self, skin_profile: Dict[str, Any], rag_context: str) -> str:
+        """Prompt de la routine du soir"""
+        return f"""Tu es un expert en soins de la peau.
 Génère une routine du SOIR complète et structurée pour ce profil :
 - Type de peau: {skin_profile.get('skin_type', 'Normal')}
 - Hydratation: {skin_profile.get('hydration_level', 'Medium')}
@@ -152,15 +432,10 @@ INSTRUCTIONS :
 2. Focus sur le nettoyage et la réparation.
 3. Respecte le budget.
 """
-        return self._generate_structured(prompt, SkincareRoutine)
-    
-    def generate_weekly_treatments(self, skin_profile: Dict[str, Any]) -> SkincareRoutine:
-        """Génère des soins hebdomadaires structurés"""
-        
-        # 1. Récupération du contexte RAG
-        rag_context = self._get_rag_context(skin_profile, "masque gommage traitement")
-        
-        prompt = f"""Tu es un expert en soins de la peau.
+
+    def _build_weekly_prompt(self, skin_profile: Dict[str, Any], rag_context: str) -> str:
+        """Prompt des soins hebdomadaires"""
+        return f"""Tu es un expert en soins de la peau.
 Génère une routine HEBDOMADAIRE (Weekly) complète et structurée pour ce profil :
 - Type de peau: {skin_profile.get('skin_type', 'Normal')}
 - Budget: {skin_profile.get('budget', 'Moyen')}
@@ -170,27 +445,517 @@ Génère une routine HEBDOMADAIRE (Weekly) complète et structurée pour ce prof
 Propose 2 ou 3 étapes de soins ponctuels (Masque, Gommage...) à faire 1-2 fois par semaine.
 Privilégie les produits du stock.
 """
-        return self._generate_structured(prompt, SkincareRoutine)
+
+    def _build_combined_prompt(self, skin_profile: Dict[str, Any], rag_context: str) -> str:
+        """Prompt unique pour les trois routines (un seul bloc profil, un seul contexte RAG)"""
+        return f"""Tu es un expert en soins de la peau.
+Génère en une seule fois les TROIS routines complètes et structurées pour ce profil :
+- Type de peau: {skin_profile.get('skin_type', 'Normal')}
+- Hydratation: {skin_profile.get('hydration_level', 'Medium')}
+- Sensibilité: {skin_profile.get('sensitivity', 'Low')}
+- Budget: {skin_profile.get('budget', 'Moyen')}
+- Ingrédients à éviter: {', '.join(skin_profile.get('avoid_ingredients', []))}
+- Objectifs: {skin_profile.get('goals', 'Soin quotidien')}
+
+{rag_context}
+
+INSTRUCTIONS :
+1. Utilise EN PRIORITÉ les produits du stock listés ci-dessus s'ils sont adaptés.
+2. Respecte strictement le budget.
+3. morning : routine du MATIN, détaille chaque étape (Nettoyage, Sérum, Hydratation, SPF).
+4. evening : routine du SOIR, focus sur le nettoyage et la réparation.
+5. weekly : routine HEBDOMADAIRE, 2 ou 3 étapes de soins ponctuels (Masque, Gommage...) à faire 1-2 fois par semaine.
+"""
+
+    def _build_routine_prompt(self, routine_key: str, skin_profile: Dict[str, Any]):
+        """
+        Récupère le contexte RAG et construit le prompt d'une routine ("morning", "evening"
+        ou "weekly"). Renvoie (prompt, étiquettes du relevé d'usage).
+        """
+        with span("prompt.build"):
+            rag_context = self._get_rag_context(skin_profile, ROUTINE_RAG_TOPICS[routine_key])
+            builder = getattr(self, f"_build_{routine_key}_prompt")
+            return builder(skin_profile, rag_context), self._usage_tags(skin_profile, routine_key, rag_context)
+
+    def _build_routine_prompts(self, skin_profile: Dict[str, Any]):
+        """
+        Construit les prompts des trois routines (les trois recherches RAG sont faites d'un coup).
+        Renvoie ({routine: prompt}, {routine: étiquettes du relevé d'usage}).
+        """
+        with span("prompt.build"):
+            with span("rag.context"):
+                products_by_topic = self._get_rag_products_batch(
+                    skin_profile, [ROUTINE_RAG_TOPICS[key] for key in ROUTINE_KEYS])
+                contexts = {key: self._format_rag_context(products_by_topic[ROUTINE_RAG_TOPICS[key]])
+                            for key in ROUTINE_KEYS}
+            prompts = {key: getattr(self, f"_build_{key}_prompt")(skin_profile, contexts[key]) for key in ROUTINE_KEYS}
+            return prompts, {key: self._usage_tags(skin_profile, key, contexts[key]) for key in ROUTINE_KEYS}
+
+    # --- GÉNÉRATION ---
+
+    def generate_morning_routine(self, skin_profile: Dict[str, Any], use_cache: bool = True) -> SkincareRoutine:
+        """Génère une routine du matin structurée"""
+        prompt, usage_tags = self._build_routine_prompt("morning", skin_profile)
+        return self._generate_structured(prompt, SkincareRoutine, use_cache, usage_tags)
     
-    def generate_full_routine(self, skin_profile: Dict[str, Any]) -> Dict[str, SkincareRoutine]:
-        """Génère toutes les routines (objets structurés)"""
-        
-        print("Génération routine matin (JSON + RAG)...")
-        morning = self.generate_morning_routine(skin_profile)
-        
-        print("Génération routine soir (JSON + RAG)...")
-        evening = self.generate_evening_routine(skin_profile)
-        
-        print("Génération soins hebdomadaires (JSON + RAG)...")
-        weekly = self.generate_weekly_treatments(skin_profile)
-        
-        return {
-            "morning": morning,
-            "evening": evening,
-            "weekly": weekly
-        }
+    def generate_evening_routine(self, skin_profile: Dict[str, Any], use_cache: bool = True) -> SkincareRoutine:
+        """Génère une routine du soir structurée"""
+        prompt, usage_tags = self._build_routine_prompt("evening", skin_profile)
+        return self._generate_structured(prompt, SkincareRoutine, use_cache, usage_tags)
+    
+    def generate_weekly_treatments(self, skin_profile: Dict[str, Any], use_cache: bool = True) -> SkincareRoutine:
+        """Génère des soins hebdomadaires structurés"""
+        prompt, usage_tags = self._build_routine_prompt("weekly", skin_profile)
+        return self._generate_structured(prompt, SkincareRoutine, use_cache, usage_tags)
+    
+    def _split_full_routine(self, full: FullSkincareRoutine,
+                            usage: Optional[Dict[str, Any]] = None) -> "RoutineResults":
+        """Convertit la réponse du mode "single" au même format que le mode "separate" """
+        results = RoutineResults((key, getattr(full, key)) for key in ROUTINE_KEYS)
+        if usage is not None:
+            results.usage["full"] = usage
+        return results
+
+    def _single_call_failed(self, error: Exception, skin_profile: Dict[str, Any]) -> "RoutineResults":
+        results = RoutineResults()
+        for key in ROUTINE_KEYS:
+            results.add_error(key, error)
+        return self._with_local_fallback(results, skin_profile)
+
+    # --- ASSEMBLAGE LOCAL (SANS LLM) ---
+
+    def _assembler(self) -> "RoutineAssembler":
+        if self.retriever is None:
+            raise RuntimeError("Moteur de recherche de produits indisponible")
+        from routine_assembler import RoutineAssembler
+
+        return RoutineAssembler(self.retriever)
+
+    @timed("routine.fast")
+    def generate_full_routine_fast(self, skin_profile: Dict[str, Any]) -> Dict[str, SkincareRoutine]:
+        """
+        Chemin rapide : les trois routines sont assemblées localement à partir du stock
+        (un produit par étape, pertinence maximale dans le budget), sans appel à Mistral.
+        """
+        results = RoutineResults()
+        try:
+            assembler = self._assembler()
+            # Une seule recherche groupée pour toutes les étapes des trois routines
+            candidates = assembler.slot_candidates(skin_profile, ROUTINE_KEYS)
+        except Exception as e:
+            for key in ROUTINE_KEYS:
+                results.add_error(key, e)
+            return results
+
+        for key in ROUTINE_KEYS:
+            try:
+                results[key] = assembler.assemble(skin_profile, key, candidates[key])
+                results.local_keys.add(key)
+            except Exception as e:
+                results.add_error(key, e)
+        return results
+
+    def enrich_routine(self, routine: SkincareRoutine, skin_profile: Dict[str, Any], routine_key: str,
+                       use_cache: bool = True) -> SkincareRoutine:
+        """
+        Enrichissement optionnel d'une routine assemblée localement : Mistral réécrit
+        les descriptions, conseils d'utilisation et conseil global, sans changer les
+        produits ni les prix. Renvoie la routine d'origine si l'appel échoue.
+        """
+        prompt = f"""
+Tu es un expert en dermatologie. Voici une routine {ROUTINE_LABELS[routine_key]} déjà composée
+à partir de notre stock pour ce profil :
+{skin_profile}
+
+ROUTINE (JSON) :
+{routine.model_dump_json()}
+
+INSTRUCTIONS :
+1. Garde exactement les mêmes étapes, produits, marques et prix.
+2. Réécris seulement les descriptions des produits, les conseils d'utilisation et le conseil global,
+   de façon personnalisée pour ce profil.
+"""
+        enriched = self._generate_structured(prompt, SkincareRoutine, use_cache,
+                                             self._usage_tags(skin_profile, f"enrich_{routine_key}"))
+        if enriched is None or len(enriched.steps) != len(routine.steps):
+            return routine
+
+        # Les produits et prix restent ceux choisis localement (le LLM ne rédige que les textes)
+        steps = []
+        for original, rewritten in zip(routine.steps, enriched.steps):
+            descriptions = [p.description for p in rewritten.products]
+            products = [product.model_copy(update={"description": descriptions[i]}) if i < len(descriptions)
+                        else product for i, product in enumerate(original.products)]
+            steps.append(original.model_copy(update={"products": products, "usage_tips": rewritten.usage_tips}))
+        return routine.model_copy(update={"steps": steps, "global_advice": enriched.global_advice})
+
+    def _with_local_fallback(self, results: "RoutineResults", skin_profile: Dict[str, Any]) -> "RoutineResults":
+        """Remplace les routines en échec par une routine assemblée localement (l'erreur reste dans `errors`)"""
+        failed = [key for key in ROUTINE_KEYS if results.get(key) is None]
+        if not LOCAL_FALLBACK_ENABLED or not failed or self.retriever is None:
+            return results
+
+        assembler = self._assembler()
+        try:
+            candidates = assembler.slot_candidates(skin_profile, failed)
+        except Exception as e:
+            print(f"Repli local impossible : {e}")
+            return results
+        for key in failed:
+            try:
+                results[key] = assembler.assemble(skin_profile, key, candidates[key])
+                results.local_keys.add(key)
+                print(f"Routine {ROUTINE_LABELS[key]} assemblée localement (repli)")
+            except Exception as e:
+                print(f"Repli local impossible pour la routine {ROUTINE_LABELS[key]} : {e}")
+        return results
+
+    @timed("routine.single")
+    def generate_full_routine_single(self, skin_profile: Dict[str, Any], timeout: Optional[float] = None,
+                                     use_cache: bool = True) -> Dict[str, SkincareRoutine]:
+        """Génère les trois routines en UN seul appel Mistral (schéma FullSkincareRoutine)"""
+        print("Génération des trois routines en un appel (JSON + RAG)...")
+        rag_context = self._get_combined_rag_context(skin_profile)
+        prompt = self._build_combined_prompt(skin_profile, rag_context)
+        usage_tags = self._usage_tags(skin_profile, "full", rag_context)
+
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="glow-routine")
+        future = executor.submit(self._invoke_structured, prompt, FullSkincareRoutine, use_cache, usage_tags)
+        try:
+            return self._split_full_routine(*future.result(timeout=timeout))
+        except FutureTimeoutError:
+            return self._single_call_failed(TimeoutError(f"Pas de réponse après {timeout}s"), skin_profile)
+        except Exception as e:
+            return self._single_call_failed(e, skin_profile)
+        finally:
+            executor.shutdown(wait=False)
+
+    @timed("routine.async_single")
+    async def agenerate_full_routine_single(self, skin_profile: Dict[str, Any], timeout: Optional[float] = None,
+                                            use_cache: bool = True) -> Dict[str, SkincareRoutine]:
+        """Version asynchrone de generate_full_routine_single"""
+        loop = asyncio.get_running_loop()
+        rag_context = await loop.run_in_executor(None, self._get_combined_rag_context, skin_profile)
+        prompt = self._build_combined_prompt(skin_profile, rag_context)
+        usage_tags = self._usage_tags(skin_profile, "full", rag_context)
+        try:
+            full, usage = await asyncio.wait_for(
+                self._ainvoke_structured(prompt, FullSkincareRoutine, use_cache, usage_tags), timeout)
+            return self._split_full_routine(full, usage)
+        except asyncio.TimeoutError:
+            return self._single_call_failed(TimeoutError(f"Pas de réponse après {timeout}s"), skin_profile)
+        except Exception as e:
+            return self._single_call_failed(e, skin_profile)
+
+    @timed("routine.full")
+    def generate_full_routine(self, skin_profile: Dict[str, Any], mode: Optional[str] = None,
+                              use_cache: bool = True) -> Dict[str, SkincareRoutine]:
+        """
+        Génère toutes les routines (objets structurés).
+        `mode` ("separate" ou "single") remplace le mode par défaut de l'instance ;
+        `use_cache=False` force l'appel à Mistral sans passer par le cache de réponses
+        ni par les routines pré-calculées.
+        """
+        precomputed = self._precomputed_routines(skin_profile) if use_cache else None
+        if precomputed is not None:
+            return precomputed
+
+        if self._check_mode(mode or self.routine_mode) == "single":
+            return self.generate_full_routine_single(skin_profile, use_cache=use_cache)
+
+        # Les trois contextes RAG sont construits d'avance (une seule passe d'embedding)
+        prompts, usage_tags = self._build_routine_prompts(skin_profile)
+        results = RoutineResults()
+        for key in ROUTINE_KEYS:
+            print(f"Génération routine {ROUTINE_LABELS[key]} (JSON + RAG)...")
+            try:
+                results.add_result(key, *self._invoke_structured(prompts[key], SkincareRoutine, use_cache,
+                                                                 usage_tags[key]))
+            except Exception as e:
+                results.add_error(key, e)
+        return self._with_local_fallback(results, skin_profile)
+
+    @timed("routine.parallel")
+    def generate_full_routine_parallel(self, skin_profile: Dict[str, Any], max_concurrency: int = 3,
+                                       timeout: Optional[float] = None, mode: Optional[str] = None,
+                                       use_cache: bool = True) -> Dict[str, SkincareRoutine]:
+        """
+        Génère les trois routines en parallèle dans un pool de threads.
+        `max_concurrency` limite le nombre d'appels Mistral simultanés et `timeout`
+        (secondes) s'applique à chaque appel à partir de son démarrage.
+        Les échecs sont reportés dans `results.errors` ; la routine vaut alors None,
+        ou une routine assemblée localement si le repli est actif (`results.local_keys`).
+        En mode "single", un seul appel est fait (rien à paralléliser).
+        """
+        precomputed = self._precomputed_routines(skin_profile) if use_cache else None
+        if precomputed is not None:
+            return precomputed
+
+        if self._check_mode(mode or self.routine_mode) == "single":
+            return self.generate_full_routine_single(skin_profile, timeout=timeout, use_cache=use_cache)
+
+        # Le RAG est fait d'abord (rapide), seuls les appels LLM sont parallélisés
+        prompts, usage_tags = self._build_routine_prompts(skin_profile)
+        results = RoutineResults()
+        started: Dict[str, float] = {}
+
+        def run(key):
+            started[key] = time.monotonic()
+            return self._invoke_structured(prompts[key], SkincareRoutine, use_cache, usage_tags[key])
+
+        executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="glow-routine")
+        futures = {executor.submit(run, key): key for key in ROUTINE_KEYS}
+        pending = set(futures)
+        try:
+            while pending:
+                wait_for = None
+                if timeout is not None:
+                    deadlines = [started[futures[f]] + timeout for f in pending if futures[f] in started]
+                    wait_for = max(0.0, min(deadlines) - time.monotonic()) if deadlines else timeout
+
+                done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = futures[future]
+                    try:
+                        results.add_result(key, *future.result())
+                    except Exception as e:
+                        results.add_error(key, e)
+
+                if timeout is not None:
+                    now = time.monotonic()
+                    for future in list(pending):
+                        key = futures[future]
+                        if key in started and now - started[key] >= timeout:
+                            # Le thread ne peut pas être interrompu : on abandonne simplement son résultat
+                            pending.discard(future)
+                            results.add_error(key, TimeoutError(f"Pas de réponse après {timeout}s"))
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+        return self._with_local_fallback(results.ordered(), skin_profile)
+
+    @timed("routine.async")
+    async def agenerate_full_routine(self, skin_profile: Dict[str, Any], max_concurrency: int = 3,
+                                     timeout: Optional[float] = None, mode: Optional[str] = None,
+                                     use_cache: bool = True) -> Dict[str, SkincareRoutine]:
+        """
+        Version asynchrone : les trois appels Mistral sont lancés de façon concurrente,
+        au plus `max_concurrency` à la fois, chacun limité à `timeout` secondes.
+        Les échecs sont reportés dans `results.errors` ; la routine vaut alors None,
+        ou une routine assemblée localement si le repli est actif (`results.local_keys`).
+        """
+        precomputed = self._precomputed_routines(skin_profile) if use_cache else None
+        if precomputed is not None:
+            return precomputed
+
+        if self._check_mode(mode or self.routine_mode) == "single":
+            return await self.agenerate_full_routine_single(skin_profile, timeout=timeout, use_cache=use_cache)
+
+        loop = asyncio.get_running_loop()
+        prompts, usage_tags = await loop.run_in_executor(None, self._build_routine_prompts, skin_profile)
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def run(key):
+            async with semaphore:
+                return await asyncio.wait_for(
+                    self._ainvoke_structured(prompts[key], SkincareRoutine, use_cache, usage_tags[key]), timeout)
+
+        outcomes = await asyncio.gather(*(run(key) for key in ROUTINE_KEYS), return_exceptions=True)
+
+        results = RoutineResults()
+        for key, outcome in zip(ROUTINE_KEYS, outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                results.add_error(key, TimeoutError(f"Pas de réponse après {timeout}s"))
+            elif isinstance(outcome, Exception):
+                results.add_error(key, outcome)
+            else:
+                results.add_result(key, *outcome)
+        return await loop.run_in_executor(None, self._with_local_fallback, results, skin_profile)
+
+
+# --- INSTANCES PARTAGÉES ---
+# Une seule instance de GlowAI par modèle pour tout le processus (toutes les sessions
+# Streamlit la réutilisent) : le client Mistral, le modèle d'embedding et l'index
+# FAISS ne sont construits qu'une fois.
+_instances: Dict[str, GlowAI] = {}
+_warmups: Dict[str, "_Warmup"] = {}
+_shared_retriever = None
+_instances_lock = threading.Lock()
+# Verrou distinct : lancer ou consulter le préchauffage ne doit pas attendre la construction
+_warmups_lock = threading.Lock()
+
+# Intervalle (secondes) entre deux vérifications du CSV produits ; 0 = pas de bascule automatique
+CATALOG_CHECK_INTERVAL = float(os.getenv("GLOW_CATALOG_CHECK_INTERVAL", "60"))
+_catalog_checked_at = time.monotonic()
+_catalog_reload_lock = threading.Lock()
 
 
 def get_glow_ai(model_name='mistral-large-latest') -> GlowAI:
-    """Factory function pour créer une instance de GlowAI"""
-    return GlowAI(model_name)
+    """Renvoie l'instance partagée de GlowAI pour ce modèle (créée au premier appel)"""
+    global _shared_retriever
+
+    instance = _instances.get(model_name)
+    if instance is not None:
+        _schedule_catalog_check()
+        return instance
+
+    with _instances_lock:
+        # Un autre thread a pu finir la construction pendant qu'on attendait le verrou
+        instance = _instances.get(model_name)
+        if instance is None:
+            if _shared_retriever is None:
+                # Un échec de construction est mémorisé (NO_RETRIEVER) : GlowAI ne la retente pas
+                retriever = _build_retriever()
+                _shared_retriever = NO_RETRIEVER if retriever is None else retriever
+            instance = GlowAI(model_name, retriever=_shared_retriever)
+            _instances[model_name] = instance
+        return instance
+
+
+def reset(model_name=None):
+    """
+    Oublie les instances partagées (toutes, ou seulement celle de `model_name`).
+    Le prochain get_glow_ai() reconstruira le moteur.
+    """
+    global _shared_retriever
+
+    with _instances_lock:
+        if model_name is None:
+            _instances.clear()
+            _shared_retriever = None
+        else:
+            _instances.pop(model_name, None)
+    with _warmups_lock:
+        if model_name is None:
+            _warmups.clear()
+        else:
+            _warmups.pop(model_name, None)
+
+
+def reload_catalog():
+    """Reconstruit l'index produits et le branche sur toutes les instances existantes"""
+    global _shared_retriever
+
+    retriever = _build_retriever()
+    with _instances_lock:
+        _shared_retriever = NO_RETRIEVER if retriever is None else retriever
+        for instance in _instances.values():
+            instance.retriever = retriever
+    return retriever
+
+
+def reload_catalog_if_changed():
+    """
+    Si le CSV produits a changé, construit le nouvel index (mise à jour incrémentale,
+    ou simple chargement si un autre processus l'a déjà sauvegardé) puis bascule
+    toutes les instances dessus. Les requêtes en cours finissent sur l'ancien index.
+    Renvoie le nouveau moteur, ou None si rien n'a changé.
+    """
+    global _shared_retriever
+
+    if not _catalog_reload_lock.acquire(blocking=False):
+        return None  # Une mise à jour est déjà en cours
+    try:
+        current = _shared_retriever
+        if current is None or current is NO_RETRIEVER or not current.catalog_changed():
+            return None
+        print("Catalogue produits modifié : mise à jour de l'index...")
+        retriever = _build_retriever()
+        if retriever is None:
+            return None  # On garde l'index actuel plutôt que de perdre le RAG
+        with _instances_lock:
+            _shared_retriever = retriever
+            for instance in _instances.values():
+                instance.retriever = retriever
+        return retriever
+    finally:
+        _catalog_reload_lock.release()
+
+
+def _schedule_catalog_check():
+    """Vérifie le catalogue en arrière-plan, au plus une fois par CATALOG_CHECK_INTERVAL"""
+    global _catalog_checked_at
+
+    if CATALOG_CHECK_INTERVAL <= 0 or time.monotonic() - _catalog_checked_at < CATALOG_CHECK_INTERVAL:
+        return
+    _catalog_checked_at = time.monotonic()
+    threading.Thread(target=reload_catalog_if_changed, name="glow-catalog-check", daemon=True).start()
+
+
+# --- PRÉCHAUFFAGE ---
+# Le premier utilisateur après un déploiement n'attend plus l'index, le modèle
+# d'embedding et le client Mistral : ils sont construits dans un thread dès le
+# démarrage du processus. Une soumission pendant le préchauffage l'attend
+# (wait_for_warmup) au lieu de lancer une seconde construction.
+
+class _Warmup:
+    """Construction de l'instance partagée d'un modèle en arrière-plan, et son état"""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.state = "running"
+        self.error: Optional[Exception] = None
+        self.started_at = time.monotonic()
+        self.duration: Optional[float] = None
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"glow-warmup-{model_name}", daemon=True)
+
+    def _run(self):
+        try:
+            instance = get_glow_ai(self.model_name)
+            if instance.retriever is not None:
+                # Embeddings des requêtes du gabarit : le modèle n'est chargé que s'il en manque
+                instance.retriever.precompute_query_embeddings(persist=False)
+            # Importe LangChain et prépare la chaîne structurée une première fois
+            instance._structured_chain(SkincareRoutine)
+            self.state = "ready"
+        except Exception as e:
+            print(f"Préchauffage de Glow AI impossible ({e}) : le moteur sera construit à la première demande.")
+            self.error = e
+            self.state = "failed"
+        finally:
+            self.duration = time.monotonic() - self.started_at
+            self.done.set()
+
+
+def start_warmup(model_name='mistral-large-latest') -> Dict[str, Any]:
+    """
+    Lance (une seule fois par processus) la construction de l'instance partagée dans un
+    thread d'arrière-plan. Renvoie l'état du préchauffage (voir warmup_status).
+    Ne bloque pas : le thread de préchauffage garde _instances_lock pendant la construction.
+    """
+    with _warmups_lock:
+        if model_name not in _warmups and model_name not in _instances:
+            warmup = _Warmup(model_name)
+            _warmups[model_name] = warmup
+            warmup.thread.start()
+    return warmup_status(model_name)
+
+
+def warmup_status(model_name='mistral-large-latest') -> Dict[str, Any]:
+    """
+    État du moteur pour l'interface : "idle" (rien de lancé), "running", "ready" ou
+    "failed", avec la durée écoulée et la disponibilité du RAG une fois prêt.
+    """
+    warmup = _warmups.get(model_name)
+    instance = _instances.get(model_name)
+    if warmup is None:
+        state = "ready" if instance is not None else "idle"
+        return {"state": state, "elapsed_s": None, "error": None,
+                "rag": None if instance is None else instance.retriever is not None}
+
+    elapsed = warmup.duration if warmup.duration is not None else time.monotonic() - warmup.started_at
+    return {
+        "state": warmup.state,
+        "elapsed_s": round(elapsed, 1),
+        "error": None if warmup.error is None else str(warmup.error),
+        "rag": None if instance is None else instance.retriever is not None,
+    }
+
+
+def wait_for_warmup(model_name='mistral-large-latest', timeout: Optional[float] = None) -> bool:
+    """Attend la fin du préchauffage en cours (s'il y en a un). Renvoie False si `timeout` a expiré."""
+    warmup = _warmups.get(model_name)
+    return warmup is None or warmup.done.wait(timeout)
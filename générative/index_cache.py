@@ -0,0 +1,287 @@
+"""
+Cache disque de l'index FAISS des produits.
+
+L'index construit (vecteurs + documents) est sauvegardé dans un dossier versionné
+dont le nom dépend du contenu du CSV, du modèle d'embedding et du type d'index FAISS :
+tant qu'ils ne changent pas, l'index est rechargé au lieu d'être recalculé.
+
+Plusieurs processus partagent le cache : la construction d'une entrée est protégée
+par un verrou fcntl (cache_lock), et une entrée est publiée en écrivant une nouvelle
+version (.versions/) puis en remplaçant atomiquement le lien symbolique de l'entrée.
+Un processus qui lit l'ancienne version n'est jamais interrompu : elle n'est supprimée
+qu'après KEEP_VERSIONS publications plus récentes.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou entre processus
+    fcntl = None
+
+# A incrémenter dès que le format des fichiers sauvegardés change
+INDEX_CACHE_VERSION = 2
+
+DEFAULT_CACHE_DIR = os.getenv(
+    "GLOW_INDEX_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".index_cache")
+)
+
+MANIFEST_FILE = "manifest.json"
+QUERY_EMBEDDINGS_FILE = "query_embeddings.npz"
+# Vecteurs float32 gardés à côté d'un index compressé, pour le reclassement exact
+FULL_VECTORS_FILE = "full_vectors.npy"
+# Dossier des versions publiées des entrées (chaque entrée est un lien vers l'une d'elles)
+VERSIONS_DIR = ".versions"
+# Versions gardées par entrée (la publiée et la précédente, encore lue par d'anciens processus)
+KEEP_VERSIONS = 2
+
+
+def catalog_fingerprint(csv_path, model_name, index_key="flat"):
+    """
+    Empreinte SHA-256 du CSV (octets bruts), du modèle d'embedding, des paramètres de
+    construction de l'index (`IndexConfig.build_key()`) et de la version du cache
+    """
+    digest = hashlib.sha256()
+    digest.update(f"v{INDEX_CACHE_VERSION}|{model_name}|{index_key}|".encode("utf-8"))
+    with open(csv_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_entry_path(cache_dir, fingerprint):
+    """Dossier de cache correspondant à une empreinte"""
+    return os.path.join(cache_dir, f"v{INDEX_CACHE_VERSION}-{fingerprint[:16]}")
+
+
+def resolve_entry_path(cache_dir, fingerprint):
+    """Dossier de la version publiée de l'entrée (à lire d'un bloc, même si elle est republiée entre-temps)"""
+    return os.path.realpath(cache_entry_path(cache_dir, fingerprint))
+
+
+@contextmanager
+def cache_lock(cache_dir, fingerprint):
+    """
+    Verrou exclusif (fcntl) d'une empreinte : un seul processus construit et publie
+    l'entrée, les autres attendent puis la relisent.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, f".lock-{fingerprint[:16]}"), "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _publish(cache_dir, entry_path, version_path):
+    """Fait pointer le lien `entry_path` vers `version_path`, par un renommage atomique"""
+    link_path = os.path.join(cache_dir, f".tmp-link-{os.getpid()}-{os.path.basename(version_path)}")
+    os.symlink(os.path.relpath(version_path, cache_dir), link_path)
+    try:
+        if os.path.isdir(entry_path) and not os.path.islink(entry_path):
+            # Entrée écrite avant les versions : déplacée (et non supprimée) avant d'être remplacée
+            os.replace(entry_path, tempfile.mkdtemp(prefix=f"{os.path.basename(entry_path)}-",
+                                                    dir=os.path.dirname(version_path)))
+        os.replace(link_path, entry_path)
+    except Exception:
+        os.remove(link_path)
+        raise
+
+
+def _prune_versions(cache_dir, entry_path, keep=KEEP_VERSIONS):
+    """Supprime les anciennes versions d'une entrée, sauf la publiée et les plus récentes"""
+    versions_dir = os.path.join(cache_dir, VERSIONS_DIR)
+    prefix = f"{os.path.basename(entry_path)}-"
+    current = os.path.realpath(entry_path)
+    versions = sorted((os.path.join(versions_dir, name) for name in os.listdir(versions_dir)
+                       if name.startswith(prefix)), key=os.path.getmtime, reverse=True)
+    for path in versions[keep:]:
+        if os.path.realpath(path) != current:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def read_manifest(entry_path):
+    """Lit le manifeste d'une entrée de cache, ou None si elle est absente/incomplète"""
+    manifest_path = os.path.join(entry_path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_vector_store(cache_dir, fingerprint, embeddings):
+    """Recharge la base FAISS depuis le cache. Renvoie None si l'entrée n'existe pas."""
+    from langchain_community.vectorstores import FAISS
+
+    entry_path = resolve_entry_path(cache_dir, fingerprint)
+    manifest = read_manifest(entry_path)
+    if not manifest or manifest.get("fingerprint") != fingerprint:
+        return None
+
+    # Le cache est produit par nous-mêmes : on peut relire le pickle du docstore
+    return FAISS.load_local(entry_path, embeddings, allow_dangerous_deserialization=True)
+
+
+def load_shared_store(cache_dir, fingerprint):
+    """Stockage partagé (projeté en mémoire) de l'entrée, ou None s'il n'existe pas"""
+    from shared_store import SharedStore, has_shared_store, shared_store_path
+
+    entry_path = resolve_entry_path(cache_dir, fingerprint)
+    manifest = read_manifest(entry_path)
+    if not manifest or manifest.get("fingerprint") != fingerprint or not has_shared_store(entry_path):
+        return None
+    return SharedStore(shared_store_path(entry_path))
+
+
+def save_vector_store(cache_dir, fingerprint, vector_store, csv_path, model_name, index_config=None,
+                      full_vectors=None, shared=True, extra_manifest=None, partitions=None):
+    """
+    Sauvegarde la base FAISS dans le cache (et, avec `shared`, le stockage partagé
+    entre processus : voir shared_store). Les sous-index par catégorie `partitions`
+    (PartitionedIndex) sont construits ici s'ils ne sont pas fournis.
+    L'écriture se fait dans une nouvelle version, publiée à la fin (lien remplacé
+    atomiquement) : un autre processus ne lit jamais une entrée à moitié écrite, et
+    celui qui lit la version précédente la garde intacte. L'appelant tient cache_lock.
+    """
+    entry_path = cache_entry_path(cache_dir, fingerprint)
+    versions_dir = os.path.join(cache_dir, VERSIONS_DIR)
+    os.makedirs(versions_dir, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(prefix=f"{os.path.basename(entry_path)}-{time.strftime('%Y%m%d%H%M%S')}-",
+                                dir=versions_dir)
+
+    try:
+        vector_store.save_local(tmp_path)
+        if full_vectors is not None:
+            import numpy as np
+
+            np.save(os.path.join(tmp_path, FULL_VECTORS_FILE), np.asarray(full_vectors, dtype="float32"))
+        if shared:
+            from shared_store import shared_store_path, write_shared_store
+
+            index = vector_store.index
+            documents = [vector_store.docstore.search(vector_store.index_to_docstore_id[i])
+                         for i in range(index.ntotal)]
+            vectors = full_vectors if full_vectors is not None else index.reconstruct_n(0, index.ntotal)
+            if partitions is None:
+                from partitioned_index import PartitionedIndex
+
+                partitions = PartitionedIndex(vectors, [doc.metadata.get("type", "") for doc in documents],
+                                              index_config)
+            write_shared_store(shared_store_path(tmp_path), index, vectors, documents, partitions)
+        manifest = {
+            "version": INDEX_CACHE_VERSION,
+            "fingerprint": fingerprint,
+            "model_name": model_name,
+            "csv_path": os.path.abspath(csv_path),
+            "n_products": vector_store.index.ntotal,
+            "index": index_config.as_dict() if index_config is not None else {"backend": "flat"},
+            **(extra_manifest or {}),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        # Le manifeste est écrit en dernier : il marque l'entrée comme complète
+        with open(os.path.join(tmp_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        _publish(cache_dir, entry_path, tmp_path)
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    _prune_versions(cache_dir, entry_path)
+    return entry_path
+
+
+def load_full_vectors(entry_path):
+    """Vecteurs float32 de l'entrée, projetés en mémoire (lecture seule), ou None s'ils sont absents"""
+    import numpy as np
+
+    path = os.path.join(entry_path, FULL_VECTORS_FILE)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode="r")
+
+
+def load_query_embeddings(entry_path):
+    """Embeddings de requêtes sauvegardés avec l'index : {requête: vecteur}"""
+    import numpy as np
+
+    path = os.path.join(entry_path, QUERY_EMBEDDINGS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with np.load(path) as data:
+        return dict(zip(data["queries"].tolist(), data["vectors"]))
+
+
+def save_query_embeddings(entry_path, query_embeddings):
+    """Sauvegarde (atomique) des embeddings de requêtes dans l'entrée de cache"""
+    import numpy as np
+
+    if not query_embeddings:
+        return
+    queries = list(query_embeddings)
+    vectors = np.stack([query_embeddings[q] for q in queries]).astype("float32")
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".npz", dir=entry_path)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, queries=np.array(queries), vectors=vectors)
+        os.replace(tmp_path, os.path.join(entry_path, QUERY_EMBEDDINGS_FILE))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def remove_cache_entry(cache_dir, fingerprint):
+    """
+    Retire l'entrée de cache d'une empreinte (pour forcer une reconstruction). Seul le
+    lien est supprimé : la version qu'il désignait reste lisible jusqu'à son élagage.
+    """
+    entry_path = cache_entry_path(cache_dir, fingerprint)
+    if os.path.islink(entry_path):
+        os.remove(entry_path)
+        return True
+    if os.path.isdir(entry_path):
+        shutil.rmtree(entry_path, ignore_errors=True)
+        return True
+    return False
+
+
+def clear_cache(cache_dir=DEFAULT_CACHE_DIR, keep=None):
+    """Supprime les entrées du cache (sauf celle dont l'empreinte est `keep`)"""
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    keep_path = cache_entry_path(cache_dir, keep) if keep else None
+    kept_version = os.path.realpath(keep_path) if keep_path and os.path.islink(keep_path) else None
+    removed = 0
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name == VERSIONS_DIR or path == keep_path:
+            continue
+        if os.path.islink(path):
+            os.remove(path)
+            removed += 1
+        elif os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+
+    # Versions qui ne sont plus désignées par aucune entrée
+    versions_dir = os.path.join(cache_dir, VERSIONS_DIR)
+    if os.path.isdir(versions_dir):
+        for name in os.listdir(versions_dir):
+            path = os.path.join(versions_dir, name)
+            if os.path.realpath(path) != kept_version:
+                shutil.rmtree(path, ignore_errors=True)
+    return removed
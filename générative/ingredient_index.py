@@ -0,0 +1,115 @@
+"""
+Index inversé des ingrédients : ingrédient -> produits qui le contiennent.
+
+Construit une fois avec l'index vectoriel, il donne en une opération vectorisée le
+masque des produits à exclure pour une liste d'ingrédients à éviter. Ce masque est
+appliqué pendant la recherche FAISS, au lieu de filtrer les candidats après coup.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from ingredient_matcher import get_matcher, normalize_terms
+
+# Nombre de listes d'ingrédients à éviter dont on garde le masque en mémoire
+MASK_CACHE_SIZE = 256
+
+_SEPARATORS = re.compile(r"\s*[,;]\s*")
+
+
+def split_ingredients(ingredients):
+    """Découpe une liste INCI ("Aqua, Glycerin, ...") en ingrédients normalisés (minuscules)"""
+    text = str(ingredients).lower().strip().rstrip(".")
+    return [token for token in (" ".join(t.split()) for t in _SEPARATORS.split(text)) if token]
+
+
+def tokenize_ingredients(ingredient_lists):
+    """
+    Découpage vectorisé (pandas) des textes INCI, même règle que split_ingredients.
+    Renvoie (produits, ingrédients) : deux tableaux alignés, un couple par ingrédient
+    distinct de chaque produit.
+    """
+    texts = pd.Series(list(ingredient_lists), dtype=object)
+    if texts.map(lambda value: isinstance(value, list)).any():
+        # Listes d'ingrédients déjà découpées : on les normalise telles quelles
+        tokens = texts.map(lambda value: value if isinstance(value, list) else split_ingredients(value)).explode()
+    else:
+        texts = texts.astype(str).fillna("nan").str.lower().str.strip().str.rstrip(".")
+        tokens = texts.str.split(_SEPARATORS.pattern, regex=True).explode().str.split().str.join(" ")
+    tokens = tokens[tokens.notna() & (tokens != "")]
+    pairs = pd.DataFrame({"product": tokens.index.to_numpy(dtype=np.int64), "token": tokens.to_numpy()})
+    pairs = pairs.drop_duplicates()
+    return pairs["product"].to_numpy(), pairs["token"].to_numpy(dtype=object)
+
+
+class IngredientIndex:
+    """
+    Index inversé ingrédient -> identifiants (positions) des produits, et pour chaque
+    produit la liste des identifiants de ses ingrédients (format CSR).
+    """
+
+    def __init__(self, ingredient_lists):
+        """`ingredient_lists[i]` : texte INCI (ou liste d'ingrédients) du produit i"""
+        ingredient_lists = list(ingredient_lists)
+        self.n_products = len(ingredient_lists)
+        products, tokens = tokenize_ingredients(ingredient_lists)
+
+        # Identifiant d'ingrédient = position dans le vocabulaire trié
+        token_ids, vocabulary = pd.factorize(tokens, sort=True)
+        self.vocabulary = [str(token) for token in vocabulary]
+
+        # Postings : produits de chaque ingrédient, obtenus par un tri sur l'identifiant
+        order = np.lexsort((products, token_ids))
+        bounds = np.searchsorted(token_ids[order], np.arange(len(self.vocabulary) + 1))
+        sorted_products = products[order]
+        self._postings = {token: sorted_products[bounds[i]:bounds[i + 1]]
+                          for i, token in enumerate(self.vocabulary)}
+
+        # Ingrédients de chaque produit (CSR) : ingredient_ids(i)
+        order = np.lexsort((token_ids, products))
+        self._product_offsets = np.searchsorted(products[order], np.arange(self.n_products + 1))
+        self._product_tokens = token_ids[order].astype(np.int32)
+
+        self._mask_cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def ingredient_ids(self, position):
+        """Identifiants (positions dans `vocabulary`) des ingrédients du produit `position`"""
+        return self._product_tokens[self._product_offsets[position]:self._product_offsets[position + 1]]
+
+    def matching_tokens(self, term):
+        """Ingrédients du vocabulaire qui contiennent `term` (même règle que le filtre historique)"""
+        term = term.lower().strip()
+        if not term:
+            return []
+        return [token for token in self.vocabulary if term in token]
+
+    def excluded_mask(self, avoid_ingredients):
+        """Masque booléen (taille n_products) des produits contenant au moins un ingrédient à éviter"""
+        key = normalize_terms(avoid_ingredients)
+        with self._lock:
+            mask = self._mask_cache.get(key)
+            if mask is not None:
+                self._mask_cache.move_to_end(key)
+                return mask
+
+        # Automate d'Aho-Corasick : un seul passage sur le vocabulaire pour tous les termes
+        matcher = get_matcher(key)
+        tokens = [token for token in self.vocabulary if matcher.contains_any(token)]
+
+        mask = np.zeros(self.n_products, dtype=bool)
+        for token in tokens:
+            mask[self._postings[token]] = True
+
+        with self._lock:
+            self._mask_cache[key] = mask
+            while len(self._mask_cache) > MASK_CACHE_SIZE:
+                self._mask_cache.popitem(last=False)
+        return mask
+
+    def allowed_mask(self, avoid_ingredients):
+        """Masque des produits autorisés (complément de excluded_mask)"""
+        return ~self.excluded_mask(avoid_ingredients)
@@ -0,0 +1,130 @@
+"""
+Recherche multi-motifs (Aho-Corasick) des ingrédients à éviter.
+
+Un automate est compilé une fois par liste d'ingrédients à éviter (et gardé en cache) ;
+il parcourt ensuite chaque texte INCI en une seule passe, quel que soit le nombre
+d'ingrédients recherchés. Utilisé par l'index inversé des ingrédients du RAG et pour
+le filtrage hors-ligne du catalogue.
+
+L'automate est celui du paquet `pyahocorasick` (construit en C, voir requirements.txt).
+
+Micro-benchmark contre la boucle historique :
+    python ingredient_matcher.py [--csv skincare_products.csv] [--repeat 5]
+"""
+import csv
+import os
+from functools import lru_cache
+
+import ahocorasick  # pyahocorasick
+
+
+def normalize_terms(terms):
+    """Termes en minuscules, sans doublons ni vides, dans un ordre stable (clé de cache)"""
+    return tuple(sorted({term.lower().strip() for term in terms if term and term.strip()}))
+
+
+class IngredientMatcher:
+    """Automate d'Aho-Corasick sur une liste de termes (comparaison en minuscules)"""
+
+    def __init__(self, terms):
+        self.terms = normalize_terms(terms)
+        self._automaton = None
+        if self.terms:
+            self._automaton = ahocorasick.Automaton()
+            for term in self.terms:
+                self._automaton.add_word(term, term)
+            self._automaton.make_automaton()
+
+    def contains_any(self, text):
+        """True si le texte contient au moins un des termes (arrêt au premier trouvé)"""
+        if self._automaton is None:
+            return False
+        return next(self._automaton.iter(text.lower()), None) is not None
+
+    def find_all(self, text):
+        """Ensemble des termes présents dans le texte"""
+        if self._automaton is None:
+            return set()
+        return {term for _, term in self._automaton.iter(text.lower())}
+
+
+@lru_cache(maxsize=256)
+def _compiled(terms):
+    return IngredientMatcher(terms)
+
+
+def get_matcher(terms):
+    """Automate compilé pour cette liste de termes (mis en cache par liste distincte)"""
+    return _compiled(normalize_terms(terms))
+
+
+def filter_ingredient_texts(ingredient_texts, avoid_ingredients):
+    """Positions des textes INCI qui ne contiennent aucun des ingrédients à éviter"""
+    matcher = get_matcher(avoid_ingredients)
+    return [i for i, text in enumerate(ingredient_texts) if not matcher.contains_any(str(text))]
+
+
+def filter_catalog(csv_path, avoid_ingredients):
+    """Lignes du catalogue CSV (dictionnaires) sans aucun ingrédient à éviter"""
+    with open(csv_path, encoding="utf-8-sig", newline="") as f:
+        rows = list(csv.DictReader(f))
+    keep = filter_ingredient_texts([row["ingredients"] for row in rows], avoid_ingredients)
+    return [rows[i] for i in keep]
+
+
+def _legacy_filter(ingredient_texts, avoid_ingredients):
+    """Boucle historique de get_relevant_products (référence du benchmark)"""
+    avoid_lower = [ing.lower() for ing in avoid_ingredients]
+    kept = []
+    for i, text in enumerate(ingredient_texts):
+        text = str(text).lower()
+        if not any(bad in text for bad in avoid_lower):
+            kept.append(i)
+    return kept
+
+
+def _benchmark(csv_path, repeat):
+    import time
+
+    with open(csv_path, encoding="utf-8-sig", newline="") as f:
+        texts = [row["ingredients"] for row in csv.DictReader(f)]
+    lowered = [text.lower() for text in texts]
+
+    avoid_lists = {
+        "2 termes": ["paraben", "sulfate"],
+        "6 termes": ["paraben", "sulfate", "parfum", "alcohol denat", "limonene", "linalool"],
+        "20 termes": ["paraben", "sulfate", "parfum", "fragrance", "alcohol denat", "limonene", "linalool",
+                      "citral", "geraniol", "eugenol", "coumarin", "citronellol", "benzyl alcohol",
+                      "phenoxyethanol", "retinol", "salicylic acid", "glycolic acid", "silicone",
+                      "dimethicone", "mineral oil"],
+    }
+
+    print(f"Catalogue : {len(texts)} produits, {sum(map(len, texts))} caractères d'ingrédients")
+    for label, avoid in avoid_lists.items():
+        matcher = IngredientMatcher(avoid)
+        methods = [("boucle", _legacy_filter),
+                   ("automate", lambda t, _: [i for i, x in enumerate(t) if not matcher.contains_any(x)])]
+
+        reference, parts = None, []
+        for name, func in methods:
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                result = func(lowered, avoid)
+                best = min(best, time.perf_counter() - start)
+            if reference is None:
+                reference = result
+            assert result == reference, "Toutes les méthodes doivent garder les mêmes produits"
+            parts.append(f"{name} {best * 1000:7.2f} ms")
+        print(f"{label:>9} : " + " | ".join(parts) + f" | {len(reference)} produits gardés")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark du filtrage des ingrédients à éviter")
+    parser.add_argument("--csv", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                      "skincare_products.csv"))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    _benchmark(args.csv, args.repeat)
@@ -0,0 +1,109 @@
+"""
+Index lexical BM25 sur les noms, catégories et ingrédients des produits.
+
+La recherche vectorielle est peu précise sur les correspondances exactes (un actif
+comme "niacinamide", une marque comme "CeraVe") : l'index BM25 les retrouve, et la
+recherche hybride de ProductRetriever fusionne les deux classements par
+Reciprocal Rank Fusion (RRF).
+
+Les poids BM25 de chaque couple (terme, produit) sont pré-calculés à la
+construction ; le score d'une requête est une somme de quelques listes de
+postings (opérations NumPy), de l'ordre de la dizaine de microsecondes par terme.
+"""
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# Paramètres BM25 classiques
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Constante de la Reciprocal Rank Fusion (valeur du papier d'origine)
+RRF_K = 60
+
+_TOKEN = re.compile(r"[a-z0-9]{2,}")
+
+
+def _fold(text):
+    """Minuscules, sans accents"""
+    return unicodedata.normalize("NFKD", str(text).lower()).encode("ascii", "ignore").decode("ascii")
+
+
+def tokenize(text):
+    """Termes d'un texte (minuscules, sans accents, au moins 2 caractères)"""
+    return _TOKEN.findall(_fold(text))
+
+
+class BM25Index:
+    """Index inversé terme -> (produits, poids BM25), scores calculés par sommes vectorisées"""
+
+    def __init__(self, texts, k1=BM25_K1, b=BM25_B):
+        """`texts[i]` : texte indexé du produit i (nom, catégorie, ingrédients...)"""
+        folded = pd.Series(list(texts), dtype=object).astype(str).str.lower()
+        folded = folded.str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+        tokens = folded.str.findall(_TOKEN.pattern).explode().dropna()
+        self.n_products = len(folded)
+
+        # Fréquence de chaque terme dans chaque produit, et longueur des produits (en termes)
+        counts = tokens.groupby([tokens.index, tokens.to_numpy()]).size()
+        products = counts.index.get_level_values(0).to_numpy(dtype=np.int64)
+        term_ids, vocabulary = pd.factorize(counts.index.get_level_values(1), sort=True)
+        frequencies = counts.to_numpy(dtype="float32")
+        lengths = np.bincount(products, weights=frequencies, minlength=self.n_products).astype("float32")
+        average_length = float(lengths.mean()) if self.n_products and lengths.any() else 1.0
+
+        document_frequency = np.bincount(term_ids, minlength=len(vocabulary))
+        idf = np.log1p((self.n_products - document_frequency + 0.5) / (document_frequency + 0.5))
+        norm = k1 * (1.0 - b + b * lengths[products] / average_length)
+        weights = (idf[term_ids] * frequencies * (k1 + 1.0) / (frequencies + norm)).astype("float32")
+
+        # Postings triés par terme : les produits et poids du terme t sont entre bounds[t] et bounds[t+1]
+        order = np.argsort(term_ids, kind="stable")
+        self._products = products[order]
+        self._weights = weights[order]
+        self._bounds = np.searchsorted(term_ids[order], np.arange(len(vocabulary) + 1))
+        self._term_ids = {str(term): i for i, term in enumerate(vocabulary)}
+
+    @property
+    def vocabulary_size(self):
+        return len(self._term_ids)
+
+    def scores(self, query):
+        """Score BM25 de chaque produit pour la requête (tableau de taille n_products)"""
+        scores = np.zeros(self.n_products, dtype="float32")
+        for term in set(tokenize(query)):
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                continue
+            start, end = self._bounds[term_id], self._bounds[term_id + 1]
+            # Un produit n'apparaît qu'une fois par terme : l'addition indexée est sûre
+            scores[self._products[start:end]] += self._weights[start:end]
+        return scores
+
+    def search(self, query, k, allowed=None):
+        """Positions des k meilleurs produits (score > 0), restreints au masque `allowed`"""
+        scores = self.scores(query)
+        if allowed is not None:
+            scores[~allowed] = 0.0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def reciprocal_rank_fusion(rankings, k, rrf_k=RRF_K):
+    """
+    Fusion de classements (tableaux de positions, meilleur en premier) :
+    score(p) = somme sur les classements de 1 / (rrf_k + rang de p).
+    Renvoie (positions, scores) des k meilleurs.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, position in enumerate(ranking):
+            if position == -1:
+                continue
+            position = int(position)
+            fused[position] = fused.get(position, 0.0) + 1.0 / (rrf_k + rank + 1)
+    best = sorted(fused.items(), key=lambda item: -item[1])[:k]
+    return [position for position, _ in best], [score for _, score in best]
@@ -0,0 +1,122 @@
+"""
+Comptabilité des appels LLM structurés : tokens et taille des charges utiles.
+
+Pour chaque appel de GlowAI._invoke_structured, on relève :
+- les tokens du prompt et de la réponse (usage_metadata du message Mistral),
+- la taille du prompt, du contexte RAG qu'il contient, du schéma JSON envoyé
+  comme outil et de la réponse validée (octets UTF-8),
+- si la réponse vient du cache (aucun token consommé) ou si elle a été rejetée
+  au parsing (tokens consommés pour rien).
+Ce relevé est renvoyé avec l'objet validé (RoutineResults.usage côté GlowAI) et agrégé
+dans le processus par type de routine et par bucket de profil : on voit ainsi
+lequel des prompts coûte le plus et l'effet d'une modification de prompt.
+Avec GLOW_USAGE_LOG=<fichier>, chaque relevé est aussi ajouté en JSON Lines.
+"""
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+
+USAGE_LOG_PATH = os.getenv("GLOW_USAGE_LOG", "")
+
+# Compteurs additionnés dans les agrégats
+_SUMMED = ("prompt_tokens", "completion_tokens", "total_tokens", "prompt_bytes", "rag_context_bytes",
+           "schema_bytes", "output_bytes", "latency_s")
+
+
+def _utf8_size(text):
+    return len(text.encode("utf-8")) if text else 0
+
+
+@lru_cache(maxsize=None)
+def schema_size(schema):
+    """Taille (octets) du schéma JSON envoyé au modèle comme définition d'outil"""
+    return _utf8_size(json.dumps(schema.model_json_schema(), ensure_ascii=False))
+
+
+def token_counts(message):
+    """(tokens du prompt, tokens de la réponse) d'un message du modèle ; None si inconnus"""
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        return usage.get("input_tokens"), usage.get("output_tokens")
+    # Anciennes versions de langchain-mistralai : compteurs bruts de l'API
+    token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    return token_usage.get("prompt_tokens"), token_usage.get("completion_tokens")
+
+
+def call_usage(prompt_text, schema, tags=None, message=None, output=None, cached=False, failed=False,
+               latency_s=None):
+    """Relevé d'un appel structuré (dictionnaire sérialisable en JSON)"""
+    tags = tags or {}
+    prompt_tokens, completion_tokens = token_counts(message) if message is not None else (0, 0)
+    return {
+        "routine": tags.get("routine", "other"),
+        "bucket": tags.get("bucket", "unknown"),
+        "schema": schema.__name__,
+        "cached": cached,
+        "failed": failed,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": (prompt_tokens or 0) + (completion_tokens or 0),
+        "prompt_bytes": _utf8_size(prompt_text),
+        "rag_context_bytes": tags.get("rag_context_bytes", 0),
+        "schema_bytes": schema_size(schema),
+        "output_bytes": _utf8_size(output.model_dump_json()) if output is not None else 0,
+        "latency_s": round(latency_s, 4) if latency_s is not None else None,
+        "at": time.time(),
+    }
+
+
+class UsageLedger:
+    """Agrégats des relevés du processus, par type de routine et par bucket de profil"""
+
+    def __init__(self, log_path=USAGE_LOG_PATH):
+        self.log_path = log_path
+        self._groups = {"routine": {}, "bucket": {}}
+        self._lock = threading.Lock()
+
+    def record(self, usage):
+        with self._lock:
+            for dimension, groups in self._groups.items():
+                totals = groups.setdefault(usage[dimension], dict.fromkeys(
+                    ("calls", "llm_calls", "cached", "failed") + _SUMMED, 0))
+                totals["calls"] += 1
+                totals["cached"] += usage["cached"]
+                totals["failed"] += usage["failed"]
+                if not usage["cached"]:
+                    totals["llm_calls"] += 1
+                    for name in _SUMMED:
+                        totals[name] += usage[name] or 0
+        if self.log_path:
+            try:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(usage, ensure_ascii=False) + "\n")
+            except OSError as e:
+                print(f"Impossible d'écrire le relevé d'usage LLM ({e})")
+
+    def snapshot(self):
+        """
+        {"by_routine": {...}, "by_bucket": {...}} : pour chaque groupe, nombre d'appels
+        (dont servis par le cache, rejetés au parsing), sommes sur les appels réels à
+        Mistral et moyennes de tokens par appel.
+        """
+        with self._lock:
+            groups = {dimension: {name: dict(totals) for name, totals in values.items()}
+                      for dimension, values in self._groups.items()}
+        for values in groups.values():
+            for totals in values.values():
+                calls = totals["llm_calls"]
+                totals["mean_prompt_tokens"] = round(totals["prompt_tokens"] / calls, 1) if calls else None
+                totals["mean_completion_tokens"] = round(totals["completion_tokens"] / calls, 1) if calls else None
+                totals["latency_s"] = round(totals["latency_s"], 3)
+        return {"by_routine": groups["routine"], "by_bucket": groups["bucket"]}
+
+    def reset(self):
+        with self._lock:
+            for groups in self._groups.values():
+                groups.clear()
+
+
+# Agrégats du processus
+ledger = UsageLedger()
@@ -0,0 +1,147 @@
+"""
+Sous-index FAISS par catégorie de produit (Cleanser, Serum, Moisturiser...).
+
+Les recherches des étapes d'une routine portent toujours sur une ou deux
+catégories : au lieu de parcourir l'index global en masquant les autres produits,
+on cherche directement dans le sous-index de chaque catégorie demandée, qui ne
+contient qu'une fraction des vecteurs. Les résultats sont renvoyés en positions
+de l'index global, ce qui les rend interchangeables avec une recherche globale.
+
+Les sous-index sont construits à partir des vecteurs de l'index global (pas de
+nouvel encodage), avec le même type d'index (voir ann_backends), sauf les IVF : une
+catégorie trop petite pour entraîner ses listes a un sous-index exact. Ils sont
+sauvegardés dans le stockage partagé et projetés en mémoire comme l'index global
+(voir shared_store). Avec "ivf_pq", les vecteurs relus sont ceux décompressés.
+"""
+import json
+import os
+
+import faiss
+import numpy as np
+
+from ann_backends import MIN_POINTS_PER_CENTROID, IndexConfig, build_index, prepare_index, search_parameters
+from shared_store import read_index_mmap
+
+PARTITIONS_FILE = "partitions.json"
+
+
+def partition_config(config, n_vectors):
+    """
+    Type du sous-index d'une catégorie de `n_vectors` produits : celui de `config`,
+    sauf IVF sous nlist * MIN_POINTS_PER_CENTROID vecteurs (index exact).
+    """
+    if config is None or config.backend not in ("ivf_flat", "ivf_pq") or \
+            n_vectors >= config.nlist * MIN_POINTS_PER_CENTROID:
+        return config
+    return IndexConfig("flat", quantization=config.quantization)
+
+
+def masked_search(index, vectors, k, allowed=None):
+    """Recherche FAISS restreinte aux vecteurs du masque `allowed` (None = tous)"""
+    if allowed is None:
+        return index.search(vectors, k)
+
+    if not allowed.any():
+        empty = np.full((len(vectors), k), -1, dtype=np.int64)
+        return np.zeros((len(vectors), k), dtype="float32"), empty
+
+    # Bitset des vecteurs autorisés (bit i = vecteur i), lu directement par FAISS
+    bitmap = np.packbits(allowed, bitorder="little")
+    params = search_parameters(index, faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap)))
+    return index.search(vectors, k, params=params)
+
+
+class PartitionedIndex:
+    """Un index FAISS par catégorie, avec la correspondance vers les positions globales"""
+
+    def __init__(self, vectors, product_types, config=None):
+        """
+        `vectors[i]` et `product_types[i]` : vecteur et catégorie du produit i de l'index global.
+        `config` (IndexConfig) : type des sous-index (exacts par défaut).
+        """
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        product_types = np.asarray(product_types)
+        self.dimension = vectors.shape[1]
+        self._partitions = {}
+        for product_type in np.unique(product_types):
+            positions = np.flatnonzero(product_types == product_type).astype(np.int64)
+            index = build_index(vectors[positions], partition_config(config, len(positions)))
+            self._partitions[str(product_type)] = (index, positions)
+
+    @classmethod
+    def from_index(cls, index, product_types, config=None):
+        """Sous-index construits à partir des vecteurs stockés dans l'index global"""
+        return cls(index.reconstruct_n(0, index.ntotal), product_types, config)
+
+    def save(self, directory):
+        """Écrit un index et un tableau de positions par catégorie (description JSON écrite en dernier)"""
+        os.makedirs(directory, exist_ok=True)
+        files = {}
+        for i, (product_type, (index, positions)) in enumerate(sorted(self._partitions.items())):
+            name = f"partition-{i}"
+            faiss.write_index(index, os.path.join(directory, f"{name}.faiss"))
+            np.save(os.path.join(directory, f"{name}.positions.npy"), positions)
+            files[product_type] = name
+        with open(os.path.join(directory, PARTITIONS_FILE), "w", encoding="utf-8") as f:
+            json.dump({"dimension": self.dimension, "partitions": files}, f, indent=2, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory, config=None):
+        """Sous-index sauvegardés par save(), projetés en mémoire (lecture seule)"""
+        with open(os.path.join(directory, PARTITIONS_FILE), encoding="utf-8") as f:
+            description = json.load(f)
+        partitioned = cls.__new__(cls)
+        partitioned.dimension = description["dimension"]
+        partitioned._partitions = {}
+        for product_type, name in description["partitions"].items():
+            index = read_index_mmap(os.path.join(directory, f"{name}.faiss"))
+            # Paramètres de recherche du moteur : seuls ceux des IVF s'appliquent, sur leur propre nlist
+            prepare_index(index, config)
+            positions = np.load(os.path.join(directory, f"{name}.positions.npy"), mmap_mode="r")
+            partitioned._partitions[product_type] = (index, positions)
+        return partitioned
+
+    @property
+    def types(self):
+        return sorted(self._partitions)
+
+    def sizes(self):
+        """Nombre de produits par catégorie"""
+        return {product_type: int(index.ntotal) for product_type, (index, _) in self._partitions.items()}
+
+    def search(self, vectors, k, product_types, allowed=None):
+        """
+        Les k plus proches voisins parmi les catégories `product_types`, en positions
+        globales (distances, indices ; -1 si pas assez de résultats). `allowed` est un
+        masque sur l'index global (ingrédients, prix), appliqué dans chaque sous-index.
+        """
+        n_queries = len(vectors)
+        all_distances, all_indices = [], []
+        for product_type in dict.fromkeys(product_types):
+            partition = self._partitions.get(str(product_type))
+            if partition is None:
+                continue
+            index, positions = partition
+            local_allowed = allowed[positions] if allowed is not None else None
+            distances, local = masked_search(index, vectors, min(k, index.ntotal), local_allowed)
+            found = local != -1
+            all_indices.append(np.where(found, positions[np.where(found, local, 0)], -1))
+            all_distances.append(np.where(found, distances, np.inf))
+
+        if not all_indices:
+            return (np.zeros((n_queries, k), dtype="float32"), np.full((n_queries, k), -1, dtype=np.int64))
+
+        distances = np.hstack(all_distances)
+        indices = np.hstack(all_indices)
+        if len(all_indices) > 1:
+            # Fusion des résultats des catégories : tri par distance, on garde les k premiers
+            order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+            distances = np.take_along_axis(distances, order, axis=1)
+            indices = np.take_along_axis(indices, order, axis=1)
+
+        if indices.shape[1] < k:
+            pad = k - indices.shape[1]
+            distances = np.pad(distances, ((0, 0), (0, pad)), constant_values=np.inf)
+            indices = np.pad(indices, ((0, 0), (0, pad)), constant_values=-1)
+        distances = np.where(indices != -1, distances, 0.0).astype("float32")
+        return distances, indices
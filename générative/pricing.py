@@ -0,0 +1,72 @@
+"""
+Prix et budget : conversion des prix du catalogue en euros et lecture du budget du profil.
+
+Les prix du CSV sont des chaînes ("£5.20") : ils sont convertis une fois, à
+l'indexation, en un tableau numérique en euros qui sert à filtrer la recherche RAG.
+"""
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+# Taux de conversion vers l'euro (le catalogue actuel est en livres sterling)
+CURRENCY_TO_EUR = {
+    "£": float(os.getenv("GLOW_GBP_EUR_RATE", "1.17")),
+    "$": float(os.getenv("GLOW_USD_EUR_RATE", "0.92")),
+    "€": 1.0,
+}
+DEFAULT_CURRENCY = "£"
+
+_AMOUNT = r"(\d+(?:[.,]\d+)?)"
+_RANGE = re.compile(_AMOUNT + r"\s*€?\s*-\s*" + _AMOUNT)
+
+
+def parse_prices(prices):
+    """Tableau float32 des prix en euros (NaN si le prix est illisible)"""
+    values = pd.Series(prices, dtype="object").astype(str)
+    amounts = pd.to_numeric(values.str.extract(_AMOUNT, expand=False).str.replace(",", "."), errors="coerce")
+    symbols = values.str.extract("([£$€])", expand=False).fillna(DEFAULT_CURRENCY)
+    rates = symbols.map(CURRENCY_TO_EUR)
+    return (amounts * rates).to_numpy(dtype="float32")
+
+
+def parse_price(price):
+    """Prix unique en euros (NaN si illisible)"""
+    return float(parse_prices([price])[0])
+
+
+def budget_price_range(budget, n_products):
+    """
+    Fourchette de prix (min, max) par produit, en euros, déduite du budget du profil.
+    - "Moyen (20-40€ par produit)" -> (20, 40)
+    - "50€ (Budget Faible)"        -> (None, 50 / n_products) : budget global réparti
+    - pas de montant               -> (None, None)
+    """
+    text = str(budget or "")
+    price_range = _RANGE.search(text)
+    if price_range:
+        low, high = (float(v.replace(",", ".")) for v in price_range.groups())
+        if "produit" in text.lower():
+            return low, high
+        return None, high / max(1, n_products)
+
+    amount = re.search(_AMOUNT, text)
+    if not amount:
+        return None, None
+    value = float(amount.group(1).replace(",", "."))
+    if "produit" in text.lower():
+        return None, value
+    return None, value / max(1, n_products)
+
+
+def price_mask(prices_eur, min_price=None, max_price=None):
+    """Masque vectorisé des produits dans la fourchette (None = pas de contrainte)"""
+    if min_price is None and max_price is None:
+        return None
+    mask = ~np.isnan(prices_eur)
+    if min_price is not None:
+        mask &= prices_eur >= min_price
+    if max_price is not None:
+        mask &= prices_eur <= max_price
+    return mask
@@ -1,91 +1,422 @@
 """
 Module RAG pour la recherche de produits de beauté
 """
-import pandas as pd
+import numpy as np
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 import os
+import threading
+from ann_backends import IndexConfig, build_index, prepare_index, rerank_exact
+from index_cache import (DEFAULT_CACHE_DIR, cache_lock, catalog_fingerprint, load_full_vectors,
+                         load_query_embeddings, load_shared_store, load_vector_store, resolve_entry_path,
+                         save_query_embeddings, save_vector_store)
+from catalog import Catalog
+from catalog_update import incremental_update
+from ingredient_index import IngredientIndex
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from partitioned_index import PartitionedIndex, masked_search
+from pricing import parse_prices, price_mask
+from rag_queries import iter_template_queries
+from shared_store import ColumnDocstore, PositionIds, resident_memory
+from stage_metrics import span, timed
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# Nombre maximum de requêtes gardées en mémoire avec leur embedding
+QUERY_CACHE_SIZE = 4096
+# Index, vecteurs et métadonnées projetés en mémoire et partagés entre processus (GLOW_SHARED_INDEX=0 : pickle)
+SHARED_INDEX_ENABLED = os.getenv("GLOW_SHARED_INDEX", "1") != "0"
+
+# "vector" : similarité des embeddings ; "hybrid" : fusion avec le classement lexical BM25
+SEARCH_MODES = ("vector", "hybrid")
+DEFAULT_SEARCH_MODE = os.getenv("GLOW_SEARCH_MODE", "vector")
+# Candidats de chaque classement (vectoriel et lexical) fusionnés en mode hybride
+HYBRID_CANDIDATES = 30
+
+
+class LazyEmbeddings(Embeddings):
+    """
+    Modèle d'embedding chargé seulement au premier encodage.
+    Un processus qui recharge l'index depuis le cache et dont toutes les requêtes
+    sont déjà pré-calculées ne charge jamais sentence-transformers.
+    """
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def _get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    print("Initialisation du modele d'embedding...")
+                    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+                    self._model = HuggingFaceEmbeddings(model_name=self.model_name)
+        return self._model
+
+    def embed_documents(self, texts):
+        return self._get_model().embed_documents(texts)
+
+    def embed_query(self, text):
+        return self._get_model().embed_query(text)
+
 
 class ProductRetriever:
-    def __init__(self, csv_path):
+    def __init__(self, csv_path, model_name=EMBEDDING_MODEL_NAME, cache_dir=DEFAULT_CACHE_DIR, use_cache=True,
+                 index_config=None, shared=SHARED_INDEX_ENABLED, search_mode=DEFAULT_SEARCH_MODE):
         self.csv_path = csv_path
+        self.model_name = model_name
+        # Type d'index FAISS (exact par défaut ; IVF, HNSW ou IVF-PQ pour les gros catalogues)
+        self.index_config = index_config or IndexConfig.from_env()
+        self.cache_dir = cache_dir
+        self.use_cache = use_cache
+        self.shared = shared
+        self.search_mode = search_mode
+        # True si l'index a été ouvert depuis le stockage partagé (projeté en mémoire)
+        self.shared_loaded = False
+        self.cache_entry = None
+        # Empreinte du catalogue indexé (pour détecter une modification du CSV)
+        self.fingerprint = None
         self.vector_store = None
+        self.ingredient_index = None
+        self.lexical_index = None
+        self.prices_eur = None
+        self.product_types = None
+        self.partitions = None
+        # Vecteurs float32 (memmap) pour reclasser les résultats d'un index compressé
+        self.full_vectors = None
         # On utilise un modèle léger et gratuit pour transformer le texte en vecteurs
-        print("Initialisation du modele d'embedding...")
-        self.embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        self.embeddings = LazyEmbeddings(model_name)
+        # Embeddings des requêtes déjà vues (ou pré-calculées) : {requête: vecteur}
+        self._query_embeddings = {}
+        self._query_lock = threading.Lock()
         self._initialize_vector_store()
 
     def _initialize_vector_store(self):
-        print(f"Chargement et indexation des produits depuis {self.csv_path}...")
-        
+        self._load_or_build_vector_store()
+        docstore = self.vector_store.docstore
+        if isinstance(docstore, ColumnDocstore):
+            # Docstore en colonnes : les métadonnées sont lues colonne par colonne, sans créer de documents
+            documents = None
+            column = docstore.column
+        else:
+            documents = self._documents_at(range(self.vector_store.index.ntotal))
+            column = lambda name: [doc.metadata.get(name, "") for doc in documents]
+
+        # Index inversé des ingrédients, aligné sur les positions de l'index FAISS
+        self.ingredient_index = IngredientIndex(column("ingredients"))
+
+        # Index lexical BM25 (nom, catégorie, ingrédients) pour la recherche hybride
+        self.lexical_index = BM25Index(f"{name} {product_type} {ingredients}" for name, product_type, ingredients
+                                       in zip(column("name"), column("type"), column("ingredients")))
+
+        # Prix convertis une fois en euros (tableau numérique pour le filtrage par budget)
+        self.prices_eur = parse_prices(list(column("price")))
+        if documents is None:
+            docstore.add_numeric_column("price_eur", self.prices_eur)
+        else:
+            for doc, price in zip(documents, self.prices_eur):
+                doc.metadata["price_eur"] = None if np.isnan(price) else round(float(price), 2)
+
+        # Catégorie de chaque produit (Cleanser, Serum, Moisturiser...)
+        self.product_types = np.array([str(product_type) for product_type in column("type")])
+        # Un sous-index par catégorie : une recherche filtrée par catégorie ne parcourt que ses produits.
+        # Ils sont déjà prêts après une construction, ou projetés depuis le stockage partagé ; une
+        # entrée partagée sans sous-index garde l'index global projeté (filtre par masque) plutôt
+        # que de recopier les vecteurs dans des sous-index privés à chaque processus.
+        if self.partitions is None and not self.shared_loaded:
+            if self.full_vectors is not None:
+                self.partitions = PartitionedIndex(self.full_vectors, self.product_types, self.index_config)
+            else:
+                self.partitions = PartitionedIndex.from_index(self.vector_store.index, self.product_types,
+                                                              self.index_config)
+
+    def _load_or_build_vector_store(self):
         if not os.path.exists(self.csv_path):
             raise FileNotFoundError(f"Le fichier {self.csv_path} est introuvable !")
 
-        # Chargement du CSV
-        df = pd.read_csv(self.csv_path)
-        
-        # Création des documents pour le RAG
-        documents = []
-        for _, row in df.iterrows():
-            # On crée un texte descriptif riche pour que l'IA comprenne bien le produit
-            # On combine Type, Nom, Prix et Ingrédients
-            content = f"Type: {row['product_type']}. " \
-                      f"Nom: {row['product_name']}. " \
-                      f"Prix: {row['price']}. " \
-                      f"Ingrédients: {str(row['ingredients'])}."
-            
-            # On garde les infos propres dans les métadonnées pour l'affichage final
-            metadata = {
-                "name": row['product_name'],
-                "type": row['product_type'],
-                "price": row['price'],
-                "url": row['product_url'] if 'product_url' in row else "",
-                "ingredients": str(row['ingredients']).lower() # Stocké pour le filtrage
-            }
-            
-            documents.append(Document(page_content=content, metadata=metadata))
-            
-        # Création de la base vectorielle FAISS (le "cerveau")
-        self.vector_store = FAISS.from_documents(documents, self.embeddings)
-        print(f"Base de donnees produits prete ! ({len(documents)} produits indexes)")
+        # Si le catalogue et le modèle n'ont pas changé, on recharge l'index déjà calculé
+        fingerprint = catalog_fingerprint(self.csv_path, self.model_name, self.index_config.build_key())
+        self.fingerprint = fingerprint
+        if not self.use_cache:
+            self._build_vector_store(fingerprint)
+            return
+
+        if not self._load_cached_vector_store(fingerprint):
+            # Un seul processus construit l'index d'un catalogue : les autres attendent le
+            # verrou, puis relisent l'entrée publiée au lieu de la reconstruire
+            with cache_lock(self.cache_dir, fingerprint):
+                if not self._load_cached_vector_store(fingerprint):
+                    self._build_vector_store(fingerprint)
+        # Version publiée de l'entrée : les fichiers écrits ensuite (requêtes) vont à côté de l'index lu
+        self.cache_entry = resolve_entry_path(self.cache_dir, fingerprint)
+
+    def _load_cached_vector_store(self, fingerprint):
+        """Recharge l'index depuis le cache ; False si l'entrée est absente ou illisible"""
+        entry_path = resolve_entry_path(self.cache_dir, fingerprint)
+        try:
+            self.vector_store = self._load_shared(fingerprint) if self.shared else None
+            if self.vector_store is None:
+                self.vector_store = load_vector_store(self.cache_dir, fingerprint, self.embeddings)
+                if self.vector_store is not None and self.index_config.compressed:
+                    self.full_vectors = load_full_vectors(entry_path)
+            if self.vector_store is not None:
+                self._query_embeddings.update(load_query_embeddings(entry_path))
+        except Exception as e:
+            print(f"Cache d'index illisible ({e}), reconstruction...")
+            self.vector_store = None
+            self.partitions = None
+            self.shared_loaded = False
+
+        if self.vector_store is None:
+            return False
+        prepare_index(self.vector_store.index, self.index_config)
+        print(f"Index produits charge depuis le cache ({self.vector_store.index.ntotal} produits, "
+              f"{len(self._query_embeddings)} requetes pre-calculees"
+              f"{', partage entre processus' if self.shared_loaded else ''})")
+        return True
+
+    def _build_vector_store(self, fingerprint):
+        print(f"Chargement et indexation des produits depuis {self.csv_path}...")
+
+        # Catalogue chargé en colonnes (opérations vectorisées, pas de boucle ligne à ligne)
+        catalog = Catalog.from_csv(self.csv_path)
+
+        # Catalogue modifié : on part de la version précédente et on n'encode que les produits
+        # ajoutés ou modifiés
+        update = None
+        if self.use_cache:
+            try:
+                update = incremental_update(self.cache_dir, fingerprint, self.model_name, self.index_config,
+                                            catalog, self.embeddings.embed_documents)
+            except Exception as e:
+                print(f"Mise a jour incrementale impossible ({e}), indexation complete...")
+
+        if update is not None:
+            vectors, index, update_info = update
+            print(f"Mise a jour incrementale : {update_info['added']} ajoute(s), {update_info['changed']} "
+                  f"modifie(s), {update_info['removed']} retire(s), {update_info['unchanged']} inchange(s)")
+        else:
+            vectors = np.asarray(self.embeddings.embed_documents(catalog.page_content.tolist()), dtype="float32")
+            index, update_info = build_index(vectors, self.index_config), None
+
+        # Création de la base vectorielle FAISS (le "cerveau") : les documents ne sont
+        # construits qu'à la demande, pour les produits renvoyés par une recherche
+        self.vector_store = FAISS(embedding_function=self.embeddings, index=index,
+                                  docstore=catalog.docstore(), index_to_docstore_id=PositionIds(len(catalog)))
+        if self.index_config.compressed:
+            self.full_vectors = vectors
+        self.partitions = PartitionedIndex(vectors, catalog.types, self.index_config)
+        print(f"Base de donnees produits prete ! ({len(catalog)} produits indexes, {self.index_config})")
+
+        if self.use_cache:
+            try:
+                entry_path = save_vector_store(self.cache_dir, fingerprint, self.vector_store,
+                                               self.csv_path, self.model_name, self.index_config,
+                                               full_vectors=self.full_vectors,
+                                               extra_manifest={"update": update_info} if update_info else None,
+                                               partitions=self.partitions)
+                print(f"Index sauvegarde dans le cache : {entry_path}")
+            except OSError as e:
+                # Un cache en lecture seule ne doit pas empêcher le service de démarrer
+                print(f"Impossible d'ecrire le cache d'index ({e})")
+
+    def catalog_changed(self):
+        """True si le CSV a changé depuis la construction de l'index"""
+        try:
+            current = catalog_fingerprint(self.csv_path, self.model_name, self.index_config.build_key())
+        except OSError:
+            return False
+        return current != self.fingerprint
 
-    def get_relevant_products(self, query, k=3, avoid_ingredients=None):
+    def _load_shared(self, fingerprint):
+        """Base FAISS ouverte sans copie depuis le stockage partagé, ou None s'il est absent"""
+        store = load_shared_store(self.cache_dir, fingerprint)
+        if store is None:
+            return None
+        if self.index_config.compressed:
+            self.full_vectors = store.vectors
+        self.partitions = store.partitions(self.index_config)
+        self.shared_loaded = True
+        return FAISS(embedding_function=self.embeddings, index=store.index, docstore=store.docstore(),
+                     index_to_docstore_id=PositionIds(store.size))
+
+    def memory_stats(self):
+        """Mémoire résidente de ce processus (totale, privée, partagée) et mode de chargement de l'index"""
+        stats = resident_memory()
+        stats["shared_index"] = self.shared_loaded
+        return stats
+
+    def get_relevant_products(self, query, k=3, avoid_ingredients=None, min_price=None, max_price=None,
+                              product_types=None, with_scores=False, search_mode=None):
         """
         Cherche les k produits les plus pertinents pour la requête.
-        Filtre automatiquement les produits contenant des ingrédients à éviter.
+        Filtre automatiquement les produits contenant des ingrédients à éviter
+        et, si demandé, ceux hors de la fourchette de prix (en euros) ou d'une
+        autre catégorie que `product_types`.
+        `search_mode` : "vector" (similarité des embeddings) ou "hybrid" (fusion avec
+        le classement lexical BM25) ; par défaut, le mode du moteur.
+        Avec `with_scores=True`, renvoie des couples (document, score) : similarité
+        cosinus en mode "vector", score de fusion RRF en mode "hybrid".
+        """
+        return self.get_relevant_products_batch([query], k=k, avoid_ingredients=avoid_ingredients,
+                                                min_price=min_price, max_price=max_price,
+                                                product_types=product_types, with_scores=with_scores,
+                                                search_mode=search_mode)[0]
+
+    @timed("retriever.get_relevant_products")
+    def get_relevant_products_batch(self, queries, k=3, avoid_ingredients=None, min_price=None, max_price=None,
+                                    product_types=None, with_scores=False, search_mode=None):
+        """
+        Version groupée de get_relevant_products : une liste de requêtes en entrée,
+        une liste de résultats (un par requête) en sortie.
+        Toutes les requêtes sont encodées en une seule passe du modèle d'embedding
+        et cherchées dans FAISS avec un seul appel matriciel par ensemble de catégories.
+        `product_types` : catégories communes à toutes les requêtes, ou liste d'un
+        tuple de catégories (ou None) par requête.
         """
         if not self.vector_store:
             raise ValueError("Vector store not initialized")
-            
-        # On récupère plus de candidats pour pouvoir filtrer après
-        # Si on veut 3 produits finaux, on en cherche 10 au départ
-        fetch_k = k * 4 
-        results = self.vector_store.similarity_search(query, k=fetch_k)
-        
-        if not avoid_ingredients:
-            return results[:k]
-            
-        filtered_results = []
-        avoid_ingredients_lower = [ing.lower() for ing in avoid_ingredients]
-        
-        for doc in results:
-            product_ingredients = doc.metadata.get("ingredients", "")
-            
-            # Vérifie si un ingrédient interdit est présent
-            contains_bad_ingredient = False
-            for bad_ing in avoid_ingredients_lower:
-                if bad_ing in product_ingredients:
-                    contains_bad_ingredient = True
-                    break
-            
-            if not contains_bad_ingredient:
-                filtered_results.append(doc)
-                
-            if len(filtered_results) >= k:
-                break
-                
-        return filtered_results
+        if not queries:
+            return []
+        search_mode = search_mode or self.search_mode
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"Mode de recherche inconnu : {search_mode!r} (attendu : {', '.join(SEARCH_MODES)})")
+
+        with span("retriever.embed"):
+            vectors = self.embed_queries(queries)
+
+        # Les produits exclus (ingrédient à éviter, prix hors budget) le sont PENDANT la
+        # recherche : on obtient toujours k produits s'il en reste assez
+        with span("retriever.filter"):
+            allowed = self.allowed_mask(avoid_ingredients, min_price, max_price)
+
+        if not product_types or isinstance(product_types[0], str):
+            return self._search_products(queries, vectors, k, allowed, product_types, with_scores, search_mode)
+
+        # Catégories propres à chaque requête : une recherche par ensemble de catégories
+        if len(product_types) != len(queries):
+            raise ValueError("product_types doit contenir une entrée par requête")
+        groups = {}
+        for i, types in enumerate(product_types):
+            groups.setdefault(tuple(types) if types else None, []).append(i)
+        results = [None] * len(queries)
+        for types, positions in groups.items():
+            found = self._search_products([queries[i] for i in positions], vectors[positions], k, allowed, types,
+                                          with_scores, search_mode)
+            for i, result in zip(positions, found):
+                results[i] = result
+        return results
+
+    def _search_products(self, queries, vectors, k, allowed, product_types, with_scores, search_mode):
+        """Recherche (vectorielle ou hybride) de requêtes déjà encodées, dans les catégories `product_types`"""
+        hybrid = search_mode == "hybrid"
+        with span("retriever.search"):
+            distances, indices = self._vector_search(vectors, max(k, HYBRID_CANDIDATES) if hybrid else k,
+                                                     allowed, product_types)
+
+        if hybrid:
+            # Classement lexical sur les mêmes produits autorisés, fusionné avec le classement vectoriel
+            type_mask = self.type_mask(product_types)
+            if type_mask is not None:
+                allowed = type_mask if allowed is None else allowed & type_mask
+            with span("retriever.lexical"):
+                fused = [reciprocal_rank_fusion([row, self.lexical_index.search(query, HYBRID_CANDIDATES, allowed)],
+                                                k) for query, row in zip(queries, indices)]
+            if not with_scores:
+                return [self._documents_at(positions) for positions, _ in fused]
+            return [list(zip(self._documents_at(positions), scores)) for positions, scores in fused]
+
+        if not with_scores:
+            return [self._documents_at(row) for row in indices]
+        return [list(zip(self._documents_at(row), self._similarities(dist[row != -1])))
+                for dist, row in zip(distances, indices)]
+
+    def _vector_search(self, vectors, k, allowed, product_types):
+        """Recherche vectorielle (distances, positions), dans les sous-index des catégories si elles sont données"""
+        use_partitions = bool(product_types) and self.partitions is not None
+        if product_types and not use_partitions:
+            type_mask = self.type_mask(product_types)
+            allowed = type_mask if allowed is None else allowed & type_mask
+        # Index compressé : on prend plus de candidats, reclassés ensuite en pleine précision
+        rerank = self.full_vectors is not None
+        k_search = k * self.index_config.rerank_factor if rerank else k
+        if use_partitions:
+            # Seuls les sous-index des catégories demandées sont parcourus
+            distances, indices = self.partitions.search(vectors, k_search, product_types, allowed)
+        else:
+            distances, indices = self._search(vectors, k_search, allowed)
+        if rerank:
+            distances, indices = rerank_exact(self.full_vectors, vectors, indices, k)
+        return distances, indices
+
+    @staticmethod
+    def _similarities(distances):
+        """Distances L2² (vecteurs normalisés) -> similarité cosinus"""
+        return [float(max(0.0, 1.0 - d / 2.0)) for d in distances]
+
+    def allowed_mask(self, avoid_ingredients=None, min_price=None, max_price=None, product_types=None):
+        """Masque des produits autorisés (None si aucune contrainte)"""
+        allowed = self.ingredient_index.allowed_mask(avoid_ingredients) if avoid_ingredients else None
+        for constraint in (price_mask(self.prices_eur, min_price, max_price), self.type_mask(product_types)):
+            if constraint is not None:
+                allowed = constraint if allowed is None else allowed & constraint
+        return allowed
+
+    def type_mask(self, product_types):
+        """Masque des produits des catégories demandées (None = toutes)"""
+        if not product_types:
+            return None
+        return np.isin(self.product_types, list(product_types))
+
+    def _search(self, vectors, k, allowed=None):
+        """Recherche FAISS dans l'index global, restreinte aux produits du masque `allowed` s'il est donné"""
+        return masked_search(self.vector_store.index, vectors, k, allowed)
+
+    def embed_queries(self, queries):
+        """
+        Embeddings des requêtes (matrice float32), avec mémoïsation :
+        seules les requêtes jamais vues passent par le modèle, en une seule passe.
+        """
+        with self._query_lock:
+            vectors = {q: self._query_embeddings.get(q) for q in queries}
+
+        missing = [q for q, vector in vectors.items() if vector is None]
+        if missing:
+            new_vectors = np.asarray(self.embeddings.embed_documents(missing), dtype="float32")
+            vectors.update(zip(missing, new_vectors))
+            with self._query_lock:
+                self._query_embeddings.update(zip(missing, new_vectors))
+                # On oublie les plus anciennes requêtes au-delà de la limite
+                while len(self._query_embeddings) > QUERY_CACHE_SIZE:
+                    self._query_embeddings.pop(next(iter(self._query_embeddings)))
+
+        return np.stack([vectors[q] for q in queries]).astype("float32", copy=False)
+
+    def precompute_query_embeddings(self, queries=None, persist=True):
+        """
+        Encode à l'avance toutes les requêtes du gabarit RAG (ou `queries`) et les
+        sauvegarde avec l'index : les processus de service n'ont alors plus besoin
+        de charger le modèle d'embedding.
+        """
+        queries = list(queries) if queries is not None else list(iter_template_queries())
+        self.embed_queries(queries)
+        if persist and self.cache_entry and os.path.isdir(self.cache_entry):
+            with self._query_lock:
+                snapshot = dict(self._query_embeddings)
+            save_query_embeddings(self.cache_entry, snapshot)
+        return len(queries)
+
+    def _documents_at(self, positions):
+        """Documents correspondant à des positions de l'index FAISS (-1 = pas de résultat)"""
+        index_to_id = self.vector_store.index_to_docstore_id
+        docstore = self.vector_store.docstore
+        return [docstore.search(index_to_id[int(i)]) for i in positions if i != -1]
 
 # Petit test pour vérifier que ça marche tout seul
 if __name__ == "__main__":
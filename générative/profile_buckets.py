@@ -0,0 +1,191 @@
+"""
+Regroupement des profils beauté en "buckets" et routines pré-calculées.
+
+Le profil envoyé par le formulaire est presque entièrement catégoriel (type de peau,
+hydratation, sensibilité, objectifs cochés) ; le budget global est ramené à une
+tranche, dont la borne basse sert au pré-calcul : les produits d'un bucket
+tiennent donc dans le budget de tous ses profils. Les profils sans
+allergie et avec peu d'objectifs tombent dans un petit nombre de buckets dont les
+routines sont générées à l'avance (voir warmup_routines.py) : ils sont servis
+directement depuis ce stock, sans appel à Mistral.
+"""
+import itertools
+import json
+import os
+import tempfile
+import threading
+
+SKIN_TYPES = ("Normal", "Dry", "Oily", "Combination")
+HYDRATION_LEVELS = ("Low", "Medium", "High")
+SENSITIVITY_LEVELS = ("Low", "Medium", "High")
+# Objectifs proposés par le formulaire du front
+KNOWN_GOALS = ("Anti-âge", "Éclat", "Anti-imperfections", "Hydratation", "Apaisement", "Resserrer les pores")
+
+# Au-delà de ce nombre d'objectifs, le profil est considéré comme atypique
+MAX_BUCKET_GOALS = 1
+
+# Tranches de budget global (borne basse, en euros) ; le formulaire propose de 20 à 500€
+BUDGET_BANDS = (20, 45, 70, 100, 150, 250)
+# En dessous de ce montant, le front ajoute "(Budget Faible)" au budget
+LOW_BUDGET_LIMIT = 45
+LOW_BUDGET_LABEL = "Budget Faible"
+
+DEFAULT_STORE_PATH = os.getenv(
+    "GLOW_PRECOMPUTED_ROUTINES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "precomputed_routines.json")
+)
+STORE_VERSION = 2
+
+
+def is_low_budget(budget):
+    """Même règle que la recherche RAG : le front ajoute "(Budget Faible)" aux petits budgets"""
+    return "faible" in str(budget or "").lower()
+
+
+def budget_band(budget):
+    """
+    Tranche (borne basse, en euros) du budget global du profil, ou None si le budget
+    ne se ramène pas à une tranche : sans montant, fourchette par produit, montant
+    sous la plus petite tranche ou mention "Budget Faible" incohérente avec le montant.
+    """
+    from pricing import budget_price_range
+
+    text = str(budget or "")
+    _, amount = budget_price_range(text, 1)
+    if amount is None or "produit" in text.lower() or amount < BUDGET_BANDS[0]:
+        return None
+    band = max(bound for bound in BUDGET_BANDS if bound <= amount)
+    if is_low_budget(text) != (band < LOW_BUDGET_LIMIT):
+        return None
+    return band
+
+
+def extract_goals(goals):
+    """Objectifs connus présents dans le champ libre `goals` (le contexte météo est ignoré)"""
+    if isinstance(goals, (list, tuple)):
+        goals = ", ".join(goals)
+    text = str(goals or "")
+    return tuple(sorted(goal for goal in KNOWN_GOALS if goal in text))
+
+
+def profile_bucket_key(skin_profile):
+    """
+    Clé du bucket d'un profil, ou None si le profil est atypique
+    (allergies, valeur inconnue, trop d'objectifs) et doit passer par le LLM.
+    """
+    if skin_profile.get("avoid_ingredients"):
+        return None
+
+    skin_type = skin_profile.get("skin_type", "Normal")
+    hydration = skin_profile.get("hydration_level", "Medium")
+    sensitivity = skin_profile.get("sensitivity", "Low")
+    if skin_type not in SKIN_TYPES or hydration not in HYDRATION_LEVELS or sensitivity not in SENSITIVITY_LEVELS:
+        return None
+
+    goals = extract_goals(skin_profile.get("goals"))
+    if len(goals) > MAX_BUCKET_GOALS:
+        return None
+
+    band = budget_band(skin_profile.get("budget"))
+    if band is None:
+        return None
+    return "|".join([skin_type, hydration, sensitivity, str(band), "+".join(goals)])
+
+
+def bucket_profile(bucket_key):
+    """Profil représentatif d'un bucket (celui envoyé au LLM lors du pré-calcul)"""
+    skin_type, hydration, sensitivity, band, goals = bucket_key.split("|")
+    goal_list = [goal for goal in goals.split("+") if goal]
+    budget = f"{band}€"
+    if int(band) < LOW_BUDGET_LIMIT:
+        budget += f" ({LOW_BUDGET_LABEL})"
+    return {
+        "skin_type": skin_type,
+        "hydration_level": hydration,
+        "sensitivity": sensitivity,
+        "budget": budget,
+        "goals": ", ".join(goal_list) if goal_list else "Soin quotidien",
+        "avoid_ingredients": [],
+    }
+
+
+def iter_bucket_keys(goal_sets=None):
+    """
+    Toutes les clés de buckets courants.
+    Par défaut : aucun objectif, ou un seul des objectifs connus.
+    """
+    if goal_sets is None:
+        goal_sets = [()] + [(goal,) for goal in KNOWN_GOALS]
+
+    for skin_type, hydration, sensitivity, band in itertools.product(
+            SKIN_TYPES, HYDRATION_LEVELS, SENSITIVITY_LEVELS, BUDGET_BANDS):
+        for goals in goal_sets:
+            yield "|".join([skin_type, hydration, sensitivity, str(band), "+".join(sorted(goals))])
+
+
+class PrecomputedRoutineStore:
+    """
+    Stock des routines pré-calculées par bucket (fichier JSON chargé en mémoire).
+    Les routines sont conservées sous forme de dictionnaires JSON : c'est à l'appelant
+    de les revalider avec son schéma.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH, model_name=None):
+        self.path = path
+        self.model_name = model_name
+        self._buckets = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._buckets is not None:
+            return self._buckets
+
+        with self._lock:
+            if self._buckets is None:
+                buckets = {}
+                if os.path.exists(self.path):
+                    try:
+                        with open(self.path, encoding="utf-8") as f:
+                            data = json.load(f)
+                        # Des routines générées par un autre modèle ne sont pas réutilisées
+                        if data.get("version") == STORE_VERSION and \
+                                (self.model_name is None or data.get("model_name") == self.model_name):
+                            buckets = data.get("buckets", {})
+                    except (OSError, ValueError) as e:
+                        print(f"Routines pré-calculées illisibles ({e})")
+                self._buckets = buckets
+        return self._buckets
+
+    def __len__(self):
+        return len(self._load())
+
+    def __contains__(self, bucket_key):
+        return bucket_key in self._load()
+
+    def get(self, bucket_key):
+        """Routines {"morning", "evening", "weekly"} -> dict JSON du bucket, ou None"""
+        if bucket_key is None:
+            return None
+        return self._load().get(bucket_key)
+
+    def put(self, bucket_key, routines):
+        """Ajoute (en mémoire) les routines d'un bucket ; appeler save() pour écrire le fichier"""
+        buckets = self._load()
+        with self._lock:
+            buckets[bucket_key] = routines
+
+    def save(self):
+        """Écrit le stock de façon atomique (fichier temporaire puis renommage)"""
+        buckets = self._load()
+        with self._lock:
+            data = {"version": STORE_VERSION, "model_name": self.model_name, "buckets": dict(buckets)}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
@@ -0,0 +1,61 @@
+"""
+Gabarit des requêtes de recherche RAG.
+
+Les requêtes envoyées au moteur de recherche de produits sont construites à partir
+d'un petit gabarit et des valeurs catégorielles du profil : l'ensemble des requêtes
+possibles est fini, ce qui permet de pré-calculer leurs embeddings.
+"""
+import itertools
+
+from profile_buckets import HYDRATION_LEVELS, SENSITIVITY_LEVELS, SKIN_TYPES, is_low_budget
+
+# Thème de la recherche RAG de chaque routine
+ROUTINE_RAG_TOPICS = {
+    "morning": "matin nettoyant crème solaire",
+    "evening": "soir démaquillant nettoyant crème nuit",
+    "weekly": "masque gommage traitement",
+}
+
+# Thème de la recherche de chaque étape d'une routine assemblée localement (routine_assembler)
+SLOT_RAG_TOPICS = {
+    "Nettoyage": "nettoyant doux",
+    "Sérum": "sérum",
+    "Hydratation": "crème hydratante",
+    "SPF": "crème protection solaire SPF",
+    "Démaquillage": "démaquillant huile baume",
+    "Traitement": "sérum réparateur nuit",
+    "Crème de nuit": "crème de nuit nourrissante",
+    "Gommage": "gommage exfoliant",
+    "Masque": "masque traitement",
+}
+
+LOW_BUDGET_SUFFIX = " pas cher abordable"
+
+
+def build_rag_query(skin_profile, routine_type):
+    """Requête de recherche RAG construite à partir du profil"""
+    query = f"produits {routine_type} pour peau {skin_profile.get('skin_type')} " \
+            f"hydratation {skin_profile.get('hydration_level')} " \
+            f"sensibilité {skin_profile.get('sensitivity')}"
+
+    # Si budget faible, on ajoute "pas cher" à la recherche
+    if is_low_budget(skin_profile.get('budget', '')):
+        query += LOW_BUDGET_SUFFIX
+    return query
+
+
+def iter_template_queries():
+    """
+    Toutes les requêtes que le gabarit peut produire avec les valeurs du formulaire :
+    recherches des prompts (une par routine) et de l'assemblage local (une par étape).
+    """
+    topics = list(ROUTINE_RAG_TOPICS.values()) + list(SLOT_RAG_TOPICS.values())
+    for routine_type, skin_type, hydration, sensitivity, low_budget in itertools.product(
+            topics, SKIN_TYPES, HYDRATION_LEVELS, SENSITIVITY_LEVELS, (False, True)):
+        profile = {
+            "skin_type": skin_type,
+            "hydration_level": hydration,
+            "sensitivity": sensitivity,
+            "budget": "Budget Faible" if low_budget else "",
+        }
+        yield build_rag_query(profile, routine_type)
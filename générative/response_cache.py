@@ -0,0 +1,146 @@
+"""
+Cache des réponses structurées du LLM.
+
+GlowAI tourne à température 0 : un même prompt donne la même réponse. On garde donc
+les routines déjà générées, validées par leur schéma Pydantic, dans deux niveaux :
+- un LRU en mémoire (limité en taille et en durée de vie),
+- un fichier SQLite local, partagé entre les redémarrages et les processus.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+
+DEFAULT_DB_PATH = os.getenv(
+    "GLOW_RESPONSE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".response_cache.sqlite")
+)
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TTL = 7 * 24 * 3600  # secondes
+
+
+def normalize_prompt(prompt_text):
+    """Normalise les espaces du prompt pour que deux prompts équivalents aient la même clé"""
+    return " ".join(prompt_text.split())
+
+
+@lru_cache(maxsize=None)
+def schema_signature(schema):
+    """Nom + empreinte du schéma JSON : une modification du schéma invalide le cache"""
+    schema_json = json.dumps(schema.model_json_schema(), sort_keys=True)
+    return f"{schema.__name__}:{hashlib.sha256(schema_json.encode('utf-8')).hexdigest()[:16]}"
+
+
+class ResponseCache:
+    """Cache à deux niveaux (mémoire LRU + SQLite) des réponses structurées"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()  # clé -> (horodatage, json)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.db_path:
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, schema TEXT NOT NULL, payload TEXT NOT NULL, created_at REAL NOT NULL)"
+                )
+
+    @contextmanager
+    def _connect(self):
+        # Une connexion par opération : utilisable depuis n'importe quel thread
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            with conn:  # commit (ou rollback) automatique
+                yield conn
+        finally:
+            conn.close()
+
+    def _expired(self, created_at):
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    @staticmethod
+    def make_key(model_name, schema, prompt_text):
+        """Clé de cache : modèle + schéma + prompt normalisé"""
+        raw = "\n".join([model_name, schema_signature(schema), normalize_prompt(prompt_text)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _remember(self, key, created_at, payload):
+        self._memory[key] = (created_at, payload)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key, schema):
+        """Renvoie l'objet `schema` en cache pour cette clé, ou None"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and self._expired(entry[0]):
+                del self._memory[key]
+                entry = None
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return schema.model_validate_json(entry[1])
+
+        row = None
+        if self.db_path:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT payload, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and self._expired(row[1]):
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    row = None
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, row[1], row[0])
+        return schema.model_validate_json(row[0])
+
+    def set(self, key, schema, value):
+        """Stocke une réponse validée (objet Pydantic du schéma donné)"""
+        payload = value.model_dump_json()
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, created_at, payload)
+        if self.db_path:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, schema, payload, created_at) VALUES (?, ?, ?, ?)",
+                    (key, schema.__name__, payload, created_at)
+                )
+
+    def clear(self):
+        """Vide les deux niveaux du cache"""
+        with self._lock:
+            self._memory.clear()
+        if self.db_path:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        """Compteurs de hits/miss pour mesurer les appels API économisés"""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+                "memory_entries": len(self._memory),
+            }
@@ -0,0 +1,248 @@
+"""
+Assemblage local (sans LLM) d'une routine à partir du catalogue.
+
+Pour chaque étape de la routine, on récupère les produits candidats de la bonne
+catégorie avec leur score de pertinence, puis on choisit un produit par étape en
+maximisant la pertinence totale sous la contrainte du budget (sac à dos à choix
+multiples). Le résultat est un SkincareRoutine valide, obtenu en quelques
+millisecondes : utilisé comme chemin rapide et comme solution de repli quand
+l'API Mistral est lente ou indisponible.
+"""
+import math
+
+import numpy as np
+
+from pricing import budget_price_range
+from rag_queries import SLOT_RAG_TOPICS, build_rag_query
+from schemas import RoutineStep, SkincareProduct, SkincareRoutine
+
+# Nombre de candidats examinés par étape
+CANDIDATES_PER_SLOT = 8
+# Élargissement de la recherche quand un mot-clé est exigé dans le nom (ex : SPF)
+KEYWORD_SEARCH_FACTOR = 4
+# Granularité des prix dans le sac à dos (0.5€) ; les prix sont arrondis au-dessus
+PRICE_UNIT = 0.5
+
+# Étapes de chaque routine : (nom, catégories du catalogue, mot-clé requis dans le nom)
+# Le thème de recherche de chaque étape est dans rag_queries (requêtes pré-calculées)
+ROUTINE_SLOTS = {
+    "morning": [
+        ("Nettoyage", ("Cleanser",), None),
+        ("Sérum", ("Serum",), None),
+        ("Hydratation", ("Moisturiser",), None),
+        ("SPF", ("Moisturiser",), "spf"),
+    ],
+    "evening": [
+        ("Démaquillage", ("Cleanser", "Balm", "Oil"), None),
+        ("Traitement", ("Serum", "Oil"), None),
+        ("Crème de nuit", ("Moisturiser", "Balm"), None),
+    ],
+    "weekly": [
+        ("Gommage", ("Exfoliator", "Peel"), None),
+        ("Masque", ("Mask",), None),
+    ],
+}
+
+# Nombre de produits d'une génération complète (toutes les étapes des trois routines)
+PRODUCTS_PER_GENERATION = sum(len(slots) for slots in ROUTINE_SLOTS.values())
+
+ROUTINE_TYPES = {"morning": "Matin", "evening": "Soir", "weekly": "Hebdomadaire"}
+
+USAGE_TIPS = {
+    "Nettoyage": "Masser sur peau humide pendant 30 secondes puis rincer à l'eau tiède.",
+    "Sérum": "Appliquer quelques gouttes sur peau propre et sèche, avant la crème.",
+    "Hydratation": "Appliquer sur le visage et le cou en mouvements remontants.",
+    "SPF": "Appliquer en dernière étape, 15 minutes avant l'exposition ; renouveler dans la journée.",
+    "Démaquillage": "Masser sur peau sèche pour dissoudre maquillage et SPF, puis émulsionner et rincer.",
+    "Traitement": "Appliquer sur peau propre le soir, en évitant le contour des yeux.",
+    "Crème de nuit": "Appliquer généreusement en dernière étape du soir.",
+    "Gommage": "1 fois par semaine maximum, sur peau humide, sans frotter fort.",
+    "Masque": "Laisser poser 10 à 15 minutes puis rincer ; 1 à 2 fois par semaine.",
+}
+
+# Préfixes de marques en plusieurs mots (le reste : premier mot du nom)
+MULTI_WORD_BRANDS = ("The Ordinary", "The Inkey List", "La Roche-Posay", "Paula's Choice", "Dr. Jart+",
+                     "Elizabeth Arden", "Estée Lauder", "Kiehl's Since 1851", "Pixi Glow", "First Aid Beauty",
+                     "Sunday Riley", "Drunk Elephant", "Medik8", "Clinique", "Bioderma")
+
+
+def guess_brand(product_name):
+    """Marque déduite du nom du produit (le catalogue n'a pas de colonne marque)"""
+    for brand in MULTI_WORD_BRANDS:
+        if product_name.lower().startswith(brand.lower()):
+            return brand
+    return product_name.split(" ")[0] if product_name else ""
+
+
+def product_price_range(budget):
+    """
+    Fourchette de prix (min, max) par produit, en euros, pour le budget du profil.
+    Le budget global saisi dans le formulaire est réparti sur tous les produits des
+    trois routines ; une fourchette "par produit" est appliquée telle quelle. Sert à
+    la fois au filtrage RAG des prompts (glow) et à l'assemblage local.
+    """
+    return budget_price_range(budget, PRODUCTS_PER_GENERATION)
+
+
+def routine_budget(skin_profile, routine_key):
+    """
+    Budget de la routine (euros) et fourchette de prix par produit : (budget, min, max).
+    Un budget global est réparti entre les trois routines au prorata de leur nombre
+    d'étapes ; une fourchette "par produit" est appliquée telle quelle.
+    """
+    budget = skin_profile.get("budget")
+    min_price, max_price = product_price_range(budget)
+    if max_price is None:
+        return None, min_price, None
+
+    share = max_price * len(ROUTINE_SLOTS[routine_key])
+    if "produit" in str(budget).lower():
+        return share, min_price, max_price
+    # Aucun produit seul ne peut dépasser le budget de sa routine
+    return share, None, share
+
+
+def choose_products(candidates, budget):
+    """
+    Sac à dos à choix multiples : un candidat par étape, pertinence totale maximale,
+    coût total <= budget. `candidates[i]` : liste de (prix, score) de l'étape i.
+    Renvoie les indices choisis, ou None si aucune combinaison ne tient dans le budget.
+    """
+    if budget is None:
+        return [int(np.argmax([score for _, score in slot])) for slot in candidates]
+
+    capacity = int(math.floor(budget / PRICE_UNIT))
+    best = np.full(capacity + 1, -np.inf)
+    best[0] = 0.0
+    choices = []
+    for slot in candidates:
+        new_best = np.full(capacity + 1, -np.inf)
+        choice = np.full(capacity + 1, -1, dtype=np.int64)
+        for j, (price, score) in enumerate(slot):
+            cost = int(math.ceil(price / PRICE_UNIT))
+            if cost > capacity:
+                continue
+            shifted = np.full(capacity + 1, -np.inf)
+            shifted[cost:] = best[:capacity + 1 - cost] + score
+            better = shifted > new_best
+            new_best[better] = shifted[better]
+            choice[better] = j
+        best = new_best
+        choices.append(choice)
+
+    if not np.isfinite(best).any():
+        return None
+
+    # On remonte les choix depuis la meilleure capacité finale
+    c = int(np.argmax(best))
+    picked = []
+    for slot, choice in zip(reversed(candidates), reversed(choices)):
+        j = int(choice[c])
+        picked.append(j)
+        c -= int(math.ceil(slot[j][0] / PRICE_UNIT))
+    return picked[::-1]
+
+
+class RoutineAssembler:
+    """Construit des SkincareRoutine à partir du moteur de recherche de produits, sans LLM"""
+
+    def __init__(self, retriever, candidates_per_slot=CANDIDATES_PER_SLOT):
+        self.retriever = retriever
+        self.candidates_per_slot = candidates_per_slot
+
+    def slot_candidates(self, skin_profile, routine_keys):
+        """
+        {routine: candidats (document, prix, score) de chaque étape}, pour toutes les
+        étapes des routines demandées en une seule recherche groupée (une requête par
+        étape, cherchée dans la catégorie de l'étape).
+        """
+        avoid_list = skin_profile.get("avoid_ingredients", [])
+        slots = [(key, spec) for key in routine_keys for spec in ROUTINE_SLOTS[key]]
+        budgets = {key: routine_budget(skin_profile, key) for key in routine_keys}
+        # La recherche est filtrée avec le plafond le plus large ; celui de chaque routine est appliqué ensuite
+        min_price = budgets[routine_keys[0]][1] if routine_keys else None
+        caps = [max_price for _, _, max_price in budgets.values()]
+        max_price = None if None in caps else max(caps, default=None)
+
+        queries = [build_rag_query(skin_profile, SLOT_RAG_TOPICS[step_name]) for _, (step_name, _, _) in slots]
+        product_types = [types for _, (_, types, _) in slots]
+        k = self.candidates_per_slot
+        if any(keyword for _, (_, _, keyword) in slots):
+            k *= KEYWORD_SEARCH_FACTOR
+
+        found = self.retriever.get_relevant_products_batch(
+            queries, k=k, avoid_ingredients=avoid_list, min_price=min_price, max_price=max_price,
+            product_types=product_types, with_scores=True)
+        found = [[(doc, score) for doc, score in results
+                  if budgets[key][2] is None or (doc.metadata.get("price_eur") or 0.0) <= budgets[key][2]]
+                 for (key, _), results in zip(slots, found)]
+
+        empty = [i for i, results in enumerate(found) if not results]
+        if empty and (min_price is not None or max_price is not None):
+            # Rien dans la fourchette : le sac à dos choisira au mieux parmi les autres
+            relaxed = self.retriever.get_relevant_products_batch(
+                [queries[i] for i in empty], k=k, avoid_ingredients=avoid_list,
+                product_types=[product_types[i] for i in empty], with_scores=True)
+            for i, results in zip(empty, relaxed):
+                found[i] = results
+
+        candidates = {key: [] for key in routine_keys}
+        for (key, (_, _, keyword)), results in zip(slots, found):
+            if keyword:
+                results = [(doc, score) for doc, score in results if keyword in doc.metadata["name"].lower()]
+            candidates[key].append([(doc, doc.metadata.get("price_eur") or 0.0, score)
+                                    for doc, score in results[:self.candidates_per_slot]])
+        return candidates
+
+    def assemble(self, skin_profile, routine_key="morning", candidates=None):
+        """
+        Routine `routine_key` ("morning", "evening" ou "weekly") pour ce profil.
+        `candidates` : candidats de la routine déjà obtenus avec slot_candidates.
+        """
+        budget, _, _ = routine_budget(skin_profile, routine_key)
+        if candidates is None:
+            candidates = self.slot_candidates(skin_profile, [routine_key])[routine_key]
+
+        slots = [(spec, cands) for spec, cands in zip(ROUTINE_SLOTS[routine_key], candidates) if cands]
+        if not slots:
+            raise ValueError(f"Aucun produit du stock ne convient pour la routine {routine_key}")
+
+        options = [[(price, score) for _, price, score in cands] for _, cands in slots]
+        picked = choose_products(options, budget)
+        if picked is None:
+            # Budget impossible à tenir : on prend le moins cher de chaque étape
+            picked = [int(np.argmin([price for price, _ in slot])) for slot in options]
+
+        steps, total = [], 0.0
+        for (spec, cands), j in zip(slots, picked):
+            step_name = spec[0]
+            doc, price, _ = cands[j]
+            total += price
+            steps.append(RoutineStep(
+                step_name=step_name,
+                products=[SkincareProduct(
+                    name=doc.metadata["name"],
+                    brand=guess_brand(doc.metadata["name"]),
+                    description=f"{doc.metadata['type']} sélectionné dans notre stock pour peau "
+                                f"{skin_profile.get('skin_type', 'Normal')}, adapté à votre budget.",
+                    price_estimation=f"{price:.2f}€",
+                )],
+                usage_tips=USAGE_TIPS.get(step_name, ""),
+            ))
+
+        return SkincareRoutine(
+            routine_type=ROUTINE_TYPES[routine_key],
+            target_skin_type=str(skin_profile.get("skin_type", "Normal")),
+            steps=steps,
+            global_advice=self._global_advice(skin_profile),
+            total_estimated_budget=f"{total:.2f}€",
+        )
+
+    @staticmethod
+    def _global_advice(skin_profile):
+        advice = "Introduisez les nouveaux produits un par un et soyez régulier(e) pendant 4 semaines."
+        if skin_profile.get("sensitivity") == "High":
+            advice = "Peau sensible : testez chaque produit sur une petite zone avant usage. " + advice
+        if skin_profile.get("avoid_ingredients"):
+            advice += f" Produits choisis sans : {', '.join(skin_profile['avoid_ingredients'])}."
+        return advice
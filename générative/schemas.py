@@ -0,0 +1,33 @@
+"""Schémas Pydantic des routines générées (sorties structurées du LLM)"""
+
+from typing import List
+from pydantic import BaseModel, Field
+
+# --- DÉFINITION DES SCHÉMAS (LES MOULES) ---
+
+class SkincareProduct(BaseModel):
+    """Représente un produit de soin recommandé."""
+    name: str = Field(description="Nom complet du produit")
+    brand: str = Field(description="Marque du produit")
+    description: str = Field(description="Courte explication de pourquoi ce produit est choisi (bénéfices)")
+    price_estimation: str = Field(description="Prix estimé (ex: '15€')")
+
+class RoutineStep(BaseModel):
+    """Une étape de la routine beauté."""
+    step_name: str = Field(description="Nom de l'étape (ex: 'Nettoyage', 'Sérum')")
+    products: List[SkincareProduct] = Field(description="Liste des produits recommandés pour cette étape")
+    usage_tips: str = Field(description="Conseils d'application spécifiques pour cette étape")
+
+class SkincareRoutine(BaseModel):
+    """La routine beauté complète générée."""
+    routine_type: str = Field(description="Type de routine (Matin, Soir, ou Hebdomadaire)")
+    target_skin_type: str = Field(description="Type de peau ciblé")
+    steps: List[RoutineStep] = Field(description="Liste ordonnée des étapes de la routine")
+    global_advice: str = Field(description="Conseil général pour cette routine")
+    total_estimated_budget: str = Field(description="Estimation du budget total pour la routine")
+
+class FullSkincareRoutine(BaseModel):
+    """Les trois routines (matin, soir, hebdomadaire) générées en un seul appel."""
+    morning: SkincareRoutine = Field(description="Routine du MATIN (Nettoyage, Sérum, Hydratation, SPF)")
+    evening: SkincareRoutine = Field(description="Routine du SOIR (nettoyage et réparation)")
+    weekly: SkincareRoutine = Field(description="Soins HEBDOMADAIRES ponctuels (Masque, Gommage...), 2 ou 3 étapes")
@@ -0,0 +1,228 @@
+"""
+Stockage partagé de l'index produits entre les processus Streamlit d'une machine.
+
+L'index FAISS, les vecteurs et les métadonnées des produits sont écrits dans un
+format en lecture seule projetable en mémoire (mmap) :
+- vectors.npy          : matrice float32 des produits
+- index.faiss          : index FAISS (listes IVF / codes projetés quand FAISS le permet)
+- <colonne>.bin        : textes UTF-8 d'une colonne, concaténés
+- <colonne>.offsets.npy: positions de début/fin de chaque texte dans <colonne>.bin
+- partitions/          : sous-index FAISS par catégorie (voir partitioned_index)
+- columns.json         : description du stockage, écrit en dernier
+
+Chaque worker ouvre ces fichiers sans les copier : les pages physiques viennent du
+cache du système et sont partagées par tous les processus qui les projettent. Les
+documents LangChain ne sont construits que pour les produits renvoyés par une
+recherche, au lieu de dépickler tout le docstore dans chaque processus.
+"""
+import json
+import os
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+SHARED_DIR = "shared"
+COLUMNS_FILE = "columns.json"
+VECTORS_FILE = "vectors.npy"
+INDEX_FILE = "index.faiss"
+PARTITIONS_DIR = "partitions"
+
+# Colonnes de métadonnées des documents produits (la colonne "page_content" donne le texte)
+METADATA_COLUMNS = ("name", "type", "price", "url", "ingredients")
+
+
+class StringColumn:
+    """Colonne de textes en lecture seule, décodés à la demande depuis un fichier projeté"""
+
+    def __init__(self, blob, offsets):
+        self._blob = blob
+        self._offsets = offsets
+
+    @classmethod
+    def open(cls, directory, name):
+        offsets = np.load(os.path.join(directory, f"{name}.offsets.npy"), mmap_mode="r")
+        blob_path = os.path.join(directory, f"{name}.bin")
+        # np.memmap refuse les fichiers vides (colonne de textes tous vides)
+        blob = np.memmap(blob_path, dtype=np.uint8, mode="r") if os.path.getsize(blob_path) else b""
+        return cls(blob, offsets)
+
+    @staticmethod
+    def write(directory, name, values):
+        encoded = [str(value).encode("utf-8") for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(data) for data in encoded], out=offsets[1:])
+        with open(os.path.join(directory, f"{name}.bin"), "wb") as f:
+            f.write(b"".join(encoded))
+        np.save(os.path.join(directory, f"{name}.offsets.npy"), offsets)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, position):
+        start, end = int(self._offsets[position]), int(self._offsets[position + 1])
+        return bytes(self._blob[start:end]).decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class PositionIds:
+    """`index_to_docstore_id` identité : l'identifiant d'un document est sa position dans l'index"""
+
+    def __init__(self, size):
+        self._size = size
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, position):
+        if not 0 <= position < self._size:
+            raise KeyError(position)
+        return position
+
+    def __iter__(self):
+        return iter(range(self._size))
+
+    def values(self):
+        return range(self._size)
+
+    def items(self):
+        return ((i, i) for i in range(self._size))
+
+
+class ColumnDocstore:
+    """
+    Docstore en colonnes : le document d'une position est construit à la demande à
+    partir des colonnes de texte (et des colonnes numériques ajoutées par le moteur).
+    """
+
+    def __init__(self, columns, size):
+        self._columns = columns
+        self._chunks = []
+        self.size = size
+        self._numeric = {}
+
+    @property
+    def columns(self):
+        if self._chunks:
+            parts = ([self._columns] if self._columns else []) + self._chunks
+            self._columns = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+            self._chunks = []
+        return self._columns
+
+    def append(self, columns, size):
+        """Ajoute à la suite les produits d'un morceau du catalogue (colonnes assemblées à la première lecture)"""
+        self._chunks.append(columns)
+        self.size += size
+
+    def __getstate__(self):
+        # Même format picklé (index.pkl) qu'avant l'ajout par morceaux
+        return {"columns": self.columns, "size": self.size, "_numeric": self._numeric}
+
+    def __setstate__(self, state):
+        self.__init__(state["columns"], state["size"])
+        self._numeric = state.get("_numeric", {})
+
+    def column(self, name):
+        return self.columns[name]
+
+    def add_numeric_column(self, name, values):
+        """Colonne calculée (ex : prix en euros) ; NaN -> None dans les métadonnées"""
+        self._numeric[name] = np.asarray(values)
+
+    def search(self, position):
+        position = int(position)
+        if not 0 <= position < self.size:
+            return f"ID {position} not found."
+        metadata = {name: self.columns[name][position] for name in METADATA_COLUMNS if name in self.columns}
+        for name, values in self._numeric.items():
+            value = values[position]
+            metadata[name] = None if np.isnan(value) else round(float(value), 2)
+        return Document(page_content=self.columns["page_content"][position], metadata=metadata)
+
+
+class SharedStore:
+    """Index, vecteurs et colonnes de métadonnées ouverts sans copie depuis un dossier partagé"""
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, COLUMNS_FILE), encoding="utf-8") as f:
+            description = json.load(f)
+        self.directory = directory
+        self.size = description["n_products"]
+        self.vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r")
+        self.columns = {name: StringColumn.open(directory, name) for name in description["columns"]}
+        self.index = read_index_mmap(os.path.join(directory, INDEX_FILE))
+
+    def docstore(self):
+        return ColumnDocstore(self.columns, self.size)
+
+    def partitions(self, config=None):
+        """Sous-index par catégorie projetés en mémoire, ou None si l'entrée n'en a pas"""
+        from partitioned_index import PARTITIONS_FILE, PartitionedIndex
+
+        directory = os.path.join(self.directory, PARTITIONS_DIR)
+        if not os.path.exists(os.path.join(directory, PARTITIONS_FILE)):
+            return None
+        return PartitionedIndex.load(directory, config)
+
+
+def read_index_mmap(path):
+    """Lecture de l'index en projetant ses données quand la version de FAISS le permet"""
+    flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+    try:
+        return faiss.read_index(path, flags)
+    except RuntimeError:
+        # Type d'index non projetable : lecture classique (copie privée au processus)
+        return faiss.read_index(path)
+
+
+def shared_store_path(entry_path):
+    return os.path.join(entry_path, SHARED_DIR)
+
+
+def has_shared_store(entry_path):
+    return os.path.exists(os.path.join(shared_store_path(entry_path), COLUMNS_FILE))
+
+
+def write_shared_store(directory, index, vectors, documents, partitions=None):
+    """Écrit le stockage partagé (dans un dossier de cache encore temporaire)"""
+    os.makedirs(directory, exist_ok=True)
+    faiss.write_index(index, os.path.join(directory, INDEX_FILE))
+    np.save(os.path.join(directory, VECTORS_FILE), np.ascontiguousarray(vectors, dtype="float32"))
+    if partitions is not None:
+        partitions.save(os.path.join(directory, PARTITIONS_DIR))
+
+    StringColumn.write(directory, "page_content", (doc.page_content for doc in documents))
+    for name in METADATA_COLUMNS:
+        StringColumn.write(directory, name, (doc.metadata.get(name, "") for doc in documents))
+
+    with open(os.path.join(directory, COLUMNS_FILE), "w", encoding="utf-8") as f:
+        json.dump({"n_products": len(documents), "columns": ["page_content", *METADATA_COLUMNS]}, f, indent=2)
+
+
+def resident_memory():
+    """
+    Mémoire résidente du processus (octets) : totale, privée (anonyme) et partagée
+    (fichiers projetés, dont l'index partagé). Lue dans /proc (Linux) ; ailleurs,
+    seul le pic de mémoire résidente est disponible.
+    """
+    stats = {}
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "RssAnon", "RssFile", "RssShmem"):
+                    stats[key] = int(value.split()[0]) * 1024
+    except OSError:
+        try:
+            import resource
+        except ImportError:  # Windows
+            return {}
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {"rss": peak * (1 if os.uname().sysname == "Darwin" else 1024), "peak_only": True}
+    return {
+        "rss": stats.get("VmRSS"),
+        "private": stats.get("RssAnon"),
+        "shared": stats.get("RssFile", 0) + stats.get("RssShmem", 0),
+    }
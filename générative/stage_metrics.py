@@ -0,0 +1,247 @@
+"""
+Mesures de latence par étape du pipeline génératif (RAG, prompt, appel Mistral, parsing).
+
+Chaque étape est chronométrée par un span :
+
+    with span("llm.network"):
+        message = chain.invoke(...)
+
+Les durées sont agrégées dans le processus en histogrammes (seaux cumulés au
+format Prometheus, et fenêtre des derniers échantillons pour les percentiles
+p50 / p95 / p99). Export en JSON (snapshot / to_json) et au format texte
+Prometheus, servi sur GLOW_METRICS_PORT (/metrics et /metrics.json).
+
+Désactivé par défaut (GLOW_METRICS=1 pour l'activer) : span() renvoie alors un
+contexte vide partagé, sans horloge ni verrou.
+"""
+import functools
+import inspect
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+METRICS_ENABLED = os.getenv("GLOW_METRICS", "0") == "1"
+# Port du serveur HTTP des mesures (0 = pas de serveur)
+METRICS_PORT = int(os.getenv("GLOW_METRICS_PORT", "0"))
+
+# Bornes des seaux (secondes) : de la recherche FAISS (~ms) à l'appel Mistral (~10 s)
+HISTOGRAM_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Nombre de derniers échantillons gardés par étape pour les percentiles
+SAMPLE_WINDOW = int(os.getenv("GLOW_METRICS_WINDOW", "2048"))
+PERCENTILES = (50, 95, 99)
+
+_NOOP_SPAN = nullcontext()
+
+
+class StageHistogram:
+    """Durées d'une étape : seaux cumulés, somme, nombre, erreurs et derniers échantillons"""
+
+    def __init__(self, buckets=HISTOGRAM_BUCKETS, window=SAMPLE_WINDOW):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds, error=False):
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    self.bucket_counts[i] += 1
+                    break
+            self.count += 1
+            self.errors += error
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            self.samples.append(seconds)
+
+    def cumulative_buckets(self):
+        """[(borne, nombre de durées <= borne)], sans le seau +Inf (égal à count)"""
+        with self._lock:
+            counts, running = [], 0
+            for bound, n in zip(self.buckets, self.bucket_counts):
+                running += n
+                counts.append((bound, running))
+            return counts
+
+    def snapshot(self):
+        with self._lock:
+            samples = sorted(self.samples)
+            stats = {
+                "count": self.count,
+                "errors": self.errors,
+                "sum_s": round(self.total, 6),
+                "mean_ms": round(1000 * self.total / self.count, 3) if self.count else None,
+                "max_ms": round(1000 * self.max, 3),
+            }
+        for p in PERCENTILES:
+            stats[f"p{p}_ms"] = round(1000 * _percentile(samples, p), 3) if samples else None
+        return stats
+
+
+def _percentile(sorted_values, p):
+    """Percentile par rang le plus proche (valeurs déjà triées)"""
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class _Span:
+    __slots__ = ("_metrics", "_stage", "_start")
+
+    def __init__(self, metrics, stage):
+        self._metrics = metrics
+        self._stage = stage
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._metrics.record(self._stage, time.perf_counter() - self._start, error=exc_type is not None)
+        return False
+
+
+class StageMetrics:
+    """Histogrammes de durée par étape (un registre par processus : voir `metrics`)"""
+
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def span(self, stage):
+        """Contexte qui chronomètre l'étape `stage` (contexte vide si les mesures sont désactivées)"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, stage)
+
+    def record(self, stage, seconds, error=False):
+        histogram = self._stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._stages.setdefault(stage, StageHistogram())
+        histogram.record(seconds, error)
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    def snapshot(self):
+        """{étape: {count, errors, sum_s, mean_ms, max_ms, p50_ms, p95_ms, p99_ms}}"""
+        with self._lock:
+            stages = dict(self._stages)
+        return {stage: histogram.snapshot() for stage, histogram in sorted(stages.items())}
+
+    def to_json(self, indent=2):
+        return json.dumps({"enabled": self.enabled, "stages": self.snapshot()}, indent=indent)
+
+    def to_prometheus(self):
+        """Format texte d'exposition Prometheus (histogramme + compteur d'erreurs par étape)"""
+        with self._lock:
+            stages = sorted(self._stages.items())
+        lines = [
+            "# HELP glow_stage_duration_seconds Durée des étapes du pipeline génératif",
+            "# TYPE glow_stage_duration_seconds histogram",
+        ]
+        for stage, histogram in stages:
+            label = _label(stage)
+            for bound, count in histogram.cumulative_buckets():
+                lines.append(f'glow_stage_duration_seconds_bucket{{stage="{label}",le="{bound}"}} {count}')
+            lines.append(f'glow_stage_duration_seconds_bucket{{stage="{label}",le="+Inf"}} {histogram.count}')
+            lines.append(f'glow_stage_duration_seconds_sum{{stage="{label}"}} {histogram.total}')
+            lines.append(f'glow_stage_duration_seconds_count{{stage="{label}"}} {histogram.count}')
+        lines += [
+            "# HELP glow_stage_errors_total Étapes terminées par une exception",
+            "# TYPE glow_stage_errors_total counter",
+        ]
+        lines += [f'glow_stage_errors_total{{stage="{_label(stage)}"}} {histogram.errors}'
+                  for stage, histogram in stages]
+        return "\n".join(lines) + "\n"
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Registre du processus
+metrics = StageMetrics()
+
+
+def span(stage):
+    """Chronomètre une étape dans le registre du processus"""
+    return metrics.span(stage)
+
+
+def timed(stage):
+    """Décorateur : chronomètre chaque appel de la fonction (ou coroutine) décorée comme l'étape `stage`"""
+    def decorate(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with metrics.span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with metrics.span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=METRICS_PORT, host="0.0.0.0"):
+    """
+    Sert /metrics (Prometheus) et /metrics.json dans un thread d'arrière-plan.
+    Sans effet si les mesures sont désactivées, si `port` vaut 0 ou si le serveur
+    tourne déjà ; renvoie le serveur, ou None.
+    """
+    global _server
+
+    if not metrics.enabled or not port:
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path == "/metrics":
+                body, content_type = metrics.to_prometheus(), "text/plain; version=0.0.4; charset=utf-8"
+            elif path == "/metrics.json":
+                body, content_type = metrics.to_json(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass  # Pas de ligne de log par requête de scraping
+
+    with _server_lock:
+        if _server is not None:
+            return _server
+        try:
+            _server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            # Plusieurs processus sur la même machine : seul le premier obtient le port
+            print(f"Serveur de mesures non démarré sur le port {port} ({e})")
+            return None
+        threading.Thread(target=_server.serve_forever, name="glow-metrics", daemon=True).start()
+        print(f"Mesures de latence servies sur http://{host}:{port}/metrics")
+        return _server
@@ -0,0 +1,59 @@
+"""Outils du benchmark rappel / latence (benchmark_retriever.py), sans modèle d'embedding"""
+import numpy as np
+import pytest
+
+from ann_backends import IndexConfig, build_index
+from benchmark_retriever import benchmark_index, make_search, percentiles_ms, recall_at_k, upscale
+
+
+def unit_vectors(n, dim=8, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_recall_at_k_ignores_padding_and_empty_results():
+    exact = np.array([[0, 1, 2], [3, 4, -1], [-1, -1, -1]])
+    found = np.array([[2, 0, 9], [4, -1, -1], [5, 6, 7]])
+    # 2/3 puis 1/2 ; la troisième requête n'a aucun voisin exact (filtre vide)
+    assert recall_at_k(found, exact) == pytest.approx((2 / 3 + 1 / 2) / 2, abs=1e-4)
+    assert recall_at_k(found[2:], exact[2:]) is None
+
+
+def test_percentiles_are_in_milliseconds():
+    latencies = [0.001 * i for i in range(1, 101)]
+    result = percentiles_ms(latencies)
+    assert set(result) == {"p50", "p95", "p99"}
+    assert result["p50"] == pytest.approx(50.5) and result["p99"] == pytest.approx(99.01)
+
+
+def test_upscale_keeps_originals_and_tiles_masks():
+    vectors = unit_vectors(5)
+    masks = {"sans filtre": None, "filtre": np.array([True, False, True, True, False])}
+    big, big_masks = upscale(vectors, masks, 3)
+
+    assert big.shape == (15, 8) and big.dtype == np.float32 and big.flags.c_contiguous
+    np.testing.assert_allclose(big[:5], vectors, rtol=1e-6)
+    np.testing.assert_allclose(np.linalg.norm(big, axis=1), 1.0, rtol=1e-5)
+    # Les copies bruitées restent proches de leur original
+    assert np.all(np.sum(big[5:10] * vectors, axis=1) > 0.8)
+    assert big_masks["sans filtre"] is None
+    assert big_masks["filtre"].tolist() == masks["filtre"].tolist() * 3
+
+
+def test_upscale_by_one_is_a_no_op():
+    vectors = unit_vectors(4)
+    masks = {"sans filtre": None}
+    assert upscale(vectors, masks, 1) == (vectors, masks)
+
+
+def test_exact_search_has_full_recall():
+    vectors = unit_vectors(200)
+    queries = unit_vectors(10, seed=1)
+    config = IndexConfig("flat")
+    exact = make_search(build_index(vectors, config), config, vectors, 5)(queries, None)
+
+    result, indices = benchmark_index(make_search(build_index(vectors, config), config, vectors, 5), queries,
+                                      None, exact)
+    assert result["recall_at_k"] == 1.0
+    assert indices.shape == (10, 5)
+    assert set(result["latency_ms"]) == {"p50", "p95", "p99"}
@@ -0,0 +1,114 @@
+"""Construction hors service de l'index (build_index.py) : ajout par morceaux et mise à jour incrémentale"""
+import json
+import os
+
+import numpy as np
+import pytest
+
+import build_index
+import product_retriever
+from ann_backends import IndexConfig
+from conftest import SAMPLE_CATALOG, HashEmbeddings, write_catalog
+from index_cache import MANIFEST_FILE, cache_entry_path, catalog_fingerprint
+
+
+class FakeEncoder:
+    """Remplace ParallelEncoder : vecteurs HashEmbeddings, nombre de textes encodés"""
+
+    texts = []
+
+    def __init__(self, model_name, batch_size=build_index.DEFAULT_BATCH_SIZE, workers=1):
+        self.n_documents = 0
+        self.docs_per_second = 0.0
+
+    def encode(self, texts):
+        FakeEncoder.texts.extend(texts)
+        self.n_documents += len(texts)
+        return np.asarray(HashEmbeddings().embed_documents(texts), dtype="float32")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+@pytest.fixture
+def offline(tmp_path, monkeypatch):
+    monkeypatch.setattr(build_index, "ParallelEncoder", FakeEncoder)
+    monkeypatch.setattr(build_index, "LazyEmbeddings", HashEmbeddings)
+    monkeypatch.setattr(product_retriever, "LazyEmbeddings", HashEmbeddings)
+    FakeEncoder.texts = []
+    cache_dir = str(tmp_path / "cache")
+
+    def build(rows, index_config=IndexConfig(), chunk_size=4):
+        csv_path = write_catalog(tmp_path / "catalog.csv", rows)
+        fingerprint = catalog_fingerprint(csv_path, product_retriever.EMBEDDING_MODEL_NAME, index_config.build_key())
+        build_index.build_offline(csv_path, product_retriever.EMBEDDING_MODEL_NAME, cache_dir, index_config,
+                                  fingerprint, chunk_size=chunk_size)
+        with open(os.path.join(cache_entry_path(cache_dir, fingerprint), MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+        retriever = product_retriever.ProductRetriever(csv_path, cache_dir=cache_dir, index_config=index_config)
+        return manifest, retriever
+    return build
+
+
+def random_vectors(n, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, 16)).astype("float32")
+
+
+def test_streamed_flat_index_matches_one_shot_build(tmp_path):
+    vectors = random_vectors(50)
+    stream = build_index.StreamingIndex(IndexConfig(), str(tmp_path))
+    for start in range(0, len(vectors), 7):
+        stream.add(vectors[start:start + 7])
+        # Index plat : chaque morceau est dans l'index dès son ajout
+        assert stream.index.ntotal == min(start + 7, len(vectors))
+    spilled, index = stream.finish()
+
+    np.testing.assert_array_equal(spilled, vectors)
+    expected = build_index.new_index(16, len(vectors))
+    expected.add(vectors)
+    np.testing.assert_array_equal(index.search(vectors[:5], 4)[1], expected.search(vectors[:5], 4)[1])
+
+
+def test_trained_index_waits_for_the_training_sample(tmp_path):
+    vectors = random_vectors(200)
+    stream = build_index.StreamingIndex(IndexConfig("ivf_flat", nlist=2), str(tmp_path), training_sample=100)
+    stream.add(vectors[:60])
+    assert stream.index is None
+    stream.add(vectors[60:120])
+    assert stream.index.is_trained and stream.index.ntotal == 120
+    stream.add(vectors[120:])
+    spilled, index = stream.finish()
+    assert index.ntotal == 200
+    np.testing.assert_array_equal(spilled, vectors)
+
+
+def test_offline_build_matches_the_in_process_build(offline, make_retriever, tmp_path):
+    manifest, retriever = offline(SAMPLE_CATALOG)
+    assert manifest["n_products"] == len(SAMPLE_CATALOG)
+    assert "update" not in manifest
+    assert len(FakeEncoder.texts) == len(SAMPLE_CATALOG)
+
+    in_process = make_retriever(cache_dir=str(tmp_path / "other-cache"))
+    for query in ("vitamin c serum", "gentle cleanser glycerin", "night cream retinol"):
+        assert [doc.metadata["name"] for doc in retriever.get_relevant_products(query, k=3)] == \
+            [doc.metadata["name"] for doc in in_process.get_relevant_products(query, k=3)]
+
+
+@pytest.mark.parametrize("index_config", [IndexConfig(), IndexConfig("ivf_flat", nlist=2),
+                                          IndexConfig("flat", quantization="int8")], ids=repr)
+def test_incremental_build_encodes_only_the_delta_of_each_chunk(offline, index_config):
+    offline(SAMPLE_CATALOG, index_config)
+    rows = [row for row in SAMPLE_CATALOG if row[0] != "Glow Clay Mask"]
+    rows[2] = ("Glow Vitamin C Serum", "Serum", "aqua, ascorbic acid, ferulic acid", "£15.00")
+    rows.append(("Glow Lip Balm", "Balm", "beeswax", "£3.00"))
+    FakeEncoder.texts = []
+
+    manifest, retriever = offline(rows, index_config)
+    assert {key: manifest["update"][key] for key in ("added", "changed", "removed", "unchanged")} == \
+        {"added": 1, "changed": 1, "removed": 1, "unchanged": len(rows) - 2}
+    assert [text.split(". ")[1] for text in FakeEncoder.texts] == ["Nom: Glow Vitamin C Serum", "Nom: Glow Lip Balm"]
+    names = {doc.metadata["name"] for doc in retriever.get_relevant_products("balm", k=len(rows))}
+    assert "Glow Lip Balm" in names and "Glow Clay Mask" not in names
@@ -0,0 +1,84 @@
+"""Catalogue en colonnes (catalog.py) et index inversé des ingrédients (ingredient_index.py)"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from catalog import Catalog
+from conftest import SAMPLE_CATALOG, write_catalog
+from ingredient_index import IngredientIndex, split_ingredients, tokenize_ingredients
+from pricing import CURRENCY_TO_EUR
+
+INGREDIENTS = [
+    "Aqua, Glycerin, Sodium Laureth Sulfate.",
+    "aqua;  shea   butter , glycerin, aqua",
+    "",
+    float("nan"),
+    ["parfum", "aqua"],
+]
+
+
+@pytest.mark.parametrize("ingredient_lists", [INGREDIENTS, INGREDIENTS[:4]], ids=["listes", "textes"])
+def test_vectorized_tokenizer_matches_split_ingredients(ingredient_lists):
+    products, tokens = tokenize_ingredients(ingredient_lists)
+    for position, ingredients in enumerate(ingredient_lists):
+        expected = ingredients if isinstance(ingredients, list) else split_ingredients(ingredients)
+        assert sorted(tokens[products == position]) == sorted(set(expected))
+
+
+def test_split_ingredients_normalizes_case_spaces_and_final_dot():
+    assert split_ingredients("Aqua,  Shea   Butter ; Glycerin.") == ["aqua", "shea butter", "glycerin"]
+
+
+def test_ingredient_index_postings_and_product_ingredients():
+    index = IngredientIndex([text for text in INGREDIENTS if isinstance(text, str)])
+    assert index.n_products == 3
+    assert index.vocabulary == sorted(index.vocabulary)
+    assert index._postings["aqua"].tolist() == [0, 1]
+    assert [index.vocabulary[i] for i in index.ingredient_ids(1)] == ["aqua", "glycerin", "shea butter"]
+    assert len(index.ingredient_ids(2)) == 0
+    assert index.matching_tokens("Sulfate") == ["sodium laureth sulfate"]
+
+
+def test_excluded_mask_matches_substrings_and_is_cached():
+    index = IngredientIndex([row[2] for row in SAMPLE_CATALOG])
+    mask = index.excluded_mask(["Sulfate", "retinol"])
+    names = [row[0] for row, excluded in zip(SAMPLE_CATALOG, mask) if excluded]
+    assert names == ["Glow Foam Cleanser", "Glow Night Cream"]
+    assert index.excluded_mask(["retinol", "sulfate"]) is mask
+    assert index.allowed_mask([]).all()
+
+
+def test_catalog_columns(tmp_path):
+    catalog = Catalog.from_csv(write_catalog(tmp_path / "catalog.csv", SAMPLE_CATALOG))
+    assert len(catalog) == len(SAMPLE_CATALOG)
+    assert catalog.names[2] == "Glow Vitamin C Serum"
+    assert catalog.ingredients[1] == "aqua, sodium laureth sulfate"
+    assert catalog.prices_eur[0] == np.float32(8.0 * CURRENCY_TO_EUR["£"])
+    assert catalog.page_content[0] == ("Type: Cleanser. Nom: Glow Gentle Cleanser. Prix: £8.00. "
+                                       "Ingrédients: aqua, glycerin.")
+    # Catégories internées : une seule chaîne par valeur distincte
+    assert catalog.types[0] is catalog.types[1]
+
+    document = catalog.document(3)
+    assert document.page_content == catalog.page_content[3]
+    assert document.metadata["name"] == "Glow Niacinamide Serum" and document.metadata["type"] == "Serum"
+
+
+def test_missing_values_are_read_like_str(tmp_path):
+    path = tmp_path / "catalog.csv"
+    pd.DataFrame({"product_name": ["A"], "product_type": ["Serum"], "ingredients": [None],
+                  "price": [None]}).to_csv(path, index=False)
+    catalog = Catalog.from_csv(path)
+    assert catalog.ingredients[0] == "nan" and catalog.urls[0] == ""
+    assert np.isnan(catalog.prices_eur[0])
+
+
+def test_chunks_concatenate_to_the_whole_catalog(tmp_path):
+    path = write_catalog(tmp_path / "catalog.csv", SAMPLE_CATALOG)
+    whole = Catalog.from_csv(path)
+    parts = list(Catalog.iter_csv(path, 4))
+    assert [len(part) for part in parts] == [4, 4, 3]
+    joined = Catalog.concat(parts)
+    for name, values in whole.columns().items():
+        assert joined.columns()[name].tolist() == values.tolist()
+    np.testing.assert_array_equal(joined.prices_eur, whole.prices_eur)
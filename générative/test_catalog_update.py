@@ -0,0 +1,91 @@
+"""Mise à jour incrémentale de l'index après une modification du catalogue (catalog_update.py)"""
+import numpy as np
+import pytest
+
+import product_retriever
+from ann_backends import IndexConfig
+from catalog_update import CatalogDiff, PreviousKeys, find_previous_entry
+from conftest import SAMPLE_CATALOG, HashEmbeddings, write_catalog
+from index_cache import read_manifest
+
+
+class CountingEmbeddings(HashEmbeddings):
+    """HashEmbeddings qui note tous les textes encodés (tous les moteurs du test)"""
+
+    texts = []
+
+    def embed_documents(self, texts):
+        CountingEmbeddings.texts.extend(texts)
+        return super().embed_documents(texts)
+
+
+def test_diff_classifies_products_by_key_and_text():
+    diff = CatalogDiff(["a", "b", "c", "d"], ["A", "B", "C", "D"],
+                       ["b", "e", "a", "c"], ["B", "E", "A2", "C"])
+    assert diff.summary() == {"added": 1, "changed": 1, "removed": 1, "unchanged": 2}
+    assert diff.reuse.tolist() == [1, -1, -1, 2]
+    assert diff.previous.tolist() == [1, -1, 0, 2]
+    assert diff.to_embed.tolist() == [1, 2]
+
+
+def test_duplicate_old_keys_reuse_the_first_occurrence():
+    diff = CatalogDiff(["a", "a", "b"], ["A", "A bis", "B"], ["a", "b"], ["A", "B"])
+    assert diff.reuse.tolist() == [0, 2]
+    assert diff.removed == 0
+
+
+def test_chunked_diffs_add_up_to_the_whole_catalog():
+    old_keys = [f"p{i}" for i in range(10)]
+    old_contents = [f"texte {i}" for i in range(10)]
+    new_keys = [f"p{i}" for i in range(3, 14)]
+    new_contents = [f"texte {i}" if i % 4 else f"nouveau {i}" for i in range(3, 14)]
+    whole = CatalogDiff(old_keys, old_contents, new_keys, new_contents)
+
+    previous = PreviousKeys(old_keys, old_contents)
+    chunks = [CatalogDiff.against(previous, new_keys[i:i + 4], new_contents[i:i + 4]) for i in range(0, 11, 4)]
+    assert np.concatenate([chunk.reuse for chunk in chunks]).tolist() == whole.reuse.tolist()
+    for name in ("added", "changed", "unchanged"):
+        assert sum(getattr(chunk, name) for chunk in chunks) == getattr(whole, name)
+
+
+@pytest.fixture
+def counting_retriever(tmp_path, monkeypatch):
+    monkeypatch.setattr(product_retriever, "LazyEmbeddings", CountingEmbeddings)
+    CountingEmbeddings.texts = []
+    csv_path = tmp_path / "catalog.csv"
+
+    def make(rows, **kwargs):
+        write_catalog(csv_path, rows)
+        return product_retriever.ProductRetriever(str(csv_path), cache_dir=str(tmp_path / "cache"), **kwargs)
+    return make
+
+
+@pytest.mark.parametrize("index_config", [IndexConfig(), IndexConfig("ivf_flat", nlist=2),
+                                          IndexConfig("flat", quantization="int8"), IndexConfig("hnsw")], ids=repr)
+def test_changed_catalog_encodes_only_the_delta(counting_retriever, index_config):
+    first = counting_retriever(SAMPLE_CATALOG, index_config=index_config)
+    rows = SAMPLE_CATALOG[1:] + [("Glow Lip Balm", "Balm", "beeswax", "£3.00")]
+    rows[0] = ("Glow Foam Cleanser", "Cleanser", "aqua, coco glucoside", "£4.00")
+    assert not first.catalog_changed()
+    write_catalog(first.csv_path, rows)
+    assert first.catalog_changed()
+
+    CountingEmbeddings.texts = []
+    second = counting_retriever(rows, index_config=index_config)
+    assert [text.split(". ")[1] for text in CountingEmbeddings.texts] == ["Nom: Glow Foam Cleanser",
+                                                                         "Nom: Glow Lip Balm"]
+    update = read_manifest(second.cache_entry)["update"]
+    assert (update["added"], update["changed"], update["removed"]) == (1, 1, 1)
+    assert update["parent"] == first.fingerprint
+    assert second.vector_store.index.ntotal == len(rows)
+    names = {doc.metadata["name"] for doc in second.get_relevant_products("balm", k=len(rows))}
+    assert "Glow Lip Balm" in names and "Glow Gentle Cleanser" not in names
+
+
+def test_previous_entry_must_share_model_and_index_type(counting_retriever):
+    first = counting_retriever(SAMPLE_CATALOG)
+    cache_dir = first.cache_dir
+    assert find_previous_entry(cache_dir, first.model_name, IndexConfig()) == first.fingerprint
+    assert find_previous_entry(cache_dir, first.model_name, IndexConfig(), exclude=first.fingerprint) is None
+    assert find_previous_entry(cache_dir, "autre-modele", IndexConfig()) is None
+    assert find_previous_entry(cache_dir, first.model_name, IndexConfig("hnsw")) is None
@@ -0,0 +1,30 @@
+"""Instances partagées de GlowAI (get_glow_ai) et moteur RAG indisponible"""
+import glow
+
+
+def test_failed_rag_build_is_not_retried_per_engine(monkeypatch):
+    builds = []
+
+    def failing_build():
+        builds.append(1)
+        return None
+
+    monkeypatch.setenv("MISTRAL_API_KEY", "test")
+    monkeypatch.setattr(glow, "_build_retriever", failing_build)
+    monkeypatch.setattr(glow, "RESPONSE_CACHE_ENABLED", False)
+    glow.reset()
+    try:
+        first = glow.get_glow_ai("model-a")
+        second = glow.get_glow_ai("model-b")
+        assert first.retriever is None and second.retriever is None
+        assert len(builds) == 1
+    finally:
+        glow.reset()
+
+
+def test_no_retriever_sentinel_skips_the_build(monkeypatch):
+    monkeypatch.setenv("MISTRAL_API_KEY", "test")
+    monkeypatch.setattr(glow, "_build_retriever", lambda: (_ for _ in ()).throw(AssertionError("build")))
+    monkeypatch.setattr(glow, "RESPONSE_CACHE_ENABLED", False)
+    engine = glow.GlowAI("model-a", retriever=glow.NO_RETRIEVER)
+    assert engine.retriever is None
@@ -0,0 +1,62 @@
+"""
+Budget de temps d'import du module glow (celui qu'importe views.py au démarrage de l'app).
+
+Mesuré avec `python -X importtime` dans un processus neuf : importer glow ne doit
+charger ni LangChain / Mistral, ni FAISS, ni le modèle d'embedding, ni pandas, et
+ne doit pas exiger MISTRAL_API_KEY (vérifiée à la construction du moteur).
+
+Usage :
+    python test_import_time.py          (affiche les imports les plus lents)
+    python -m pytest test_import_time.py
+Budget : GLOW_IMPORT_BUDGET_MS (1000 ms par défaut).
+"""
+import os
+import subprocess
+import sys
+
+IMPORT_BUDGET_MS = float(os.getenv("GLOW_IMPORT_BUDGET_MS", "1000"))
+
+# Paquets lourds qui ne doivent être importés qu'à la première génération
+HEAVY_MODULES = ("langchain_mistralai", "langchain_community", "langchain_core", "faiss",
+                 "sentence_transformers", "transformers", "torch", "pandas")
+
+
+def measure_import(module="glow"):
+    """{module importé: temps cumulé (ms)} pour `import module` dans un processus neuf"""
+    env = dict(os.environ, MISTRAL_API_KEY="")  # Une variable vide n'est pas remplacée par le .env
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                            capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise AssertionError(f"import {module} a échoué :\n{result.stderr[-2000:]}")
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        # "import time:      self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = int(cumulative) / 1000
+    return timings
+
+
+def heavy_imports(timings):
+    return sorted(name for name in timings if name.split(".")[0] in HEAVY_MODULES)
+
+
+def test_glow_import_is_light():
+    timings = measure_import("glow")
+    assert not heavy_imports(timings), f"Modules lourds importés par glow : {heavy_imports(timings)}"
+    assert timings["glow"] <= IMPORT_BUDGET_MS, (
+        f"import glow : {timings['glow']:.0f} ms (budget {IMPORT_BUDGET_MS:.0f} ms)")
+
+
+if __name__ == "__main__":
+    timings = measure_import("glow")
+    print(f"import glow : {timings['glow']:.0f} ms (budget {IMPORT_BUDGET_MS:.0f} ms)")
+    top_level = {name: ms for name, ms in timings.items() if "." not in name}
+    for name, ms in sorted(top_level.items(), key=lambda item: -item[1])[:10]:
+        print(f"   {ms:8.1f} ms  {name}")
+    heavy = heavy_imports(timings)
+    print(f"Modules lourds : {', '.join(heavy) if heavy else 'aucun'}")
+    sys.exit(1 if heavy or timings["glow"] > IMPORT_BUDGET_MS else 0)
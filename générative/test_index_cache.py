@@ -0,0 +1,112 @@
+"""Cache disque de l'index (index_cache) : publication par versions et verrou de construction"""
+import os
+import threading
+import time
+
+import pytest
+
+import index_cache
+import product_retriever
+from conftest import write_catalog
+from index_cache import (VERSIONS_DIR, cache_entry_path, cache_lock, clear_cache, read_manifest,
+                         remove_cache_entry, resolve_entry_path)
+
+FINGERPRINT = "f" * 64
+
+
+@pytest.fixture
+def retriever(make_retriever):
+    return make_retriever(shared=False)
+
+
+def publish(retriever, cache_dir):
+    return index_cache.save_vector_store(cache_dir, FINGERPRINT, retriever.vector_store, retriever.csv_path,
+                                         retriever.model_name, retriever.index_config)
+
+
+def versions(cache_dir):
+    return sorted(os.listdir(os.path.join(cache_dir, VERSIONS_DIR)))
+
+
+def test_entry_is_a_link_to_its_published_version(retriever, tmp_path):
+    cache_dir = str(tmp_path / "published")
+    entry_path = publish(retriever, cache_dir)
+    assert os.path.islink(entry_path)
+    assert read_manifest(entry_path)["fingerprint"] == FINGERPRINT
+    assert os.path.dirname(resolve_entry_path(cache_dir, FINGERPRINT)).endswith(VERSIONS_DIR)
+
+
+def test_republishing_keeps_the_version_being_read(retriever, tmp_path):
+    cache_dir = str(tmp_path / "published")
+    publish(retriever, cache_dir)
+    reading = resolve_entry_path(cache_dir, FINGERPRINT)
+
+    publish(retriever, cache_dir)
+    assert resolve_entry_path(cache_dir, FINGERPRINT) != reading
+    # Un processus qui lit encore la version précédente la trouve intacte
+    assert read_manifest(reading)["fingerprint"] == FINGERPRINT
+    assert len(versions(cache_dir)) == 2
+
+    time.sleep(0.01)  # Les versions sont classées par date de modification
+    publish(retriever, cache_dir)
+    assert len(versions(cache_dir)) == index_cache.KEEP_VERSIONS
+    assert not os.path.exists(reading)
+
+
+def test_entry_written_before_versions_is_migrated(retriever, tmp_path):
+    cache_dir = str(tmp_path / "published")
+    legacy = cache_entry_path(cache_dir, FINGERPRINT)
+    os.makedirs(legacy)
+    open(os.path.join(legacy, "index.faiss"), "w").close()
+
+    publish(retriever, cache_dir)
+    assert os.path.islink(legacy) and read_manifest(legacy)["fingerprint"] == FINGERPRINT
+    assert len(versions(cache_dir)) == 2
+
+
+def test_remove_and_clear_only_drop_unreferenced_versions(retriever, tmp_path):
+    cache_dir = str(tmp_path / "published")
+    publish(retriever, cache_dir)
+    other = "e" * 64
+    index_cache.save_vector_store(cache_dir, other, retriever.vector_store, retriever.csv_path,
+                                  retriever.model_name, retriever.index_config)
+
+    assert clear_cache(cache_dir, keep=FINGERPRINT) == 1
+    assert read_manifest(cache_entry_path(cache_dir, FINGERPRINT))["fingerprint"] == FINGERPRINT
+    assert versions(cache_dir) == [os.path.basename(resolve_entry_path(cache_dir, FINGERPRINT))]
+
+    assert remove_cache_entry(cache_dir, FINGERPRINT)
+    assert read_manifest(cache_entry_path(cache_dir, FINGERPRINT)) is None
+
+
+def test_cache_lock_is_exclusive(tmp_path):
+    events = []
+    entered = threading.Event()
+
+    def hold():
+        with cache_lock(str(tmp_path), FINGERPRINT):
+            events.append("first in")
+            entered.set()
+            time.sleep(0.2)
+            events.append("first out")
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    entered.wait()
+    with cache_lock(str(tmp_path), FINGERPRINT):
+        events.append("second in")
+    thread.join()
+    assert events == ["first in", "first out", "second in"]
+
+
+def test_concurrent_retrievers_build_the_index_once(make_retriever, tmp_path):
+    csv_path = write_catalog(tmp_path / "concurrent.csv", [("Glow Gel", "Cleanser", "aqua", "£5.00")])
+    cache_dir = str(tmp_path / "concurrent")
+    # make_retriever remplace déjà le modèle d'embedding
+    threads = [threading.Thread(target=product_retriever.ProductRetriever, args=(csv_path,),
+                                kwargs={"cache_dir": cache_dir}) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(versions(cache_dir)) == 1
@@ -0,0 +1,71 @@
+"""Index lexical BM25 et fusion des classements (lexical_index.py)"""
+import math
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from conftest import SAMPLE_CATALOG
+from lexical_index import BM25_B, BM25_K1, BM25Index, reciprocal_rank_fusion, tokenize
+
+TEXTS = [f"{name} {product_type} {ingredients}" for name, product_type, ingredients, _ in SAMPLE_CATALOG]
+
+
+def reference_bm25(texts, query, k1=BM25_K1, b=BM25_B):
+    """BM25 calculé terme à terme, en Python pur"""
+    documents = [Counter(tokenize(text)) for text in texts]
+    average_length = sum(sum(doc.values()) for doc in documents) / len(documents)
+    scores = []
+    for doc in documents:
+        length, score = sum(doc.values()), 0.0
+        for term in set(tokenize(query)):
+            df = sum(term in other for other in documents)
+            if not doc[term]:
+                continue
+            idf = math.log1p((len(documents) - df + 0.5) / (df + 0.5))
+            score += idf * doc[term] * (k1 + 1) / (doc[term] + k1 * (1 - b + b * length / average_length))
+        scores.append(score)
+    return np.array(scores, dtype="float32")
+
+
+def test_tokenize_folds_case_and_accents():
+    assert tokenize("Crème Hydratante, SPF 30 - Niacinamide à 5%") == \
+        ["creme", "hydratante", "spf", "30", "niacinamide"]
+
+
+@pytest.mark.parametrize("query", ["niacinamide serum", "glow cleanser glycerin", "Shea Butter", "inconnu"])
+def test_scores_match_the_reference_bm25(query):
+    np.testing.assert_allclose(BM25Index(TEXTS).scores(query), reference_bm25(TEXTS, query), rtol=1e-5, atol=1e-6)
+
+
+def test_search_ranks_exact_matches_first_and_respects_the_mask():
+    index = BM25Index(TEXTS)
+    assert index.search("niacinamide", 3).tolist() == [3]
+    cleansers = index.search("cleanser", 5)
+    assert set(cleansers[:2].tolist()) == {0, 1}
+    allowed = np.ones(len(TEXTS), dtype=bool)
+    allowed[0] = False
+    assert 0 not in index.search("cleanser", 5, allowed).tolist()
+    assert len(index.search("inconnu", 5)) == 0
+
+
+def test_empty_index():
+    index = BM25Index([])
+    assert index.vocabulary_size == 0 and len(index.search("serum", 3)) == 0
+
+
+def test_reciprocal_rank_fusion():
+    positions, scores = reciprocal_rank_fusion([np.array([1, 2, 3]), np.array([3, 1, -1])], 3, rrf_k=60)
+    assert positions == [1, 3, 2]
+    assert scores[0] == pytest.approx(1 / 61 + 1 / 62)
+    assert scores[1] == pytest.approx(1 / 63 + 1 / 61)
+    assert scores[2] == pytest.approx(1 / 62)
+
+
+def test_hybrid_search_finds_exact_ingredient_matches(make_retriever):
+    retriever = make_retriever()
+    results = retriever.get_relevant_products("niacinamide", k=2, search_mode="hybrid", with_scores=True)
+    assert results[0][0].metadata["name"] == "Glow Niacinamide Serum"
+    assert results[0][1] >= results[1][1]
+    with pytest.raises(ValueError):
+        retriever.get_relevant_products("niacinamide", search_mode="bm25")
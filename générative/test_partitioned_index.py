@@ -0,0 +1,82 @@
+"""Sous-index par catégorie (partitioned_index) et recherche FAISS masquée"""
+import faiss
+import numpy as np
+import pytest
+
+from ann_backends import IndexConfig, build_index
+from partitioned_index import PartitionedIndex, masked_search, partition_config
+
+TYPES = np.array(["Cleanser", "Serum", "Mask"] * 40)
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(0)
+    data = rng.standard_normal((len(TYPES), 16)).astype("float32")
+    return data / np.linalg.norm(data, axis=1, keepdims=True)
+
+
+def brute_force(vectors, queries, k, allowed):
+    distances = ((queries[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2)
+    distances[:, ~allowed] = np.inf
+    return np.argsort(distances, axis=1, kind="stable")[:, :k]
+
+
+def test_masked_search_only_returns_allowed_vectors(vectors):
+    allowed = np.arange(len(vectors)) % 4 == 0
+    _, indices = masked_search(build_index(vectors), vectors[:5], 6, allowed)
+    assert np.array_equal(indices, brute_force(vectors, vectors[:5], 6, allowed))
+
+
+def test_masked_search_with_nothing_allowed_returns_no_result(vectors):
+    distances, indices = masked_search(build_index(vectors), vectors[:3], 4, np.zeros(len(vectors), dtype=bool))
+    assert (indices == -1).all() and distances.shape == (3, 4)
+
+
+def test_partition_search_matches_a_masked_global_search(vectors):
+    partitions = PartitionedIndex(vectors, TYPES)
+    allowed = np.arange(len(vectors)) % 5 != 0
+    _, indices = partitions.search(vectors[:4], 7, ("Serum", "Mask"), allowed)
+    expected = brute_force(vectors, vectors[:4], 7, allowed & np.isin(TYPES, ["Serum", "Mask"]))
+    assert np.array_equal(indices, expected)
+
+
+def test_partition_search_pads_missing_results(vectors):
+    partitions = PartitionedIndex(vectors, TYPES)
+    _, indices = partitions.search(vectors[:2], 50, ("Mask", "Unknown"))
+    assert indices.shape == (2, 50)
+    assert (indices[:, :40] != -1).all() and (indices[:, 40:] == -1).all()
+    assert set(TYPES[indices[0, :40]]) == {"Mask"}
+
+
+def test_small_partitions_skip_ivf(vectors):
+    config = IndexConfig("ivf_flat", nlist=4)
+    assert partition_config(config, 4 * 39).backend == "ivf_flat"
+    assert partition_config(config, 4 * 39 - 1).backend == "flat"
+    assert partition_config(IndexConfig("hnsw"), 10).backend == "hnsw"
+
+    partitions = PartitionedIndex(vectors, TYPES, config)
+    assert all(isinstance(index, faiss.IndexFlat) for index, _ in partitions._partitions.values())
+
+
+def test_saved_partitions_are_reloaded_memory_mapped(vectors, tmp_path):
+    partitions = PartitionedIndex(vectors, TYPES)
+    partitions.save(str(tmp_path))
+    loaded = PartitionedIndex.load(str(tmp_path))
+
+    assert loaded.sizes() == partitions.sizes()
+    assert all(isinstance(positions, np.memmap) for _, positions in loaded._partitions.values())
+    for types in (("Serum",), ("Cleanser", "Mask")):
+        assert np.array_equal(loaded.search(vectors[:3], 5, types)[1], partitions.search(vectors[:3], 5, types)[1])
+
+
+def test_retriever_opened_from_the_shared_store_keeps_its_partitions(make_retriever):
+    built = make_retriever()
+    shared = make_retriever()
+    assert shared.shared_loaded and shared.partitions is not None
+    assert shared.partitions.sizes() == built.partitions.sizes()
+
+    query = "crème hydratante peau sèche"
+    expected = built.get_relevant_products(query, k=3, product_types=("Moisturiser",))
+    found = shared.get_relevant_products(query, k=3, product_types=("Moisturiser",))
+    assert [doc.metadata["name"] for doc in found] == [doc.metadata["name"] for doc in expected]
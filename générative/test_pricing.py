@@ -0,0 +1,52 @@
+"""Conversion des prix du catalogue et lecture du budget du profil (pricing.py)"""
+import math
+
+import numpy as np
+import pytest
+
+from pricing import CURRENCY_TO_EUR, budget_price_range, parse_price, parse_prices, price_mask
+
+GBP = CURRENCY_TO_EUR["£"]
+
+
+def test_catalog_prices_in_pounds_are_converted_to_euros():
+    prices = parse_prices(["£5.20", "£12.00", "£0.99"])
+    assert prices.dtype == np.float32
+    np.testing.assert_allclose(prices, np.array([5.20, 12.00, 0.99]) * GBP, rtol=1e-6)
+
+
+@pytest.mark.parametrize("price, expected", [
+    ("£5,20", 5.20 * GBP),
+    ("5.20", 5.20 * GBP),          # Sans symbole : devise du catalogue (livres)
+    ("€7.50", 7.50),
+    ("$10", 10 * CURRENCY_TO_EUR["$"]),
+    ("£8.00 - £12.00", 8.00 * GBP),  # Fourchette : le premier montant
+])
+def test_price_formats(price, expected):
+    assert parse_price(price) == pytest.approx(expected, rel=1e-6)
+
+
+@pytest.mark.parametrize("price", ["", "N/A", None, float("nan")])
+def test_unreadable_price_is_nan(price):
+    assert math.isnan(parse_price(price))
+
+
+@pytest.mark.parametrize("budget, n_products, expected", [
+    ("Moyen (20-40€ par produit)", 5, (20.0, 40.0)),
+    ("Moyen (20,5 - 40€ par produit)", 5, (20.5, 40.0)),
+    ("Entre 50-100€ au total", 5, (None, 20.0)),
+    ("50€ (Budget Faible)", 5, (None, 10.0)),
+    ("15€ par produit", 5, (None, 15.0)),
+    ("Pas de limite", 5, (None, None)),
+    (None, 5, (None, None)),
+    ("30€", 0, (None, 30.0)),
+])
+def test_budget_price_range(budget, n_products, expected):
+    assert budget_price_range(budget, n_products) == expected
+
+
+def test_price_mask_excludes_unknown_prices():
+    prices = parse_prices(["£5.00", "£20.00", "N/A"])
+    assert price_mask(prices) is None
+    assert price_mask(prices, max_price=10).tolist() == [True, False, False]
+    assert price_mask(prices, min_price=10).tolist() == [False, True, False]
@@ -0,0 +1,63 @@
+"""Buckets de profils (profile_buckets) : clés, profils représentatifs et stock pré-calculé"""
+import pytest
+
+from profile_buckets import (BUDGET_BANDS, PrecomputedRoutineStore, bucket_profile, budget_band, iter_bucket_keys,
+                             profile_bucket_key)
+from routine_assembler import product_price_range
+
+PROFILE = {"skin_type": "Dry", "hydration_level": "Low", "sensitivity": "Medium", "goals": "Éclat",
+           "avoid_ingredients": []}
+
+
+@pytest.mark.parametrize("budget, band", [
+    ("20€ (Budget Faible)", 20),
+    ("40€ (Budget Faible)", 20),
+    ("45€", 45),
+    ("95€", 70),
+    ("500€", 250),
+])
+def test_budget_band_of_front_budgets(budget, band):
+    assert budget_band(budget) == band
+
+
+@pytest.mark.parametrize("budget", ["", "Moyen", "Moyen (20-40€ par produit)", "10€", "80€ (Budget Faible)"])
+def test_budgets_without_a_band_are_not_bucketed(budget):
+    assert budget_band(budget) is None
+    assert profile_bucket_key(dict(PROFILE, budget=budget)) is None
+
+
+def test_bucket_key_keeps_the_budget_band():
+    assert profile_bucket_key(dict(PROFILE, budget="60€")) != profile_bucket_key(dict(PROFILE, budget="200€"))
+    assert profile_bucket_key(dict(PROFILE, budget="50€")) == profile_bucket_key(dict(PROFILE, budget="65€"))
+
+
+@pytest.mark.parametrize("budget", ["25€ (Budget Faible)", "50€", "130€", "480€"])
+def test_bucket_profile_budget_fits_every_profile_of_the_bucket(budget):
+    representative = bucket_profile(profile_bucket_key(dict(PROFILE, budget=budget)))
+    assert profile_bucket_key(representative) == profile_bucket_key(dict(PROFILE, budget=budget))
+    # Le pré-calcul filtre les produits avec la borne basse : jamais plus cher que pour le profil réel
+    assert product_price_range(representative["budget"])[1] <= product_price_range(budget)[1]
+
+
+def test_atypical_profiles_are_not_bucketed():
+    assert profile_bucket_key(dict(PROFILE, budget="50€", avoid_ingredients=["parfum"])) is None
+    assert profile_bucket_key(dict(PROFILE, budget="50€", goals="Éclat, Anti-âge")) is None
+    assert profile_bucket_key(dict(PROFILE, budget="50€", skin_type="Sensible")) is None
+
+
+def test_every_bucket_key_round_trips():
+    keys = list(iter_bucket_keys())
+    assert len(keys) == len(set(keys)) == 4 * 3 * 3 * len(BUDGET_BANDS) * 7
+    assert all(profile_bucket_key(bucket_profile(key)) == key for key in keys)
+
+
+def test_store_ignores_routines_of_an_older_format(tmp_path):
+    path = tmp_path / "routines.json"
+    path.write_text('{"version": 1, "model_name": null, "buckets": {"Dry|Low|Medium|standard|": {}}}',
+                    encoding="utf-8")
+    assert len(PrecomputedRoutineStore(str(path))) == 0
+
+    store = PrecomputedRoutineStore(str(path))
+    store.put("Dry|Low|Medium|45|", {"morning": {}})
+    store.save()
+    assert PrecomputedRoutineStore(str(path)).get("Dry|Low|Medium|45|") == {"morning": {}}
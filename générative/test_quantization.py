@@ -0,0 +1,72 @@
+"""Vecteurs en précision réduite (fp16 / int8) et reclassement en float32 (ann_backends.py)"""
+import numpy as np
+import pytest
+
+from ann_backends import IndexConfig, build_index, index_memory_bytes, rerank_exact
+from benchmark_retriever import add_quantization_deltas, iter_configs
+from index_cache import load_full_vectors
+
+
+def unit_vectors(n, dim=32, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_rerank_exact_orders_candidates_by_float32_distance():
+    full_vectors = np.array([[0.0, 0.0], [3.0, 0.0], [1.0, 0.0], [2.0, 0.0]], dtype="float32")
+    queries = np.array([[0.9, 0.0], [5.0, 0.0]], dtype="float32")
+    candidates = np.array([[1, 3, 2, 0], [-1, 0, -1, -1]])
+
+    distances, indices = rerank_exact(full_vectors, queries, candidates, 3)
+    assert indices.tolist() == [[2, 0, 3], [0, -1, -1]]
+    np.testing.assert_allclose(distances[0], [0.01, 0.81, 1.21], rtol=1e-5)
+    assert distances[1, 0] == pytest.approx(25.0)
+
+
+def test_rerank_exact_reads_a_memmap(tmp_path):
+    vectors = unit_vectors(50)
+    path = tmp_path / "vectors.npy"
+    np.save(path, vectors)
+    mapped = np.load(path, mmap_mode="r")
+    candidates = np.tile(np.arange(50), (3, 1))
+    assert rerank_exact(mapped, vectors[:3], candidates, 1)[1][:, 0].tolist() == [0, 1, 2]
+
+
+@pytest.mark.parametrize("quantization, min_ratio", [("fp16", 1.9), ("int8", 3.5)])
+def test_quantized_flat_index_is_smaller_and_keeps_recall_after_rerank(quantization, min_ratio):
+    vectors = unit_vectors(2000)
+    queries = unit_vectors(20, seed=1)
+    exact = build_index(vectors, IndexConfig("flat")).search(queries, 5)[1]
+
+    config = IndexConfig("flat", quantization=quantization, rerank_factor=4)
+    assert config.compressed and config.build_key() == f"flat-{quantization}"
+    index = build_index(vectors, config)
+    assert index_memory_bytes(build_index(vectors, IndexConfig("flat"))) / index_memory_bytes(index) >= min_ratio
+
+    candidates = index.search(queries, 5 * config.rerank_factor)[1]
+    assert np.array_equal(rerank_exact(vectors, queries, candidates, 5)[1], exact)
+
+
+def test_scalar_quantization_does_not_apply_to_ivf_pq():
+    config = IndexConfig("ivf_pq", quantization="int8")
+    assert config.quantization == "none" and config.compressed
+    assert list(iter_configs(["flat", "ivf_pq"], ["none", "int8"])) == [("flat", "none"), ("flat", "int8"),
+                                                                         ("ivf_pq", "none")]
+
+
+def test_quantization_deltas_compare_with_the_float32_run():
+    reference = {"model": "m", "scale": 1, "backend": "flat", "quantization": "none", "memory_bytes": 4000,
+                 "queries": {"sans filtre": {"recall_at_k": 1.0}}}
+    run = dict(reference, quantization="int8", memory_bytes=1000, queries={"sans filtre": {"recall_at_k": 0.95}})
+    add_quantization_deltas(run, [reference])
+    assert run["vs_float32"] == {"memory_ratio": 4.0, "recall_delta": {"sans filtre": -0.05}}
+
+
+def test_compressed_retriever_keeps_full_vectors_for_reranking(make_retriever, tmp_path):
+    flat = make_retriever(cache_dir=str(tmp_path / "flat-cache"))
+    quantized = make_retriever(index_config=IndexConfig("flat", quantization="int8"))
+    assert quantized.cache_entry and load_full_vectors(quantized.cache_entry) is not None
+    # k = 2 : au-delà, le petit catalogue a des produits à égale distance (vecteurs orthogonaux)
+    for query in ("vitamin c serum", "gentle cleanser", "clay mask"):
+        assert [doc.metadata["name"] for doc in quantized.get_relevant_products(query, k=2)] == \
+            [doc.metadata["name"] for doc in flat.get_relevant_products(query, k=2)]
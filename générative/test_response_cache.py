@@ -0,0 +1,85 @@
+"""Cache des réponses structurées du LLM (response_cache.py) : LRU en mémoire, SQLite, durée de vie"""
+import pytest
+from pydantic import BaseModel
+
+import response_cache
+from response_cache import ResponseCache
+
+
+class Answer(BaseModel):
+    text: str
+
+
+class OtherAnswer(BaseModel):
+    text: str
+    score: float = 0.0
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "time", clock)
+    return clock
+
+
+def test_key_ignores_whitespace_and_depends_on_model_and_schema():
+    key = ResponseCache.make_key("mistral", Answer, "Routine  du\n matin")
+    assert key == ResponseCache.make_key("mistral", Answer, " Routine du matin ")
+    assert key != ResponseCache.make_key("mistral-large", Answer, "Routine du matin")
+    assert key != ResponseCache.make_key("mistral", OtherAnswer, "Routine du matin")
+
+
+def test_memory_lru_evicts_the_least_recently_used(clock):
+    cache = ResponseCache(db_path=None, max_entries=2)
+    for key in ("a", "b"):
+        cache.set(key, Answer, Answer(text=key))
+    assert cache.get("a", Answer).text == "a"  # "a" devient le plus récent
+    cache.set("c", Answer, Answer(text="c"))
+
+    assert cache.get("b", Answer) is None
+    assert cache.get("a", Answer).text == "a" and cache.get("c", Answer).text == "c"
+    assert cache.stats() == {"memory_hits": 3, "disk_hits": 0, "misses": 1, "hit_rate": 0.75,
+                             "memory_entries": 2}
+
+
+def test_entries_expire_after_the_ttl(clock, tmp_path):
+    cache = ResponseCache(db_path=str(tmp_path / "cache.sqlite"), ttl=60)
+    cache.set("a", Answer, Answer(text="a"))
+    clock.now += 59
+    assert cache.get("a", Answer).text == "a"
+    clock.now += 2
+    assert cache.get("a", Answer) is None
+    # L'entrée expirée est aussi supprimée du fichier SQLite
+    assert ResponseCache(db_path=cache.db_path, ttl=None).get("a", Answer) is None
+
+
+def test_sqlite_level_is_shared_between_instances(clock, tmp_path):
+    db_path = str(tmp_path / "cache.sqlite")
+    ResponseCache(db_path=db_path).set("a", Answer, Answer(text="a"))
+
+    other = ResponseCache(db_path=db_path)
+    assert other.get("a", Answer).text == "a"
+    assert other.get("a", Answer).text == "a"  # remonté dans le LRU en mémoire
+    assert (other.stats()["disk_hits"], other.stats()["memory_hits"]) == (1, 1)
+
+    other.clear()
+    assert ResponseCache(db_path=db_path).get("a", Answer) is None
+
+
+def test_disk_entry_keeps_its_creation_time(clock, tmp_path):
+    db_path = str(tmp_path / "cache.sqlite")
+    ResponseCache(db_path=db_path, ttl=60).set("a", Answer, Answer(text="a"))
+    clock.now += 50
+    cache = ResponseCache(db_path=db_path, ttl=60)
+    assert cache.get("a", Answer) is not None
+    clock.now += 20
+    # Remonté en mémoire à t+50, l'entrée expire quand même 60 s après sa création
+    assert cache.get("a", Answer) is None
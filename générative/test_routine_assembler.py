@@ -0,0 +1,114 @@
+"""Assemblage local des routines (routine_assembler), sans LLM"""
+import pytest
+
+import glow
+from rag_queries import iter_template_queries
+from routine_assembler import ROUTINE_SLOTS, RoutineAssembler, choose_products, product_price_range, routine_budget
+
+PROFILE = {"skin_type": "Dry", "hydration_level": "Low", "sensitivity": "Low", "budget": "100€"}
+
+
+class Doc:
+    def __init__(self, name, product_type, price):
+        self.metadata = {"name": name, "type": product_type, "price_eur": price}
+
+
+def test_choose_products_uses_the_whole_budget_when_it_fits_exactly():
+    candidates = [[(10.0, 0.9), (4.0, 0.5)], [(15.0, 0.8), (6.0, 0.3)]]
+    # 10 + 15 = 25 : la meilleure combinaison tient pile dans le budget
+    assert choose_products(candidates, 25.0) == [0, 0]
+    # 0.5€ de moins : il faut sacrifier l'étape où la perte de pertinence est la plus faible
+    assert choose_products(candidates, 24.5) == [1, 0]
+
+
+def test_choose_products_rounds_prices_up_to_the_price_unit():
+    # 4.99 compte pour 5.00 : 5.00 + 5.00 tient dans 10€, pas 5.01 + 5.00
+    assert choose_products([[(4.99, 1.0)], [(5.0, 1.0)]], 10.0) == [0, 0]
+    assert choose_products([[(5.01, 1.0)], [(5.0, 1.0)]], 10.0) is None
+
+
+def test_choose_products_returns_none_when_the_budget_is_infeasible():
+    assert choose_products([[(10.0, 0.9), (8.0, 0.1)], [(12.0, 0.7)]], 15.0) is None
+
+
+def test_choose_products_without_budget_takes_the_best_of_each_slot():
+    assert choose_products([[(30.0, 0.2), (50.0, 0.9)], [(5.0, 0.6), (1.0, 0.3)]], None) == [1, 0]
+
+
+def test_slot_without_candidates_is_left_out_of_the_routine():
+    candidates = [
+        [(Doc("Glow Gel", "Cleanser", 6.0), 6.0, 0.9)],
+        [],  # Aucun sérum dans le stock : l'étape est facultative
+        [(Doc("Glow Cream", "Moisturiser", 9.0), 9.0, 0.8)],
+        [(Doc("Glow Cream SPF 30", "Moisturiser", 12.0), 12.0, 0.7)],
+    ]
+    routine = RoutineAssembler(retriever=None).assemble(PROFILE, "morning", candidates)
+    assert [step.step_name for step in routine.steps] == ["Nettoyage", "Hydratation", "SPF"]
+    assert routine.total_estimated_budget == "27.00€"
+
+
+def test_infeasible_budget_falls_back_to_the_cheapest_products():
+    candidates = [[(Doc("Glow Mask", "Mask", 40.0), 40.0, 0.9), (Doc("Glow Clay", "Mask", 25.0), 25.0, 0.1)]]
+    routine = RoutineAssembler(retriever=None).assemble({"budget": "5€"}, "weekly", [[]] + candidates)
+    assert routine.steps[0].products[0].name == "Glow Clay"
+
+
+class RecordingRetriever:
+    """Enveloppe un ProductRetriever et compte les recherches"""
+
+    def __init__(self, retriever):
+        self.retriever = retriever
+        self.calls = []
+
+    def get_relevant_products_batch(self, queries, **kwargs):
+        self.calls.append(list(queries))
+        return self.retriever.get_relevant_products_batch(queries, **kwargs)
+
+
+def test_all_slots_are_searched_in_one_batch(make_retriever):
+    retriever = RecordingRetriever(make_retriever())
+    candidates = RoutineAssembler(retriever).slot_candidates(PROFILE, list(ROUTINE_SLOTS))
+
+    assert len(retriever.calls) == 1
+    assert len(retriever.calls[0]) == sum(len(slots) for slots in ROUTINE_SLOTS.values())
+    for key, slots in ROUTINE_SLOTS.items():
+        for (step_name, product_types, keyword), found in zip(slots, candidates[key]):
+            assert found, step_name
+            assert all(doc.metadata["type"] in product_types for doc, _, _ in found)
+            if keyword:
+                assert all(keyword in doc.metadata["name"].lower() for doc, _, _ in found)
+
+
+def test_slot_queries_are_precomputed(make_retriever):
+    retriever = make_retriever()
+    retriever.precompute_query_embeddings()
+    calls = retriever.embeddings.calls
+    for key in ROUTINE_SLOTS:
+        RoutineAssembler(retriever).assemble(PROFILE, key)
+    assert retriever.embeddings.calls == calls, "le modèle d'embedding a été appelé au service"
+    assert len(set(iter_template_queries())) == len(list(iter_template_queries()))
+
+
+@pytest.mark.parametrize("budget", ["90€", "30€ (Budget Faible)", "Moyen (20-40€ par produit)"])
+def test_routine_budgets_use_the_rag_price_range(budget):
+    min_price, max_price = product_price_range(budget)
+    budgets = [routine_budget({"budget": budget}, key) for key in ROUTINE_SLOTS]
+    # Les trois routines se partagent exactement le budget global
+    if "produit" not in budget:
+        assert sum(share for share, _, _ in budgets) == pytest.approx(float(budget.split("€")[0]))
+    for (share, _, _), slots in zip(budgets, ROUTINE_SLOTS.values()):
+        assert share == pytest.approx(max_price * len(slots))
+
+
+def test_rag_search_filters_with_the_assembler_price_range(monkeypatch):
+    seen = {}
+
+    class Retriever:
+        def get_relevant_products_batch(self, queries, k, avoid_ingredients, min_price=None, max_price=None):
+            seen["range"] = (min_price, max_price)
+            return [["produit"] for _ in queries]
+
+    monkeypatch.setenv("MISTRAL_API_KEY", "test")
+    engine = glow.GlowAI("test-model", retriever=Retriever(), response_cache=None)
+    engine._search_rag_products({"budget": "90€"}, ["matin"])
+    assert seen["range"] == product_price_range("90€")
@@ -0,0 +1,98 @@
+"""Appels structurés de GlowAI (_invoke_structured / _ainvoke_structured), sans réseau"""
+import asyncio
+import threading
+
+import pytest
+from langchain_core.messages import AIMessage
+
+import glow
+from schemas import SkincareRoutine
+
+ROUTINE = {
+    "routine_type": "Matin",
+    "target_skin_type": "Mixte",
+    "steps": [{"step_name": "Nettoyage", "usage_tips": "Matin et soir",
+               "products": [{"name": "Gel", "brand": "Glow", "description": "Doux", "price_estimation": "12€"}]}],
+    "global_advice": "Protéger la peau",
+    "total_estimated_budget": "12€",
+}
+
+
+def tool_message():
+    return AIMessage(content="", tool_calls=[{"name": "SkincareRoutine", "args": ROUTINE, "id": "call-1"}],
+                     usage_metadata={"input_tokens": 120, "output_tokens": 40, "total_tokens": 160})
+
+
+class FakeChain:
+    """Remplace prompt | llm.bind_tools(...) : renvoie toujours le même appel d'outil"""
+
+    def invoke(self, _):
+        return tool_message()
+
+    async def ainvoke(self, _):
+        return tool_message()
+
+
+class ThreadRecordingCache:
+    """Cache de réponses qui note le thread de chaque lecture / écriture"""
+
+    def __init__(self):
+        self.threads = []
+        self.stored = {}
+
+    def make_key(self, model_name, schema, prompt_text):
+        return prompt_text
+
+    def get(self, key, schema):
+        self.threads.append(threading.current_thread())
+        payload = self.stored.get(key)
+        return None if payload is None else schema.model_validate_json(payload)
+
+    def set(self, key, schema, value):
+        self.threads.append(threading.current_thread())
+        self.stored[key] = value.model_dump_json()
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setenv("MISTRAL_API_KEY", "test")
+    engine = glow.GlowAI("test-model", retriever=glow.NO_RETRIEVER, response_cache=ThreadRecordingCache())
+    monkeypatch.setattr(engine, "_structured_chain", lambda schema: FakeChain())
+    return engine
+
+
+def test_async_cache_access_runs_outside_the_event_loop(engine):
+    async def run():
+        loop_thread = threading.current_thread()
+        await engine._ainvoke_structured("prompt", SkincareRoutine)  # miss puis écriture
+        await engine._ainvoke_structured("prompt", SkincareRoutine)  # hit
+        return loop_thread
+
+    loop_thread = asyncio.run(run())
+    assert len(engine.response_cache.threads) == 3
+    assert all(thread is not loop_thread for thread in engine.response_cache.threads)
+
+
+def test_parsed_routine_matches_the_tool_call(engine):
+    routine, _ = engine._invoke_structured("prompt", SkincareRoutine)
+    assert routine.steps[0].products[0].name == "Gel"
+
+
+def test_usage_is_returned_next_to_the_routine(engine):
+    routine, usage = engine._invoke_structured("prompt", SkincareRoutine, usage_tags={"routine": "morning"})
+    assert (usage["prompt_tokens"], usage["completion_tokens"], usage["cached"]) == (120, 40, False)
+    assert usage["routine"] == "morning"
+
+    cached_routine, cached_usage = engine._invoke_structured("prompt", SkincareRoutine)
+    assert cached_usage["cached"] and cached_usage["prompt_tokens"] == 0
+    assert cached_routine == routine
+    assert "usage" not in routine.__dict__ and not hasattr(routine, "_usage")
+
+
+def test_separate_mode_collects_usage_per_routine(engine, monkeypatch):
+    prompts = {key: f"prompt {key}" for key in glow.ROUTINE_KEYS}
+    monkeypatch.setattr(engine, "_build_routine_prompts", lambda profile: (prompts, dict.fromkeys(prompts)))
+    results = engine.generate_full_routine({}, mode="separate", use_cache=False)
+    assert not results.errors
+    assert set(results.usage) == set(glow.ROUTINE_KEYS)
+    assert all(usage["prompt_tokens"] == 120 for usage in results.usage.values())
@@ -0,0 +1,44 @@
+"""Préchauffage du moteur : lancement non bloquant et attente des soumissions (glow.start_warmup)"""
+import threading
+import time
+
+import glow
+
+
+class SlowEngine:
+    """Remplace GlowAI : construction lente, contrôlée par un événement"""
+    release = threading.Event()
+    built = 0
+
+    def __init__(self, model_name, retriever=None):
+        SlowEngine.built += 1
+        SlowEngine.release.wait(5)
+        self.retriever = None
+
+    def _structured_chain(self, schema):
+        return None
+
+
+def test_start_warmup_does_not_wait_for_the_build(monkeypatch):
+    monkeypatch.setattr(glow, "GlowAI", SlowEngine)
+    monkeypatch.setattr(glow, "_build_retriever", lambda: None)
+    glow.reset()
+    SlowEngine.release.clear()
+    SlowEngine.built = 0
+    try:
+        assert glow.start_warmup("test-model")["state"] == "running"
+        time.sleep(0.05)  # Le thread de préchauffage tient maintenant le verrou de construction
+        started = time.monotonic()
+        status = glow.start_warmup("test-model")
+        assert time.monotonic() - started < 0.5
+        assert status["state"] == "running"
+        assert not glow.wait_for_warmup("test-model", timeout=0.01)
+    finally:
+        SlowEngine.release.set()
+
+    assert glow.wait_for_warmup("test-model", timeout=5)
+    assert glow.warmup_status("test-model")["state"] == "ready"
+    # La soumission réutilise l'instance préchauffée au lieu d'en construire une seconde
+    assert isinstance(glow.get_glow_ai("test-model"), SlowEngine)
+    assert SlowEngine.built == 1
+    glow.reset()
@@ -0,0 +1,68 @@
+"""
+Pré-calcul des routines pour tous les buckets de profils courants.
+
+Usage :
+    python warmup_routines.py [--goals ""] [--goals "Éclat"] [--limit 20] [--mode single] [--force]
+
+Sans --goals, les buckets "aucun objectif" et "un seul objectif connu" sont générés.
+Le stock est sauvegardé au fur et à mesure : la commande peut être relancée après une
+interruption, les buckets déjà présents sont sautés (sauf --force).
+"""
+import argparse
+import sys
+import time
+
+from glow import ROUTINE_KEYS, get_glow_ai
+from profile_buckets import DEFAULT_STORE_PATH, PrecomputedRoutineStore, bucket_profile, iter_bucket_keys
+
+SAVE_EVERY = 10
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pré-génère les routines des profils courants")
+    parser.add_argument("--model", default="mistral-large-latest", help="Modèle Mistral")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Fichier des routines pré-calculées")
+    parser.add_argument("--goals", action="append",
+                        help="Objectifs d'un bucket, séparés par des virgules (option répétable, \"\" = aucun)")
+    parser.add_argument("--mode", choices=("separate", "single"), help="Mode de génération")
+    parser.add_argument("--limit", type=int, help="Nombre maximum de buckets à générer")
+    parser.add_argument("--force", action="store_true", help="Régénère les buckets déjà présents")
+    args = parser.parse_args(argv)
+
+    goal_sets = None
+    if args.goals is not None:
+        goal_sets = [tuple(g.strip() for g in goals.split(",") if g.strip()) for goals in args.goals]
+
+    advisor = get_glow_ai(args.model)
+    # On génère toujours depuis le LLM (ou son cache), jamais depuis le stock qu'on remplit
+    advisor.precomputed_store = None
+    store = PrecomputedRoutineStore(args.store, model_name=args.model)
+
+    keys = [key for key in iter_bucket_keys(goal_sets) if args.force or key not in store]
+    if args.limit is not None:
+        keys = keys[:args.limit]
+    print(f"{len(keys)} bucket(s) à générer ({len(store)} déjà en stock)")
+
+    generated, failed = 0, 0
+    start = time.perf_counter()
+    for i, key in enumerate(keys, 1):
+        print(f"[{i}/{len(keys)}] {key}")
+        # Le cache de réponses reste actif : une relance ne repaie pas les appels déjà faits
+        routines = advisor.generate_full_routine(bucket_profile(key), mode=args.mode)
+        if routines.errors:
+            failed += 1
+            continue
+
+        store.put(key, {k: routines[k].model_dump(mode="json") for k in ROUTINE_KEYS})
+        generated += 1
+        if generated % SAVE_EVERY == 0:
+            store.save()
+
+    store.save()
+    elapsed = time.perf_counter() - start
+    print(f"{generated} bucket(s) générés, {failed} échec(s) en {elapsed:.1f}s — stock : {len(store)} buckets")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())